@@ -1,7 +1,37 @@
 import pyvisa as visa
+import numpy as np
 import re
+import socket
 import time
 
+from visa_monitor import monitor
+
+BLOCK_CHUNK_SIZE = 2 ** 20  # bytes requested per read while receiving a binary block
+
+# Write verification policies
+VERIFY_NONE = 'none'  # writes are never verified
+VERIFY_ERRORS = 'errors'  # the error queue is checked once per write_many batch or sequence (see verify_writes)
+VERIFY_IDN = 'idn'  # legacy behaviour. *IDN? is queried after every write
+
+# Meters report an overload with 9.90E+37 and the absence of a valid reading (NaN) with 9.91E+37
+OVERLOAD_THRESHOLD = 9.9e37
+
+
+class OverloadError(ValueError):
+    pass
+
+
+def scpi_float(response):
+    """
+    :param response: numeric response, such as '+1.00000051E+00'
+    :return: the response as a float. Raises OverloadError for the overload and not-a-number values, and ValueError
+    for a response that is not a number.
+    """
+    value = float(response)
+    if abs(value) >= OVERLOAD_THRESHOLD:
+        raise OverloadError(f'Instrument reported an overload or no valid reading ({response.strip()}).')
+    return value
+
 
 class VisaClient:
     def __init__(self, id):
@@ -12,6 +42,9 @@ class VisaClient:
             self.instr_info = id
             self.mode = self.instr_info['mode']
             self.timeout = 60000  # 1 (60e3) minute timeout
+            self.verify = self.instr_info.get('verify', VERIFY_ERRORS)  # write verification policy
+            self.error_query = self.instr_info.get('error_query', 'SYST:ERR?')
+            self.name = str(self.instr_info.get('address') or self.instr_info.get('gpib'))  # model once identified
         except ValueError:
             from textwrap import dedent
             msg = ("\n[ValueError] - Could not locate a VISA implementation. Install either the NI binary or pyvisa-py."
@@ -36,6 +69,7 @@ class VisaClient:
                     address = self.instr_info['address']
                     port = self.instr_info['port']
                     self.INSTR = self.rm.open_resource(f'TCPIP0::{address}::{port}::SOCKET', read_termination='\n')
+                    self.disable_nagle()
 
                 # if mode is GPIB:
                 elif self.mode == 'GPIB':
@@ -68,6 +102,9 @@ class VisaClient:
                 # test communication to instrument by identifying instrument
                 idn = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.query('*IDN?').lstrip(' '))
                 print(f"[FOUND] {idn}")
+                fields = idn.split(',')
+                if len(fields) > 1:
+                    self.name = fields[1].strip()
 
             except visa.VisaIOError:
                 # https://github.com/pyvisa/pyvisa-py/issues/146#issuecomment-453695057
@@ -88,6 +125,20 @@ class VisaClient:
         else:
             self.INSTR.timeout = self.timeout
 
+    def disable_nagle(self):
+        """
+        Sends each command as soon as it is written. With Nagle's algorithm on, a query that follows a write is held
+        back until the write is acknowledged, which instruments delay by up to 40 ms.
+        """
+        try:
+            self.INSTR.set_visa_attribute(visa.constants.VI_ATTR_TCPIP_NODELAY, visa.constants.VI_TRUE)
+        except Exception:
+            # pyvisa-py does not expose the attribute, but its socket session holds the socket as interface
+            session = getattr(self.rm.visalib, 'sessions', {}).get(self.INSTR.session)
+            sock = getattr(session, 'interface', None)
+            if isinstance(sock, socket.socket):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     def InstrumentConnectionFailed(self, info):
         """Raised when attempted connection to instrument has timedout or is unreachable"""
         if info['mode'] in ('SOCKET', 'SERIAL'):
@@ -110,31 +161,194 @@ class VisaClient:
             print('*IDN? was not returned. Failed to connect to address.')
             raise
 
-    def write(self, cmd):
+    def _record(self, kind, cmd, started, received=0, error=None):
+        # latency histograms and trace of visa_monitor, when enabled
+        if monitor.enabled:
+            monitor.record(self.name, kind, cmd, time.perf_counter() - started, len(cmd) + 1 if cmd else 0, received,
+                           error)
+
+    def write(self, cmd, verify=True):
+        """
+        Under the 'errors' policy a single write is not verified. Callers check the error queue once at the end of a
+        sequence of writes with verify_writes.
+
+        :param verify: when false, the write is not verified under the 'idn' policy either. For commands that start a
+        capture, where the completion is checked instead, and for commands that leave the instrument unable to answer.
+        """
+        started = time.perf_counter()
         try:
             self.INSTR.write(f'{cmd}')
-            self.IDN()
+            self._record('write', cmd, started)
+            if verify and self.verify == VERIFY_IDN:
+                self.IDN()
+        except visa.VisaIOError as e:
+            self._record('write', cmd, started, error=e)
+            print('Could not write to device.')
+            raise ValueError(e)
+
+    def write_many(self, cmds):
+        """
+        Sends a batch of commands as a single program message followed by one verification, rather than one round-trip
+        per command. Headers are rooted with ':' so each command resolves from the top of the SCPI tree.
+
+        :param cmds: list of commands sent in order
+        """
+        message = ';'.join(cmd if cmd.startswith((':', '*')) else f':{cmd}' for cmd in cmds)
+        started = time.perf_counter()
+        try:
+            self.INSTR.write(message)
+            self._record('write', message, started)
+            if self.verify == VERIFY_IDN:
+                self.IDN()
         except visa.VisaIOError as e:
+            self._record('write', message, started, error=e)
             print('Could not write to device.')
             raise ValueError(e)
 
+        if self.verify == VERIFY_ERRORS:
+            self.check_errors()
+
+    def verify_writes(self):
+        """
+        Checks the error queue once for the writes sent since the last check, under the 'errors' policy.
+        """
+        if self.verify == VERIFY_ERRORS:
+            self.check_errors()
+
+    def check_errors(self, limit=20):
+        """
+        Drains the instrument error queue. Responses take the form '<code>,"<message>"' where code 0 is no error.
+
+        :return: True if the queue was empty
+        """
+        errors = []
+        for _ in range(limit):
+            response = self.query(self.error_query)
+            try:
+                code = int(float(response.split(',')[0]))
+            except ValueError:
+                raise ValueError(f'Unexpected response to {self.error_query}: {response}')
+            if code == 0:
+                break
+            errors.append(response)
+
+        if errors:
+            raise ValueError('Instrument reported errors:\n' + '\n'.join(errors))
+        return True
+
     def read(self):
         response = None
-        if self.mode == 'NIGHTHAWK':
-            response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.read().split("\n")[0].lstrip())
-        else:
-            response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.read())
+        started = time.perf_counter()
+        try:
+            if self.mode == 'NIGHTHAWK':
+                response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.read().split("\n")[0].lstrip())
+            else:
+                response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.read())
+        except visa.VisaIOError as e:
+            self._record('read', '', started, error=e)
+            raise
+        self._record('read', '', started, len(response))
         return response
 
     def query(self, cmd):
+        started = time.perf_counter()
         try:
             if self.mode == 'NIGHTHAWK':
                 response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.query(f'{cmd}').split("\n")[0].lstrip(' '))
             else:
                 response = re.sub(r'[\r\n|\r\n|\n]+', '', self.INSTR.query(f'{cmd}').lstrip(' '))
+            self._record('query', cmd, started, len(response))
             return response
         except visa.VisaIOError as e:
+            self._record('query', cmd, started, error=e)
+            raise ValueError(e)
+
+    def query_many(self, cmds, converters=None):
+        """
+        Sends several queries as a single program message, so they cost one round-trip. The instrument answers with a
+        single response message in which the response to each query is separated by ';'. Queries whose response may
+        itself contain ';' (strings, binary blocks) cannot be batched.
+
+        :param cmds: list of queries sent in order, such as ['FETCH? 1', 'VOLT:AC:RANGE?']
+        :param converters: one callable per query, applied to its response, for instance float or scpi_float. Responses
+        are returned as strings when not given.
+        :return: list of responses, in the order of cmds
+        """
+        message = ';'.join(cmd if cmd.startswith((':', '*')) else f':{cmd}' for cmd in cmds)
+        fields = self.query(message).split(';')
+        if len(fields) != len(cmds):
+            raise ValueError(f'Expected {len(cmds)} responses to "{message}" but received {len(fields)}.')
+
+        if converters is None:
+            return fields
+        return [convert(field) for convert, field in zip(converters, fields)]
+
+    def poll(self, cmd, ready, timeout, interval=0.002, backoff=1.5, max_interval=0.25):
+        """
+        Repeats a query until ready(response) is satisfied. The delay between queries grows by backoff up to
+        max_interval, so short operations are detected within milliseconds without flooding the bus on long ones.
+
+        :param cmd: status query, such as '*ESR?'
+        :param ready: callable accepting the response string
+        :param timeout: seconds to wait before giving up
+        :return: True if ready before the timeout elapsed, otherwise False
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            if ready(self.query(cmd)):
+                return True
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * backoff, max_interval)
+
+    def wait_for_complete(self, timeout):
+        """
+        Waits for the Operation Complete bit (bit 0) of the Standard Event Status Register, which is raised once all
+        operations pending before a preceding *OPC have finished. Unlike *OPC?, the bus is not held while waiting.
+        """
+        return self.poll('*ESR?', lambda esr: int(float(esr)) & 1, timeout)
+
+    def query_binary(self, cmd, datatype='d', is_big_endian=True):
+        """
+        Queries an IEEE 488.2 definite-length block (#<n><length><payload>) and decodes the payload straight into a
+        numpy array. Unlike query, the response is never decoded to a string.
+
+        :param cmd: query returning a block, such as 'FETCH?'
+        :param datatype: 'd' for REAL,64 or 'f' for REAL,32
+        :param is_big_endian: True if the instrument byte order is NORMal, False if SWAPped
+        :return: numpy array of float64 values
+        """
+        started = time.perf_counter()
+        try:
+            self.INSTR.write(f'{cmd}')
+
+            # skip any leading whitespace and locate the start of the block header
+            start = self.INSTR.read_bytes(1)
+            while start in (b' ', b'\r', b'\n'):
+                start = self.INSTR.read_bytes(1)
+            if start != b'#':
+                raise ValueError(f'Expected an IEEE 488.2 block but received {start!r}.')
+
+            # the payload may contain the termination character, so it cannot end a read while inside the block
+            with self.INSTR.read_termination_context(''):
+                digits = int(self.INSTR.read_bytes(1))
+                if digits == 0:
+                    raise ValueError('Indefinite-length blocks are not supported.')
+                length = int(self.INSTR.read_bytes(digits))
+                payload = self.INSTR.read_bytes(length, chunk_size=BLOCK_CHUNK_SIZE)
+
+                # consume the program message terminator that follows the block
+                self.INSTR.read_bytes(1)
+        except visa.VisaIOError as e:
+            self._record('query_binary', cmd, started, error=e)
             raise ValueError(e)
+        self._record('query_binary', cmd, started, length + digits + 3)
+
+        dtype = np.dtype(datatype).newbyteorder('>' if is_big_endian else '<')
+        return np.frombuffer(payload, dtype=dtype).astype(np.float64)
 
     def close(self):
         try:
@@ -0,0 +1,442 @@
+"""
+End-to-end throughput of a measurement sweep over distortion_breakpoints.csv.
+
+DistortionAnalyzer.run_sweep and DMM_Measurement.run_sweep are run headlessly, in place of the gui panels, against
+either the instrument simulator or the built in dummy data. The methods of each stage are wrapped with timers, so the
+time of a breakpoint is split into:
+    + source settle     : calibrator output, operate and standby, including their fixed delays
+    + digitizer setup   : configuring the 8588A digitizer (or the meter for DMM_Measurement)
+    + acquisition       : waiting on the capture (or the meter readings)
+    + transfer          : reading the capture back from the digitizer
+    + fft/metrics       : rms, windowed fft, THD+N and THD
+    + persistence       : queueing history and results writes, and draining the writer at the end of the sweep
+    + plotting          : building the plot data and drawing it (Agg) in place of the gui canvas
+    + other             : whatever remains, for instance the fixed delays of the measurement routines
+
+Only the outermost stage is counted when stages nest. Writes that run on the ResultsWriter thread overlap the
+measurement and are reported separately as background persistence.
+
+With --visa-monitor, the latency histograms of every instrument command (visa_monitor) are reported as well.
+
+The results are written as json to results/benchmarks, with the commit they were measured at, so runs can be compared
+across commits.
+
+Run from the project root:
+    python -m demos.benchmark_sweep --breakpoints 5 --time-scale 0.01 --sleep-scale 0
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # project root, when run from within demos
+import distortion_analyzer
+import dmm_f8588A
+import dmm_f884xA
+import dut_f5560A
+import dut_f5730A
+import multimeter
+from instrument_simulator import SimulatorConfig, start_simulators, stop_simulators
+from run_files import getFilepath
+from visa_monitor import monitor
+
+STAGES = ('source settle', 'digitizer setup', 'acquisition', 'transfer', 'fft/metrics', 'persistence', 'plotting')
+BACKGROUND_STAGE = 'persistence (background)'
+BREAKPOINTS_FILE = 'distortion_breakpoints.csv'
+RESULTS_DIRECTORY = 'results/benchmarks'
+
+# modules whose fixed delays (time.sleep) are scaled by --sleep-scale. VisaClient is left alone, since its sleeps are
+# polling intervals that wait on the instrument rather than fixed delays.
+SLEEP_SCALED_MODULES = (dut_f5560A, dut_f5730A, dmm_f8588A, dmm_f884xA, distortion_analyzer, multimeter)
+
+
+########################################################################################################################
+class StageTimer:
+    """
+    Accumulates the wall time spent in wrapped methods by stage. Wrapping is undone by restore.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._active = threading.local()
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def add(self, stage, elapsed):
+        with self._lock:
+            self.totals[stage] += elapsed
+            self.calls[stage] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def timed(self, stage, func):
+        def wrapper(*args, **kwargs):
+            if getattr(self._active, 'stage', None) is not None:
+                return func(*args, **kwargs)  # nested in a stage that is already being timed
+
+            self._active.stage = stage
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+                self._active.stage = None
+
+        return wrapper
+
+    def wrap(self, owner, name, stage):
+        """
+        Replaces owner.name (a module function, class attribute or bound method of an instance) with a timed version.
+        """
+        had_own_attribute = name in getattr(owner, '__dict__', {})
+        original = getattr(owner, name)
+        setattr(owner, name, self.timed(stage, original))
+        self._patches.append((owner, name, original if had_own_attribute else None))
+
+    def restore(self):
+        for owner, name, original in reversed(self._patches):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patches = []
+
+
+class ScaledTime:
+    """
+    Stands in for the time module of the driver modules, scaling their fixed delays.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def sleep(self, seconds):
+        time.sleep(seconds * self.scale)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+########################################################################################################################
+class HeadlessControl:
+    """No-op stand-in for the wx controls written to during a sweep."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class HeadlessPanel:
+    """
+    Stand-in for the gui panels. Plots are drawn to an off screen Agg canvas, so the cost of updating the figures is
+    still part of the measurement.
+    """
+
+    def __init__(self, draw=True):
+        self.draw = draw
+        self.flag_complete = True
+        self.DMM_choice = ''
+        self.errors = []
+        self.x, self.y, self.std = np.array([]), np.array([]), np.array([])
+
+        self.text_amplitude = HeadlessControl()
+        self.text_frequency = HeadlessControl()
+        self.text_DUT_report = HeadlessControl()
+        self.text_DMM_report = HeadlessControl()
+        self.btn_start = HeadlessControl()
+
+        if draw:
+            self.figure, (self.ax1, self.ax2) = plt.subplots(2, 1)
+            self.temporal, = self.ax1.plot([], [])
+            self.spectral, = self.ax2.plot([], [])
+
+    # DistortionAnalyzer ###############################################################################################
+    def measurement_config_update(self, Fs, N, aperture):
+        pass
+
+    def acquisition_progress_update(self, received, N):
+        pass
+
+    def results_update(self, results):
+        pass
+
+    def plot(self, params):
+        if self.draw:
+            self.temporal.set_data(params['xt'], params['yt'])
+            self.ax1.set_xlim(left=params['xt_left'], right=params['xt_right'])
+            self.ax1.set_ylim(bottom=params['yt_btm'], top=params['yt_top'])
+
+            self.spectral.set_data(params['xf'], params['yf'])
+            self.ax2.set_xlim(left=params['xf_left'], right=params['xf_right'])
+            self.ax2.set_ylim(bottom=params['yf_btm'], top=params['yf_top'])
+            self.figure.canvas.draw()
+
+    # DMM_Measurement ##################################################################################################
+    def update_plot(self, x, y, std):
+        self.x = np.append(self.x, x)
+        self.y = np.append(self.y, y)
+        self.std = np.append(self.std, std)
+        if self.draw:
+            self.temporal.set_data(self.x, self.y)
+            self.ax1.relim()
+            self.ax1.autoscale()
+            self.figure.canvas.draw()
+
+    # MISCELLANEOUS ####################################################################################################
+    def error_dialog(self, error_message):
+        print(f'\n!!!\n{error_message}\n!!!\n')
+        self.errors.append(str(error_message))
+
+    def post_error_dialog(self, message):
+        self.error_dialog(message)
+
+    def set_ident(self, idn_dict):
+        print(f"\tDUT: {idn_dict['DUT']}\n\tDMM: {idn_dict['DMM']}")
+
+    def toggle_controls(self):
+        pass
+
+    def close(self):
+        if self.draw:
+            plt.close(self.figure)
+
+
+########################################################################################################################
+def wrap_analyzer_stages(timer, da):
+    M = da.M
+    for name in ('run_f5560A_source', 'run_f5730A_source', 'standby_f5560A', 'standby_f5730A'):
+        timer.wrap(M, name, 'source settle')
+    for name in ('setup_digitize_aperture', 'setup_digitize_timer', 'store_f8588A_profiles'):
+        timer.wrap(M, name, 'digitizer setup')
+    timer.wrap(M, 'wait_for_f8588A_digitize', 'acquisition')
+    for name in ('fetch_f8588A_chunked', 'fetch_f8588A_binary', 'fetch_f8588A_ascii'):
+        timer.wrap(M, name, 'transfer')
+
+    # fft() looks these up as module globals of distortion_analyzer
+    for name in ('rms_flat', 'windowed_fft', 'two_sided_spectrum', 'THDN_F', 'THD'):
+        timer.wrap(distortion_analyzer, name, 'fft/metrics')
+    for name in ('thdn_f', 'thd'):
+        timer.wrap(distortion_analyzer.SpectrumAnalysis, name, 'fft/metrics')
+
+    timer.wrap(da.writer, 'submit', 'persistence')
+    for name in ('write_history', 'write_to_csv'):
+        timer.wrap(distortion_analyzer, name, BACKGROUND_STAGE)  # run on the writer thread
+    timer.wrap(da, 'plot', 'plotting')
+
+
+def wrap_multimeter_stages(timer, dmm):
+    M = dmm.M
+    for name in ('run_f5560A_source', 'run_f5730A_source', 'standby_f5560A', 'standby_f5730A'):
+        timer.wrap(M, name, 'source settle')
+    timer.wrap(dmm, 'setup_dmm', 'digitizer setup')
+    for name in ('average_f884xA_reading', 'average_f8588A_reading'):
+        timer.wrap(M, name, 'acquisition')
+    timer.wrap(pd.DataFrame, 'to_csv', 'persistence')
+    timer.wrap(dmm.panel, 'update_plot', 'plotting')
+
+
+def timed_breakpoints(timer, func, records):
+    """
+    Wraps the measurement routine handed to run_sweep to record the wall time and stage times of each breakpoint.
+    """
+
+    def measure(*args, **kwargs):
+        before = timer.snapshot()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            after = timer.snapshot()
+            stages = {stage: after.get(stage, 0.0) - before.get(stage, 0.0) for stage in STAGES}
+            records.append({'wall': wall, 'stages': stages})
+
+    return measure
+
+
+########################################################################################################################
+def run_distortion_sweep(df, instruments, timer, args):
+    panel = HeadlessPanel(not args.no_draw)
+    da = distortion_analyzer.DistortionAnalyzer(panel)
+    da.DUT_choice, da.DMM_choice = 'f5560A', 'f8588A'
+    da.DUMMY_DATA = instruments is None
+    da.KEEP_OPERATE = args.keep_operate
+    da.USE_PROFILES = args.profiles
+    da.COHERENT_SAMPLING = args.coherent
+    da.PLAN_ACQUISITION = args.plan
+    da.M.f5560A_settling = args.settling
+    da.params = {'selected_test': 1, 'coupling': 'AC1M', 'mainlobe_type': 'relative', 'mainlobe_value': 0.1,
+                 'filter': '100kHz', 'rms': 0, 'local': False}
+    if instruments is not None:
+        da.M.connect(instruments)
+
+    wrap_analyzer_stages(timer, da)
+    records = []
+    try:
+        start = time.perf_counter()
+        if da.USE_PROFILES and not da.DUMMY_DATA:
+            da.store_digitizer_profiles(df)
+        da.run_sweep(df, timed_breakpoints(timer, da.test, records))
+        timer.timed('persistence', da.writer.flush)()  # the sweep is complete once its results are on disk
+        wall = time.perf_counter() - start
+    finally:
+        timer.restore()
+        da.close_results_writer()
+        if instruments is not None:
+            da.M.close_instruments()
+        panel.close()
+
+    return wall, records, panel.errors
+
+
+def run_multimeter_sweep(df, instruments, timer, args):
+    panel = HeadlessPanel(not args.no_draw)
+    dmm = multimeter.DMM_Measurement(panel)
+    dmm.DUT_choice, dmm.DMM_choice = 'f5560A', 'f884xA'
+    panel.DMM_choice = dmm.DMM_choice
+    dmm.DUMMY_DATA = instruments is None
+    dmm.KEEP_OPERATE = args.keep_operate
+    dmm.M.f5560A_settling = args.settling
+    dmm.M.buffered_readings = not args.single_readings
+    dmm.params = {'autorange': True, 'always_voltage': True, 'rms': 0}
+    if instruments is not None:
+        dmm.M.connect(instruments)
+
+    wrap_multimeter_stages(timer, dmm)
+    records = []
+    try:
+        start = time.perf_counter()
+        dmm.run_sweep(df, timed_breakpoints(timer, dmm.test_multimeter, records))
+        wall = time.perf_counter() - start
+    finally:
+        timer.restore()
+        if instruments is not None:
+            dmm.M.close_instruments()
+        panel.close()
+
+    return wall, records, panel.errors
+
+
+SWEEPS = {'distortion': run_distortion_sweep, 'multimeter': run_multimeter_sweep}
+
+
+########################################################################################################################
+def summarize(name, wall, records, timer, errors):
+    count = len(records)
+    stages = {stage: timer.totals.get(stage, 0.0) for stage in STAGES}
+    stages['other'] = max(wall - sum(stages.values()), 0.0)
+
+    print(f'\n{name} sweep: {count} breakpoints in {wall:.2f} s')
+    for stage, seconds in stages.items():
+        share = 100 * seconds / wall if wall else 0.0
+        print(f'\t{stage:<16} {seconds:>9.3f} s  {share:5.1f} %')
+    if BACKGROUND_STAGE in timer.totals:
+        print(f'\t{BACKGROUND_STAGE} {timer.totals[BACKGROUND_STAGE]:.3f} s (overlaps the stages above)')
+
+    per_minute = 60 * count / wall if wall else 0.0
+    print(f'\t{per_minute:.2f} measurements per minute, {60 * per_minute:.1f} breakpoints per hour')
+
+    return {'breakpoints': count, 'wall_time': wall, 'measurements_per_minute': per_minute,
+            'breakpoints_per_hour': 60 * per_minute, 'stages': stages,
+            'background': {BACKGROUND_STAGE: timer.totals.get(BACKGROUND_STAGE, 0.0)},
+            'calls': dict(timer.calls), 'per_breakpoint': records, 'errors': errors}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measures the throughput of a headless measurement sweep.')
+    parser.add_argument('--sweep', choices=('distortion', 'multimeter', 'both'), default='both')
+    parser.add_argument('--backend', choices=('simulator', 'dummy'), default='simulator',
+                        help='simulated instruments, or the built in dummy data (no instrument traffic)')
+    parser.add_argument('--breakpoints', type=int, default=None, help='first N rows of the breakpoints file')
+    parser.add_argument('--breakpoints-file', default=BREAKPOINTS_FILE)
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='wall time per simulated second of a capture (simulator)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every reply (simulator)')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes per second of replies (simulator)')
+    parser.add_argument('--settling-time', type=float, default=0.0,
+                        help='time constant (s) of the simulated calibrator output')
+    parser.add_argument('--settling', choices=(dut_f5560A.SETTLE_STATUS, dut_f5560A.SETTLE_FIXED),
+                        default=dut_f5560A.SETTLE_STATUS, help='how the calibrator drivers wait for the output')
+    parser.add_argument('--keep-operate', action='store_true', help='keep the source in operate between points')
+    parser.add_argument('--single-readings', action='store_true',
+                        help='average meter readings taken one at a time rather than in a single burst')
+    parser.add_argument('--coherent', action='store_true',
+                        help='capture whole cycles and analyse them with the rectangular window')
+    parser.add_argument('--plan', action='store_true',
+                        help='set the digitizer with the cheapest aperture or timer plan rather than the aperture')
+    parser.add_argument('--profiles', action='store_true',
+                        help='save the digitizer setups to the 8588A and recall them per point')
+    parser.add_argument('--sleep-scale', type=float, default=1.0,
+                        help='scale of the fixed delays in the drivers. 1 keeps the delays of the bench')
+    parser.add_argument('--no-draw', action='store_true', help='skip drawing the plots')
+    parser.add_argument('--visa-monitor', action='store_true', help='record instrument command latencies')
+    parser.add_argument('--output', default=RESULTS_DIRECTORY)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = pd.read_csv(args.breakpoints_file, encoding='utf-8-sig')
+    if args.breakpoints is not None:
+        df = df.head(args.breakpoints)
+
+    servers = []
+    instruments = None
+    if args.backend == 'simulator':
+        config = SimulatorConfig(latency=args.latency, bandwidth=args.bandwidth, settling_time=args.settling_time,
+                                 time_scale=args.time_scale, seed=0)
+        ports = {'f5560A': 0, 'f8588A': 0, 'f884xA': 0}
+        instruments, servers, _ = start_simulators(config, ports=ports)
+
+    scaled_time = ScaledTime(args.sleep_scale)
+    for module in SLEEP_SCALED_MODULES:
+        module.time = scaled_time
+
+    sweeps = SWEEPS if args.sweep == 'both' else {args.sweep: SWEEPS[args.sweep]}
+    report = {'commit': git_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'config': vars(args), 'sweeps': {}}
+    try:
+        for name, run in sweeps.items():
+            timer = StageTimer()
+            if args.visa_monitor:
+                monitor.enable()
+            wall, records, errors = run(df, instruments, timer, args)
+            report['sweeps'][name] = summarize(name, wall, records, timer, errors)
+            if args.visa_monitor:
+                monitor.report()
+                report['sweeps'][name]['visa'] = monitor.summary()
+                monitor.disable()
+    finally:
+        for module in SLEEP_SCALED_MODULES:
+            module.time = time
+        stop_simulators(servers)
+
+    pathname = getFilepath(args.output, 'sweep_benchmark', extension='json')
+    with open(pathname, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+    print(f'\nresults written to {pathname}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares the captures of get_FFT_parameters (aperture on the 5 MHz grid) with the captures planned by
+plan_acquisition, for every frequency of the breakpoint list. Both are costed with the model of
+plan_acquisition: capture, transfer and FFT time. Captures sampling below dmm.getIdealSamplingFrequency are marked *.
+
+Run from the project root:
+    python -m demos.demo_acquisition_plan
+    python -m demos.demo_acquisition_plan --mainlobe 0.05 --lpf 0 --format REAL32
+    python -m demos.demo_acquisition_plan --fast-length
+"""
+import argparse
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+import dmm_f8588A as dmm
+import distortion_analyzer as da
+from distortion_analyzer import get_FFT_parameters, plan_acquisition
+from distortion_calculator import next_fast_length
+
+BREAKPOINTS_FILE = 'distortion_breakpoints.csv'
+
+
+########################################################################################################################
+def cost(Fs, N, transfer_format):
+    """
+    :return: capture, transfer and FFT time in seconds of N samples at Fs, as plan_acquisition estimates them
+    """
+    if transfer_format in dmm.TRANSFER_FORMATS:
+        sample_bytes = np.dtype(dmm.TRANSFER_FORMATS[transfer_format]).itemsize
+    else:
+        sample_bytes = da.PLAN_ASCII_SAMPLE_BYTES
+    fft = da.PLAN_FFT_RATE * N * np.log2(N) * (1 if next_fast_length(N) == N else da.PLAN_FFT_SLOW_FACTOR)
+    return N / Fs + N * sample_bytes / da.PLAN_TRANSFER_RATE + fft
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--breakpoints-file', default=BREAKPOINTS_FILE)
+    parser.add_argument('--mainlobe', type=float, default=0.1, help='relative main lobe width')
+    parser.add_argument('--lpf', type=float, default=100e3, help='low pass filter cutoff in Hz')
+    parser.add_argument('--window', default='blackman')
+    parser.add_argument('--format', default='REAL64', help='transfer format: REAL64, REAL32 or ASCII')
+    parser.add_argument('--fast-length', action='store_true',
+                        help='round record lengths up to 5-smooth lengths (changes THD+N, see demo_fft_length)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frequencies = pd.read_csv(args.breakpoints_file)['frequency'].value_counts().sort_index()
+
+    print(f"{'f0 (Hz)':>8} {'points':>7} {'ideal Fs':>10} | {'Fs':>11} {'N':>8} {'cost (s)':>9} | "
+          f"{'method':>8} {'Fs':>11} {'N':>8} {'cost (s)':>9} | {'saved (s)':>9}")
+    print('-' * 107)
+
+    totals = np.zeros(2)  # cost of the current and the planned captures, over the breakpoint list
+    for f0, points in frequencies.items():
+        Fs_min = dmm.getIdealSamplingFrequency(f0, args.lpf)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, Fs, N, _, _ = get_FFT_parameters(f0, args.lpf, 'relative', args.mainlobe, args.window,
+                                                fast_length=args.fast_length)
+        plan = plan_acquisition(f0, args.lpf, 'relative', args.mainlobe, args.window, args.format,
+                                fast_length=args.fast_length)
+        current = cost(Fs, N, args.format)
+        totals += points * np.array([current, plan['cost']])
+
+        flag = '*' if Fs < Fs_min else ' '
+        print(f"{f0:>8g} {points:>7} {Fs_min:>10.0f} | {Fs:>10.0f}{flag} {N:>8} {current:>9.4f} | "
+              f"{plan['method']:>8} {plan['Fs']:>11.0f} {plan['N']:>8} {plan['cost']:>9.4f} | "
+              f"{points * (current - plan['cost']):>9.3f}")
+
+    print('-' * 107)
+    print(f'breakpoint list: {totals[0]:.3f} s -> {totals[1]:.3f} s ({totals[0] - totals[1]:.3f} s saved)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Evaluates THD+N of one capture under several filter settings, the way THDN_F does it (a masked copy of the spectrum
+summed once per setting), and from a single SpectrumAnalysis whose band power index is shared by every setting
+(SpectrumAnalysis.filtered). Reports the time of each and the largest relative difference between the two.
+
+Run from the project root:
+    python -m demos.demo_band_power
+    python -m demos.demo_band_power --samples 2000000 --f0 1000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from demos.demo_sampledDataGenerator import GetData
+from distortion_calculator import SpectrumAnalysis, THDN_F, windowed_fft
+
+# (hpf, lpf) of each setting: audio band, the 100 kHz and 2 MHz filters, and no filter
+FILTER_SETTINGS = ((20, 20e3), (0, 100e3), (10, 2e6), (0, 0))
+
+
+########################################################################################################################
+def best_time(func, repeats):
+    best = np.inf
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--f0', type=float, default=1000, help='fundamental frequency in Hz')
+    parser.add_argument('--fs', type=float, default=5e6, help='sampling frequency in Hz')
+    parser.add_argument('--samples', type=int, default=1000000)
+    parser.add_argument('--window', default='blackman')
+    parser.add_argument('--repeats', type=int, default=5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    Fs, N = args.fs, args.samples
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        xt, yt = GetData(1, args.f0, Fs, N, True, True)
+        xf, yf, main_lobe_width = windowed_fft(yt, Fs, N, args.window)
+
+    def per_setting():
+        return [THDN_F(xf, yf, Fs, N, main_lobe_width, hpf, lpf)[0] for hpf, lpf in FILTER_SETTINGS]
+
+    def shared_index():
+        spectrum = SpectrumAnalysis(xf, yf, Fs, N)
+        return [spectrum.filtered(hpf, lpf).thdn_f(main_lobe_width)[0] for hpf, lpf in FILTER_SETTINGS]
+
+    t_legacy, thdn_legacy = best_time(per_setting, args.repeats)
+    t_index, thdn_index = best_time(shared_index, args.repeats)
+
+    print(f"{'hpf (Hz)':>9} {'lpf (Hz)':>9} {'THD+N':>12}")
+    for (hpf, lpf), thdn in zip(FILTER_SETTINGS, thdn_index):
+        print(f'{hpf:>9g} {lpf:>9g} {thdn:>12.5e}')
+
+    difference = np.max(np.abs(np.array(thdn_index) / np.array(thdn_legacy) - 1))
+    print(f'\n{N} samples, {len(FILTER_SETTINGS)} filter settings: {t_legacy * 1e3:.2f} ms -> {t_index * 1e3:.2f} ms '
+          f'({t_legacy / t_index:.1f}x), largest relative difference {difference:.1e}')
+
+
+if __name__ == "__main__":
+    main()
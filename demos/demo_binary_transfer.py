@@ -0,0 +1,169 @@
+"""
+Compares ASCII and IEEE 488.2 binary block retrieval of the 8588A digitizer buffer, and the peak memory of a single
+FETCH? against the chunked DATA:REMove? retrieval used for long records.
+
+A local socket stand-in serves synthetic captures in place of the instrument, so the full VisaClient path (write,
+read and decode) is measured without lab hardware. Requires a VISA backend with TCPIP SOCKET support (pyvisa-py).
+
+Run from the project root:
+    python -m demos.demo_binary_transfer
+"""
+import socketserver
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+import dmm_f8588A as dmm
+
+SAMPLE_COUNTS = (10_000, 100_000, 500_000, 1_000_000)
+CHUNKED_SAMPLE_COUNT = 2_000_000
+REPEATS = 5
+
+
+########################################################################################################################
+class StandInHandler(socketserver.StreamRequestHandler):
+    """Answers the handful of commands used by f8588A_instrument when fetching a capture."""
+
+    def handle(self):
+        transfer_format = 'ASCII'
+        byte_order = 'SWAPPED'
+        cursor = 0  # readings already removed from memory by DATA:REMOVE?
+
+        for line in self.rfile:
+            for cmd in line.decode().strip().upper().split(';'):
+                cmd = cmd.strip().lstrip(':')
+
+                if cmd == '*IDN?':
+                    self.wfile.write(b'FLUKE,8588A,STAND-IN,0\n')
+                elif cmd == 'SYST:ERR?':
+                    self.wfile.write(b'+0,"No error"\n')
+                elif cmd.startswith('FORMAT:DATA'):
+                    transfer_format = 'ASCII' if 'ASC' in cmd else f"REAL{cmd.split(',')[-1].strip()}"
+                elif cmd.startswith('FORMAT:BORDER'):
+                    byte_order = cmd.split()[-1]
+                elif cmd == 'FETCH?':
+                    self.wfile.write(self.server.payload(transfer_format, byte_order))
+                elif cmd.startswith('DATA:REMOVE?'):
+                    count = int(cmd.split()[-1])
+                    self.wfile.write(self.server.payload(transfer_format, byte_order, cursor, count))
+                    cursor = (cursor + count) % len(self.server.samples)
+
+    def finish(self):
+        try:
+            super().finish()
+        except ConnectionError:
+            pass
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.samples = np.zeros(0)
+        self._payloads = {}
+
+    def set_samples(self, samples):
+        self.samples = samples
+        self._payloads = {}
+
+    def payload(self, transfer_format, byte_order, start=0, count=None):
+        # payloads are formatted once so the benchmark only times the transfer and the client-side decode
+        key = (transfer_format, byte_order, start, count)
+        if key not in self._payloads:
+            samples = self.samples[start:None if count is None else start + count]
+            if transfer_format == 'ASCII':
+                data = ','.join(f'{value:+.9E}' for value in samples).encode() + b'\n'
+            else:
+                endian = '>' if byte_order.startswith('NORM') else '<'
+                dtype = np.dtype(dmm.TRANSFER_FORMATS[transfer_format]).newbyteorder(endian)
+                block = samples.astype(dtype).tobytes()
+                length = str(len(block)).encode()
+                data = b'#' + str(len(length)).encode() + length + block + b'\n'
+            self._payloads[key] = data
+        return self._payloads[key]
+
+
+########################################################################################################################
+def time_fetch(fetch, repeats=REPEATS):
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fetch()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(fetch):
+    """Peak memory allocated by fetch, beyond what was held before the call. The first call warms the payload cache."""
+    fetch()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    result = fetch()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak - baseline, result
+
+
+def main():
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address, port = server.server_address
+
+    instr = dmm.f8588A_instrument()
+    instr.connect_to_f8588A({'mode': 'SOCKET', 'address': address, 'port': str(port), 'gpib': ''})
+
+    print(f"{'samples':>10} {'format':>8} {'payload (MB)':>13} {'elapsed (ms)':>13} {'speedup':>8} {'max error':>10}")
+    print('-' * 67)
+
+    for N in SAMPLE_COUNTS:
+        x = np.arange(N) / 500e3
+        samples = np.sin(2 * np.pi * 1e3 * x) + 1e-3 * np.sin(2 * np.pi * 3e3 * x) + 1e-5 * np.random.normal(0, 1, N)
+        server.set_samples(samples)
+
+        ascii_elapsed = None
+        for transfer_format in ('ASCII', 'REAL32', 'REAL64'):
+            instr.transfer_format = transfer_format
+            instr.set_f8588A_transfer_format()
+
+            if transfer_format == 'ASCII':
+                elapsed, buffer = time_fetch(instr.fetch_f8588A_ascii)
+                ascii_elapsed = elapsed
+            else:
+                elapsed, buffer = time_fetch(instr.fetch_f8588A_binary)
+
+            size = len(server.payload(transfer_format, instr.byte_order.upper())) / 1e6
+            error = np.max(np.abs(buffer - samples))
+            print(f'{N:>10} {transfer_format:>8} {size:>13.2f} {elapsed * 1e3:>13.2f} '
+                  f'{ascii_elapsed / elapsed:>7.1f}x {error:>10.1e}')
+        print()
+
+    # CHUNKED RETRIEVAL ------------------------------------------------------------------------------------------------
+    N = CHUNKED_SAMPLE_COUNT
+    samples = np.random.normal(0, 1, N)
+    server.set_samples(samples)
+    instr.transfer_format = 'REAL64'
+    instr.set_f8588A_transfer_format()
+
+    print(f"{'retrieval':>24} {'samples':>10} {'elapsed (ms)':>13} {'peak memory (MB)':>17} {'max error':>10}")
+    print('-' * 78)
+    retrievals = {'single FETCH?': instr.fetch_f8588A_binary,
+                  f'DATA:REMove? x {instr.chunk_size}': lambda: instr.fetch_f8588A_chunked(N)}
+    for label, fetch in retrievals.items():
+        elapsed, peak, buffer = peak_memory(fetch)
+        error = np.max(np.abs(buffer - samples))
+        print(f'{label:>24} {N:>10} {elapsed * 1e3:>13.2f} {peak / 1e6:>17.2f} {error:>10.1e}')
+    print(f'\nbuffer of {N} samples: {N * 8 / 1e6:.2f} MB')
+
+    instr.close_f8588A()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
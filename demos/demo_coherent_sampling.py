@@ -0,0 +1,83 @@
+"""
+Compares the captures planned by get_coherent_FFT_parameters (whole cycles, rectangular window) with the blackman
+windowed captures of get_FFT_parameters, for every frequency of the breakpoint list. Reports the capture time saved
+and the THD+N and THD of a synthetic waveform (1e-3 third and 1e-4 fifth harmonic, 1e-4 noise) analysed each way.
+
+With the default settings both plans read a THD+N of about 1.01e-3, except the blackman plan at 45 and 60 Hz (7.27e-2).
+There, float error truncates both lobe edges a bin low, so THDN_F leaves the top bin of the fundamental lobe in the
+noise, as it always has for these records.
+
+Run from the project root:
+    python -m demos.demo_coherent_sampling
+    python -m demos.demo_coherent_sampling --mainlobe 0.05 --lpf 3e6
+"""
+import argparse
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from demos.demo_sampledDataGenerator import GetData
+from distortion_analyzer import get_coherent_FFT_parameters, get_FFT_parameters
+from distortion_calculator import SpectrumAnalysis, is_coherent, windowed_fft
+
+BREAKPOINTS_FILE = 'distortion_breakpoints.csv'
+
+
+########################################################################################################################
+def analyse(f0, Fs, N, window, lpf):
+    """
+    :return: THD+N and THD of the synthetic waveform captured with the given plan
+    """
+    xt, yt = GetData(1, f0, Fs, N, True, True)
+    xf, yf, main_lobe_width = windowed_fft(yt, Fs, N, window)
+    spectrum = SpectrumAnalysis(xf, yf, Fs, N, 0, lpf, coherent=is_coherent(f0, Fs, N, window))
+    thdn = spectrum.thdn_f(main_lobe_width)[0]
+    thd = spectrum.thd(main_lobe_width)
+    return thdn, thd
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--breakpoints-file', default=BREAKPOINTS_FILE)
+    parser.add_argument('--mainlobe', type=float, default=0.1, help='relative main lobe width')
+    parser.add_argument('--lpf', type=float, default=100e3, help='low pass filter cutoff in Hz')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+    frequencies = pd.read_csv(args.breakpoints_file)['frequency'].value_counts().sort_index()
+    expected = np.sqrt(1e-3 ** 2 + 1e-4 ** 2)
+
+    print(f"{'f0 (Hz)':>8} {'points':>7} | {'N':>7} {'capture (s)':>11} {'THD+N':>10} {'THD':>10} | "
+          f"{'sourced (Hz)':>13} {'cycles':>6} {'N':>7} {'capture (s)':>11} {'THD+N':>10} {'THD':>10} | "
+          f"{'saved (s)':>9}")
+    print('-' * 137)
+
+    totals = np.zeros(2)  # capture time of the windowed and the coherent plans, over the breakpoint list
+    for f0, points in frequencies.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, Fs, N, _, runtime = get_FFT_parameters(f0, args.lpf, 'relative', args.mainlobe, 'blackman')
+            thdn, thd = analyse(f0, Fs, N, 'blackman', args.lpf)
+
+            f0_c, Fs_c, N_c, _, runtime_c, cycles = get_coherent_FFT_parameters(f0, args.lpf, 'relative',
+                                                                                 args.mainlobe)
+            thdn_c, thd_c = analyse(f0_c, Fs_c, N_c, 'rectangular', args.lpf)
+        totals += points * np.array([runtime, runtime_c])
+
+        print(f'{f0:>8g} {points:>7} | {N:>7} {runtime:>11.4f} {thdn:>10.3e} {thd:>10.3e} | '
+              f'{f0_c:>13.4f} {cycles:>6} {N_c:>7} {runtime_c:>11.4f} {thdn_c:>10.3e} {thd_c:>10.3e} | '
+              f'{points * (runtime - runtime_c):>9.3f}')
+
+    print('-' * 137)
+    print(f'expected THD {expected:.3e}')
+    print(f'breakpoint list: capture time {totals[0]:.3f} s -> {totals[1]:.3f} s '
+          f'({totals[0] - totals[1]:.3f} s saved, {totals[0] / totals[1]:.1f}x shorter)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compares the FFT time of the record lengths chosen by getWindowLength with the 5-smooth lengths chosen when
+fast_length is set, for every frequency of the breakpoint list. Both lengths also analyse the same synthetic waveform
+(1e-3 third and 1e-4 fifth harmonic, 1e-4 noise). THD+N or THD departing from the figures of the baseline length by more
+than --tolerance (relative) are marked *, as the fast length would change the reported results there.
+
+Run from the project root:
+    python -m demos.demo_fft_length
+    python -m demos.demo_fft_length --mainlobe 0.05 --lpf 3e6
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from demos.demo_sampledDataGenerator import GetData
+from distortion_analyzer import get_FFT_parameters
+from distortion_calculator import SpectrumAnalysis, windowed_fft
+
+BREAKPOINTS_FILE = 'distortion_breakpoints.csv'
+
+
+########################################################################################################################
+def largest_prime_factor(n):
+    factor, largest = 2, 1
+    while factor * factor <= n:
+        while n % factor == 0:
+            largest, n = factor, n // factor
+        factor += 1
+    return max(largest, n)
+
+
+def fft_time(N, Fs, window, repeats):
+    """
+    :return: best time in seconds of windowed_fft on N samples, once its window tables are cached
+    """
+    yt = np.random.default_rng(0).normal(size=N)
+    best = np.inf
+    with contextlib.redirect_stdout(io.StringIO()):
+        windowed_fft(yt.copy(), Fs, N, window)
+        for _ in range(repeats):
+            y = yt.copy()
+            start = time.perf_counter()
+            windowed_fft(y, Fs, N, window)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def figures(f0, Fs, N, window, lpf, seed):
+    """
+    :return: THD+N and THD of the synthetic waveform captured with N samples at Fs
+    """
+    np.random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        xt, yt = GetData(1, f0, Fs, N, True, True)
+        xf, yf, main_lobe_width = windowed_fft(yt, Fs, N, window)
+        spectrum = SpectrumAnalysis(xf, yf, Fs, N, 0, lpf)
+        return spectrum.thdn_f(main_lobe_width)[0], spectrum.thd(main_lobe_width)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--breakpoints-file', default=BREAKPOINTS_FILE)
+    parser.add_argument('--mainlobe', type=float, default=0.1, help='relative main lobe width')
+    parser.add_argument('--lpf', type=float, default=100e3, help='low pass filter cutoff in Hz')
+    parser.add_argument('--window', default='blackman')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='relative departure of THD+N or THD from the baseline length accepted')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frequencies = pd.read_csv(args.breakpoints_file)['frequency'].value_counts().sort_index()
+
+    print(f"{'f0 (Hz)':>8} {'points':>7} {'Fs (kHz)':>9} {'N':>9} {'largest p':>10} {'fft (ms)':>9} "
+          f"{'fast N':>9} {'fft (ms)':>9} {'speedup':>8} {'samples':>8} | {'THD+N':>9} {'fast':>10} "
+          f"{'THD':>9} {'fast':>10}")
+    print('-' * 142)
+
+    totals = np.zeros(4)  # fft time and samples of the current and the fast lengths, over the breakpoint list
+    departed = 0  # breakpoints whose figures the fast length changes
+    for f0, points in frequencies.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, Fs, N, _, _ = get_FFT_parameters(f0, args.lpf, 'relative', args.mainlobe, args.window)
+            _, _, N_fast, _, _ = get_FFT_parameters(f0, args.lpf, 'relative', args.mainlobe, args.window,
+                                                    fast_length=True)
+
+        t = fft_time(N, Fs, args.window, args.repeats)
+        t_fast = fft_time(N_fast, Fs, args.window, args.repeats)
+        totals += points * np.array([t, t_fast, N, N_fast])
+
+        baseline = figures(f0, Fs, N, args.window, args.lpf, args.seed)
+        fast = figures(f0, Fs, N_fast, args.window, args.lpf, args.seed)
+        flags = ['*' if abs(b_fast / b - 1) > args.tolerance else ' ' for b, b_fast in zip(baseline, fast)]
+        departed += points * ('*' in flags)
+
+        print(f'{f0:>8g} {points:>7} {Fs / 1e3:>9.3f} {N:>9} {largest_prime_factor(N):>10} {t * 1e3:>9.2f} '
+              f'{N_fast:>9} {t_fast * 1e3:>9.2f} {t / t_fast:>7.1f}x {(N_fast / N - 1) * 100:>+7.2f}% | '
+              f'{baseline[0]:>9.3e} {fast[0]:>9.3e}{flags[0]} {baseline[1]:>9.3e} {fast[1]:>9.3e}{flags[1]}')
+
+    print('-' * 142)
+    print(f'breakpoint list: fft {totals[0]:.3f} s -> {totals[1]:.3f} s ({totals[0] / totals[1]:.1f}x), '
+          f'samples transferred {(totals[3] / totals[2] - 1) * 100:+.2f}%')
+    print(f'THD+N or THD of {departed} of {frequencies.sum()} points depart from the baseline length by more than '
+          f'{args.tolerance:g}')
+
+
+if __name__ == "__main__":
+    main()
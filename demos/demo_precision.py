@@ -1,7 +1,24 @@
-import timeit
+"""
+Benchmarks the summation routines used on the power sums of distortion_calculator (np.sum, math.fsum, msum and
+compensated_sum) for accuracy and speed, and gates the choice of compensated_sum and its default block size:
+    + accuracy is measured in ulp against math.fsum, which is correctly rounded
+    + compensated_sum must stay within MAX_ULP on every power sum and run faster than math.fsum
+
+Run from the project root:
+    python -m demos.demo_precision
+"""
+import math
+import sys
+import time
 
 import numpy as np
-import math
+
+from distortion_calculator import SUM_BLOCK_SIZE, compensated_sum
+
+SIZES = (1_000, 100_000, 2_000_000)
+BLOCK_SIZES = (256, 1024, 4096, 16384)
+MAX_ULP = 4
+REPEATS = 5
 
 
 def msum(iterable):
@@ -28,57 +45,90 @@ def msum(iterable):
     return sum(partials, 0.0)
 
 
-def main():
-    data = np.array([1, 1e100, 1, -1e100] * 10000)
-    N = data.size
-    print('length:', N)
-    print('type:', data.dtype)
-    print()
-
-    # ==================================================================================================================
-    print('sum --------------------------------------------')
-    A = np.sum(data)
+########################################################################################################################
+def power_spectra(N, rng):
+    """Power sums as computed by rms_flat, THDN_F and THD: squared magnitudes of windowed spectra."""
+    x = np.arange(N) / 1e6
+    w = np.blackman(N)
+    noise = rng.normal(0, 1, N)
+    sine = np.sin(2 * np.pi * 1e3 * x) + 1e-6 * noise  # ~120 dB of dynamic range between the peak and the floor
+    return {'noise spectrum': np.abs(np.fft.rfft(noise * w)) ** 2,
+            'sine spectrum': np.abs(np.fft.rfft(sine * w)) ** 2,
+            'lognormal': rng.lognormal(0, 4, N)}
 
-    def numpy_sum():
-        np.sum(data)
 
-    Aelapsed = round(((timeit.timeit(stmt=numpy_sum,
-                                     setup="",
-                                     number=100000) / 100000) * 1e3), 3)
-    print('numpy sum:', A, 'elapsed:', Aelapsed, 'ms')
+def ulp_error(value, reference):
+    return abs(value - reference) / math.ulp(reference) if reference else abs(value)
 
-    # ------------------------------------------------------------------------------------------------------------------
-    B = math.fsum(data)
 
-    def math_fsum():
-        math.fsum(data)
+def timed(func, data, repeats=REPEATS):
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(data)
+        best = min(best, time.perf_counter() - start)
+    return best, result
 
-    Belapsed = round(((timeit.timeit(stmt=math_fsum,
-                                     setup="",
-                                     number=100000) / 100000) * 1e3), 3)
-    print('fsum:', B, 'elapsed:', Belapsed, 'ms')
 
-    # ------------------------------------------------------------------------------------------------------------------
-    C = msum(data)
+def candidates():
+    routines = {'np.sum': np.sum, 'math.fsum': math.fsum}
+    for block in BLOCK_SIZES:
+        routines[f'compensated({block})'] = lambda data, block=block: compensated_sum(data, block)
+    return routines
 
-    def run_msum():
-        msum(data)
 
-    Celapsed = round(((timeit.timeit(stmt=run_msum,
-                                     setup="",
-                                     number=100000) / 100000) * 1e3), 3)
-    print('msum:', C, 'elapsed:', Celapsed, 'ms')
+def main():
+    rng = np.random.default_rng(0)
+    routines = candidates()
+
+    # ACCURACY AND SPEED -----------------------------------------------------------------------------------------------
+    print(f"{'N':>10} {'data':>16} {'routine':>20} {'elapsed (ms)':>13} {'error (ulp)':>12}")
+    print('-' * 75)
+
+    worst = {name: 0.0 for name in routines}
+    elapsed = {name: 0.0 for name in routines}
+    for N in SIZES:
+        for label, data in power_spectra(N, rng).items():
+            reference = math.fsum(data)
+            for name, func in routines.items():
+                t, value = timed(func, data)
+                error = ulp_error(value, reference)
+                worst[name] = max(worst[name], error)
+                elapsed[name] += t
+                print(f'{N:>10} {label:>16} {name:>20} {t * 1e3:>13.3f} {error:>12.1f}')
+        print()
+
+    # ILL-CONDITIONED MIXED SIGN (not a power sum, shown for reference) ------------------------------------------------
+    data = np.array([1, 1e100, 1, -1e100] * 10000, dtype=np.float64)
+    print('mixed sign [1, 1e100, 1, -1e100] * 10000, exact sum 20000:')
+    print(f"\tnp.sum: {np.sum(data)}  fsum: {math.fsum(data)}  msum: {msum(data)}  "
+          f"compensated_sum: {compensated_sum(data)}\n")
+
+    # GATE -------------------------------------------------------------------------------------------------------------
+    print(f"{'routine':>20} {'worst (ulp)':>12} {'total (ms)':>11}")
+    print('-' * 45)
+    for name in routines:
+        print(f'{name:>20} {worst[name]:>12.1f} {elapsed[name] * 1e3:>11.2f}')
+
+    accurate = [name for name in routines if name.startswith('compensated') and worst[name] <= MAX_ULP]
+    default = f'compensated({SUM_BLOCK_SIZE})'
     print()
+    if accurate:
+        print(f'fastest compensated block within {MAX_ULP} ulp: {min(accurate, key=elapsed.get)}')
 
-    # ==================================================================================================================
-    print('mean -------------------------------------------')
-    AA = np.mean(data)
-    print('numpy mean:', AA)
+    if default not in accurate:
+        print(f'FAIL: {default} exceeds {MAX_ULP} ulp ({worst[default]:.1f})')
+        return 1
+    if elapsed[default] >= elapsed['math.fsum']:
+        print(f'FAIL: {default} is not faster than math.fsum')
+        return 1
 
-    BB = B / N
-    print('fsum mean:', BB)
-    print()
+    print(f"PASS: {default} within {MAX_ULP} ulp of math.fsum at "
+          f"{elapsed['math.fsum'] / elapsed[default]:.1f}x its speed "
+          f"({elapsed[default] / elapsed['np.sum']:.1f}x the cost of np.sum)")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import csv
-import os
+import sys
 from pathlib import Path
-import datetime
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # project root, when run from within demos
+from run_files import getFilepath
 
 DIGITIZER_SAMPLING_FREQUENCY = 5e6
 CONTAINS_HARMONICS = True
@@ -91,21 +93,9 @@ def plot(xt, yt, xf, yf, N):
     plt.show()
 
 
-def _getFilepath(directory='', fname='filename'):
-    Path(directory).mkdir(parents=True, exist_ok=True)
-    date = datetime.date.today().strftime("%Y%m%d")
-    filename = f'{fname}_{date}'
-    index = 0
-
-    while os.path.isfile(f'{directory}/{filename}_{str(index).zfill(2)}.csv'):
-        index += 1
-    filename = filename + "_" + str(index).zfill(2)
-    return f'{directory}/{filename}.csv'
-
-
 def write_to_csv(path, fname, header, *args):
     table = list(zip(*args))
-    pathname = _getFilepath(path, fname)
+    pathname = getFilepath(path, fname, digits=2)
     with open(pathname, 'w', newline='') as outfile:
         writer = csv.writer(outfile, delimiter=',')
         if header:
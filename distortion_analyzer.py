@@ -8,43 +8,175 @@ except (ImportError, NameError):
     print("The following demo, demo_sampledDataGenerator.py, is not installed.")
 
 from distortion_calculator import *
+from history_store import write_history
+from results_writer import ResultsWriter
+from run_files import getFilepath
+from timing import MeasurementTimer
 
 import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import threading
-import datetime
-import os
 import re
 from decimal import Decimal
 import csv
 
+# Coherent captures (see get_coherent_FFT_parameters)
+COHERENT_FREQUENCY_TOLERANCE = 1e-4  # relative change of the fundamental accepted to capture whole cycles
+COHERENT_CYCLE_SEARCH = 100  # cycle counts tried above the minimum set by the main lobe width
 
-########################################################################################################################
-def get_FFT_parameters(f0, lpf, mainlobe_type, mainlobe_width, window='blackman'):
-    Fs = dmm.getSamplingFrequency(f0, lpf)
-    N = getWindowLength(f0=f0, fs=Fs, windfunc=window, error=mainlobe_width, mainlobe_type=mainlobe_type)
-    aperture, runtime = dmm.get_aperture(Fs, N)
+# Cost model of the acquisition plans (see plan_acquisition)
+PLAN_TRANSFER_RATE = 1e6  # bytes per second read back from the digitizer
+PLAN_ASCII_SAMPLE_BYTES = 16  # bytes per sample of the ASCII transfer format
+PLAN_FFT_RATE = 1.6e-9  # seconds per N*log2(N) of windowed_fft with a 5-smooth length
+PLAN_FFT_SLOW_FACTOR = 10  # slowdown of windowed_fft for a length with a prime factor above 5
 
-    return f0, Fs, N, aperture, runtime
+# stages timed by DistortionAnalyzer.timer, in the order of the timing columns of the sweep results
+TIMING_SPANS = ('source', 'settle', 'meter', 'digitizer setup', 'retrieve',
+                'windowed fft', 'THDN', 'THD', 'history', 'plot', 'total')
 
 
-def _getFilepath(directory, fname):
-    Path(directory).mkdir(parents=True, exist_ok=True)
-    date = datetime.date.today().strftime("%Y%m%d")
-    filename = f'{fname}_{date}'
-    index = 0
+########################################################################################################################
+def get_coherent_FFT_parameters(f0, lpf, mainlobe_type, mainlobe_width, tolerance=COHERENT_FREQUENCY_TOLERANCE,
+                                method='aperture'):
+    """
+    Plans a coherent capture: a sampling frequency on the digitizer grid (5 MHz divided by the number of samples
+    averaged per reading) and a record of N samples holding exactly M cycles of the fundamental, with M and N relatively
+    prime so every sample falls on a distinct phase of the waveform. The fundamental and its harmonics then each fall on
+    a single bin and the rectangular window is exact, so the record only needs the main lobe resolution of a
+    rectangular window (2 bins) instead of the 6 bins of the blackman window.
+
+    The fundamental is moved by at most tolerance (relative) to make the number of cycles whole. The returned f0 is the
+    frequency to source.
+
+    Above 1 ms the aperture only steps by 100 us, so the aperture method only considers the sampling frequencies of
+    dmm.aperture_settings. Any other averaging would be rounded to the nearest step and no longer capture whole cycles.
+
+    :param method: 'aperture' or 'timer', the way the digitizer is set to Fs
+    :return: f0, Fs, N, aperture, runtime and the number of cycles captured, M
+    """
+    if mainlobe_type == 'relative':
+        ldf = f0 * mainlobe_width
+    elif mainlobe_type == 'absolute':
+        ldf = mainlobe_width
+    else:
+        raise ValueError('Incorrect main lobe type used!\nSelection should either be relative or absolute.')
+
+    min_cycles = max(int(np.ceil(2 * f0 / ldf)), 1)  # the 2 bin main lobe of a rectangular window is no wider than ldf
+    Fs_min = dmm.getSamplingFrequency(f0, lpf)
+    if method == 'aperture':
+        rates = [Fs for _, Fs in dmm.aperture_settings(Fs_min)]
+    else:
+        max_averaging = round(dmm.DIGITIZER_SAMPLING_FREQUENCY / Fs_min)
+        rates = [dmm.DIGITIZER_SAMPLING_FREQUENCY / averaging for averaging in range(max_averaging, 0, -1)]
+
+    # every plan captures M / f0 seconds, so the fewest cycles wins, then the fewest samples (lowest Fs)
+    for M in range(min_cycles, min_cycles + COHERENT_CYCLE_SEARCH):
+        plans = []
+        for Fs in rates:
+            n = round(M * Fs / f0)
+            for N in (n, n - 1, n + 1):
+                if N > 2 * M and np.gcd(M, N) == 1 and abs(M * Fs / N - f0) <= tolerance * f0:
+                    plans.append((N, Fs))
+                    break
+        if plans:
+            N, Fs = min(plans)
+            if method == 'aperture':
+                aperture, _ = dmm.get_aperture(Fs, N)
+                if dmm.aperture_sampling_frequency(aperture) != Fs:
+                    raise ValueError(f'The aperture of {aperture} s does not sample {f0} Hz at {Fs} Hz.')
+            else:
+                aperture = 0.0
+            return M * Fs / N, Fs, N, aperture, N / Fs, M
+
+    raise ValueError(f'No coherent capture of {f0} Hz found within a tolerance of {tolerance}.')
+
+
+def plan_acquisition(f0, lpf, mainlobe_type, mainlobe_width, window='blackman', transfer_format='REAL64',
+                     methods=('aperture', 'timer'), fast_length=False):
+    """
+    Plans the cheapest capture resolving the main lobe width at a sampling frequency of at least
+    dmm.getIdealSamplingFrequency. Every aperture step and trigger timer interval is a candidate at the exact sampling
+    frequency it achieves, with the shortest record holding the main lobe (or, with fast_length, the next 5-smooth
+    length as well, see getWindowLength). A candidate costs its capture time, the time to transfer its samples and the
+    estimated time of its FFT.
+
+    Candidates are visited from the lowest sampling frequency up. Past the lowest valid one the record only grows, so
+    the search stops once the transfer and a 5-smooth FFT of the shortest record cost more than the best plan.
+
+    :param methods: sampling methods considered, 'aperture' and/or 'timer'. The aperture wins a tie.
+    :return: dictionary of the plan: method, Fs, N, aperture, runtime and cost (seconds)
+    """
+    if mainlobe_type == 'relative':
+        ldf = f0 * mainlobe_width
+    elif mainlobe_type == 'absolute':
+        ldf = mainlobe_width
+    else:
+        raise ValueError('Incorrect main lobe type used!\nSelection should either be relative or absolute.')
+
+    if window not in MAINLOBE_BINS:
+        raise ValueError('Not a valid windowing function.')
+
+    if transfer_format in dmm.TRANSFER_FORMATS:
+        sample_bytes = np.dtype(dmm.TRANSFER_FORMATS[transfer_format]).itemsize
+    else:
+        sample_bytes = PLAN_ASCII_SAMPLE_BYTES
+
+    def fft_cost(N, fast):
+        return PLAN_FFT_RATE * N * np.log2(max(N, 2)) * (1 if fast else PLAN_FFT_SLOW_FACTOR)
+
+    Fs_min = dmm.getIdealSamplingFrequency(f0, lpf)
+    settings = {'aperture': dmm.aperture_settings, 'timer': dmm.timer_settings}
+
+    best = None
+    for method in methods:
+        for setting, Fs in settings[method](Fs_min):
+            shortest = int(np.ceil(MAINLOBE_BINS[window] * Fs / ldf))
+            bound = MAINLOBE_BINS[window] / ldf + shortest * sample_bytes / PLAN_TRANSFER_RATE
+            if best and bound + fft_cost(shortest, True) >= best['cost']:
+                break
+
+            lengths = (shortest, next_fast_length(shortest)) if fast_length else (shortest,)
+            for N in lengths:
+                runtime = N / Fs
+                cost = runtime + N * sample_bytes / PLAN_TRANSFER_RATE + fft_cost(N, N == next_fast_length(N))
+                if best is None or cost < best['cost']:
+                    aperture = setting if method == 'aperture' else 0.0
+                    best = {'method': method, 'Fs': Fs, 'N': N, 'aperture': aperture, 'runtime': runtime,
+                            'cost': cost}
+
+    if best is None:
+        raise ValueError(f'No acquisition of {f0} Hz samples at {Fs_min} Hz or above.')
+    return best
+
+
+def get_FFT_parameters(f0, lpf, mainlobe_type, mainlobe_width, window='blackman', fast_length=False,
+                       method='aperture'):
+    """
+    :param method: 'aperture' or 'timer'. Fs is the sampling frequency the method achieves: the aperture averages a
+    whole number of readings (in 100 us steps above 1 ms), the timer interval steps by 20 ns.
+    :return: f0, Fs, N, aperture, runtime. The aperture is 0 for the timer.
+    """
+    if method == 'aperture':
+        Fs = dmm.getSamplingFrequency(f0, lpf)
+        aperture, _ = dmm.get_aperture(Fs, 0)
+        Fs = dmm.aperture_sampling_frequency(aperture)  # the 100 us steps above 1 ms move Fs off the 5 MHz grid
+    else:
+        _, Fs = next(dmm.timer_settings(dmm.getIdealSamplingFrequency(f0, lpf)))
+    N = getWindowLength(f0=f0, fs=Fs, windfunc=window, error=mainlobe_width, mainlobe_type=mainlobe_type,
+                        fast_length=fast_length)
+    if method == 'aperture':
+        aperture, runtime = dmm.get_aperture(Fs, N)
+    else:
+        aperture, runtime = 0.0, N / Fs
 
-    while os.path.isfile(f'{directory}/{filename}_{str(index).zfill(3)}.csv'):
-        index += 1
-    filename = filename + "_" + str(index).zfill(3)
-    return f'{directory}/{filename}.csv'
+    return f0, Fs, N, aperture, runtime
 
 
 def write_to_csv(path, fname, header, *args):
     table = list(zip(*args))
-    pathname = _getFilepath(path, fname)
+    pathname = getFilepath(path, fname)
     with open(pathname, 'w', newline='') as outfile:
         writer = csv.writer(outfile, delimiter=',')
         if header:
@@ -134,6 +266,13 @@ class DistortionAnalyzer:
         self.DUMMY_DATA = False  # can be toggled by the gui
         self.WINDOW_SELECTION = "blackman"  # selected windowing
         self.USE_APERTURE = True  # when true, the aperture achieves reduced sampling frequency
+        self.CONFIRM_SETTLING = False  # when true, short captures confirm the source output has settled
+        self.KEEP_OPERATE = False  # when true, sweeps leave the source in operate between points
+        self.COHERENT_SAMPLING = False  # when true, AC captures hold whole cycles and use the rectangular window
+        self.FAST_LENGTH = False  # when true, record lengths are rounded up to lengths the FFT computes fastest
+        self.PLAN_ACQUISITION = False  # when true, captures take the cheapest of aperture and timer over USE_APERTURE
+        self.USE_PROFILES = False  # when true, sweeps save digitizer setups to the 8588A and recall them per point
+        self.HISTORY_FORMAT = 'binary'  # 'binary' (history_store) or the legacy 'csv'
 
         self.amplitude_good = False  # Flag indicates user input for amplitude value is good (True)
         self.frequency_good = False  # Flag indicates user input for frequency value is good (True)
@@ -142,9 +281,12 @@ class DistortionAnalyzer:
         self.DMM_choice = ''
         self.params = {}
         self.results = {'Amplitude': [], 'freq_ideal': [], 'freq_sampled': [],
-                        'yrms': [], 'THDN': [], 'THD': [], 'RMS NOISE': [], 'N': [], 'Fs': [], 'Aperture': []}
+                        'yrms': [], 'THDN': [], 'THD': [], 'RMS NOISE': [], 'N': [], 'Fs': [], 'Aperture': [],
+                        'Timing': []}
 
         self.M = Instruments(self)
+        self.writer = ResultsWriter(on_error=self.report_write_error)  # saves results off the measurement thread
+        self.timer = MeasurementTimer(enabled=True)  # per-stage timing of each measurement. Disable to skip
 
     # ##################################################################################################################
     def connect(self, instruments):
@@ -157,6 +299,13 @@ class DistortionAnalyzer:
 
         return True
 
+    def report_write_error(self, description, e):
+        self.panel.post_error_dialog(f'Failed to save {description}.\n{e}')
+
+    def close_results_writer(self):
+        print('\tsaving outstanding results')
+        self.writer.close()
+
     def close_instruments(self):
         if hasattr(self.M, 'f5560A') and hasattr(self.M, 'f8588A'):
             self.M.close_instruments()
@@ -224,6 +373,8 @@ class DistortionAnalyzer:
             # run sweep
             elif selection == 1:
                 df = pd.read_csv('distortion_breakpoints.csv')
+                if self.USE_PROFILES and not self.DUMMY_DATA:
+                    self.store_digitizer_profiles(df)
                 self.run_sweep(df, self.test)
 
             # run single shunt voltage implied current measurement
@@ -273,56 +424,105 @@ class DistortionAnalyzer:
         self.panel.flag_complete = True
 
     def run_sweep(self, df, func):
-        DUT_choice = self.DUT_choice
-
         print('RUNNING MEASUREMENT SWEEP')
         self.panel.flag_complete = False
         headers = ['amplitude', 'freq_ideal', 'freq_sampled',
                    'yrms', 'THDN', 'THD', 'uARMS Noise', 'Fs', 'N', 'aperture']
+        if self.timer.enabled:
+            headers += [f'{span} (s)' for span in TIMING_SPANS]
         results = np.zeros(shape=(len(df.index), len(headers)))
         t = threading.currentThread()
-        for idx, row in df.iterrows():
-            if getattr(t, "do_run", True):
-                if not self.DUMMY_DATA:
-                    self.panel.text_amplitude.SetValue(str(row.amplitude))
-                    self.panel.text_frequency.SetValue(str(row.frequency))
-
-                    try:
-                        amplitude, units, ft = self.get_string_value(row.amplitude, str(row.frequency))
-                    except ValueError as e:
-                        print('\n!!!\nAccounted error! exiting sweep\n!!!\n')
-                        self.panel.error_dialog(str(e))
-                        raise
-                    self.params['amplitude'] = amplitude
-                    self.params['frequency'] = ft
-                    self.params['units'] = units
-
-                    try:
-                        results[idx] = func(setup=True)
-
-                        if DUT_choice == 'f5560A':
-                            self.M.standby_f5560A()
-                        elif DUT_choice == 'f5730A':
-                            self.M.standby_f5730A()
-                        else:
-                            raise ValueError("Invalid DUT selection made!")
-
-                    except ValueError:
-                        raise
+        try:
+            for idx, row in df.iterrows():
+                if getattr(t, "do_run", True):
+                    if not self.DUMMY_DATA:
+                        self.panel.text_amplitude.SetValue(str(row.amplitude))
+                        self.panel.text_frequency.SetValue(str(row.frequency))
+
+                        try:
+                            amplitude, units, ft = self.get_string_value(row.amplitude, str(row.frequency))
+                        except ValueError as e:
+                            print('\n!!!\nAccounted error! exiting sweep\n!!!\n')
+                            self.panel.error_dialog(str(e))
+                            raise
+                        self.params['amplitude'] = amplitude
+                        self.params['frequency'] = ft
+                        self.params['units'] = units
+
+                        try:
+                            results[idx] = self.timed_row(func(setup=True))
+
+                            if not self.KEEP_OPERATE:
+                                self.standby_source()
+
+                        except ValueError:
+                            raise
+                    else:
+                        self.params['amplitude'] = 1
+                        self.params['frequency'] = 1000
+                        self.params['units'] = 'V'
+                        results[idx] = self.timed_row(func(setup=True))
                 else:
-                    self.params['amplitude'] = 1
-                    self.params['frequency'] = 1000
-                    self.params['units'] = 'V'
-                    results[idx] = func(setup=True)
-            else:
-                break
+                    break
+        finally:
+            self.M.use_profiles = False  # saved setups are only recalled by the sweep that saved them
+            # an output kept in operate between points is placed in standby once the sweep ends or fails
+            if self.KEEP_OPERATE and not self.DUMMY_DATA:
+                try:
+                    self.standby_source()
+                except Exception as e:
+                    # logged, so the error that ended the sweep is the one raised
+                    print(f'\tcould not place the source in standby: {e}')
 
         # https://stackoverflow.com/a/28356566
         # https://stackoverflow.com/a/28058264
         results_df = pd.DataFrame(results, columns=headers)
-        results_df.to_csv(path_or_buf=_getFilepath('results', 'distortion'), sep=',', index=False)
+        self.writer.submit('sweep results', lambda: results_df.to_csv(path_or_buf=getFilepath('results', 'distortion'),
+                                                                      sep=',', index=False))
         self.panel.flag_complete = True
 
+    def store_digitizer_profiles(self, df):
+        """
+        Saves the digitizer setups needed by the sweep to the instrument memory before the first point, so each point
+        changes setup with a single recall. Rows with invalid values are left for the sweep to report.
+        """
+        coupling = self.params['coupling']
+        filter_val = self.params['filter']
+
+        settings_list = []
+        for idx, row in df.iterrows():
+            try:
+                amplitude, units, ft = self.get_string_value(row.amplitude, str(row.frequency))
+            except ValueError:
+                continue
+            if self.params['rms'] != 0:
+                amplitude = amplitude / np.sqrt(2)
+
+            f0, Fs, N, aperture, runtime, hpf, lpf, window, method = self.get_digitize_parameters(ft, filter_val)
+            if method == 'aperture':
+                settings, range_string = self.M.digitize_aperture_settings(units, amplitude, coupling, filter_val,
+                                                                           N, aperture)
+            else:
+                settings, range_string = self.M.digitize_timer_settings(units, amplitude, coupling, filter_val,
+                                                                        N, 1 / Fs)
+            settings_list.append(settings)
+
+        self.M.store_f8588A_profiles(settings_list)
+
+    def standby_source(self):
+        if self.DUT_choice == 'f5560A':
+            self.M.standby_f5560A()
+        elif self.DUT_choice == 'f5730A':
+            self.M.standby_f5730A()
+        else:
+            raise ValueError("Invalid DUT selection made!")
+
+    def timed_row(self, row):
+        # appends the timing record of the measurement that returned row, when timing is enabled
+        if self.timer.enabled:
+            return list(row) + self.timer.values(TIMING_SPANS)
+        return row
+
     def run_continuous(self, func):
         DUT_choice = self.DUT_choice
 
@@ -348,36 +548,18 @@ class DistortionAnalyzer:
         print('Ending continuous run_source process.')
 
     # TEST FUNCTIONS ###################################################################################################
-    def test(self, setup):
-        print('\tmeasurement has started')
-
-        DUT_choice = self.DUT_choice
-
-        # SOURCE -------------------------------------------------------------------------------------------------------
-        amplitude = self.params['amplitude']
-        coupling = self.params['coupling']
-        f0 = self.params['frequency']
-
-        if self.params['rms'] != 0:
-            amplitude = amplitude / np.sqrt(2)
-            print('Provided amplitude converted to RMS.')
-
-        units = self.params['units']
-        time.sleep(1)
-
-        # DIGITIZER ----------------------------------------------------------------------------------------------------
-        mainlobe_type = self.params['mainlobe_type']
-        mainlobe_value = self.params['mainlobe_value']
-        filter_val = self.params['filter']
-
-        # DIGITIZED SIGNAL =============================================================================================
+    def get_digitize_parameters(self, f0, filter_val):
+        """
+        :param f0: frequency of the source. 0 for DC.
+        :param filter_val: filter selected on the panel
+        :return: (f0, Fs, N, aperture, runtime, hpf, lpf, window, method) of the capture. f0 is the frequency to source,
+        which a coherent capture adjusts slightly. method is 'aperture' or 'timer', the way the digitizer is set to Fs.
+        """
+        coherent = f0 != 0  # DC is digitized as 10 Hz, which has no cycles to make whole
         if f0 == 0:
+            f0 = 10
             lpf = 10e3
             hpf = 3  # high pass filter cutoff frequency
-            f0, Fs, N, aperture, runtime = get_FFT_parameters(f0=10, lpf=lpf,
-                                                              mainlobe_type=mainlobe_type,
-                                                              mainlobe_width=mainlobe_value,
-                                                              window=self.WINDOW_SELECTION)
         else:
             if filter_val == 'None':
                 lpf = 0  # low pass filter cutoff frequency
@@ -402,10 +584,70 @@ class DistortionAnalyzer:
                 hpf = 0
             else:
                 raise ValueError("Invalid filter cutoff selected!")
-            f0, Fs, N, aperture, runtime = get_FFT_parameters(f0=f0, lpf=lpf,
-                                                              mainlobe_type=mainlobe_type,
-                                                              mainlobe_width=mainlobe_value,
-                                                              window=self.WINDOW_SELECTION)
+
+        f0, Fs, N, aperture, runtime, window, method = self.get_capture_parameters(f0, lpf, coherent)
+        return f0, Fs, N, aperture, runtime, hpf, lpf, window, method
+
+    def get_capture_parameters(self, f0, lpf, coherent=False):
+        """
+        :param coherent: when true and COHERENT_SAMPLING is set, a capture of whole cycles is tried first
+        :return: (f0, Fs, N, aperture, runtime, window, method) of the capture. f0 is the frequency to source, which a
+        coherent capture adjusts slightly. method is 'aperture' or 'timer', the way the digitizer is set to Fs: the
+        cheapest of the two under PLAN_ACQUISITION, USE_APERTURE otherwise.
+        """
+        method = 'aperture' if self.USE_APERTURE else 'timer'
+        mainlobe_type = self.params['mainlobe_type']
+        mainlobe_value = self.params['mainlobe_value']
+
+        if coherent and self.COHERENT_SAMPLING:
+            try:
+                f0, Fs, N, aperture, runtime, cycles = get_coherent_FFT_parameters(f0, lpf, mainlobe_type,
+                                                                                    mainlobe_value, method=method)
+                print(f'\tcoherent capture of {cycles} cycles at {round(f0, 6)} Hz')
+                return f0, Fs, N, aperture, runtime, 'rectangular', method
+            except ValueError as e:
+                print(f'\t{e} Using the {self.WINDOW_SELECTION} window.')
+
+        if self.PLAN_ACQUISITION:
+            plan = plan_acquisition(f0, lpf, mainlobe_type, mainlobe_value, window=self.WINDOW_SELECTION,
+                                    transfer_format=self.M.transfer_format, fast_length=self.FAST_LENGTH)
+            print(f"\tplanned {plan['method']} capture of {plan['N']} samples at {round(plan['Fs'], 3)} Hz "
+                  f"(estimated {round(plan['cost'], 3)} s)")
+            return f0, plan['Fs'], plan['N'], plan['aperture'], plan['runtime'], self.WINDOW_SELECTION, plan['method']
+
+        f0, Fs, N, aperture, runtime = get_FFT_parameters(f0=f0, lpf=lpf,
+                                                          mainlobe_type=mainlobe_type,
+                                                          mainlobe_width=mainlobe_value,
+                                                          window=self.WINDOW_SELECTION,
+                                                          fast_length=self.FAST_LENGTH,
+                                                          method=method)
+
+        return f0, Fs, N, aperture, runtime, self.WINDOW_SELECTION, method
+
+    def test(self, setup):
+        print('\tmeasurement has started')
+        self.timer.reset()
+
+        DUT_choice = self.DUT_choice
+
+        # SOURCE -------------------------------------------------------------------------------------------------------
+        amplitude = self.params['amplitude']
+        coupling = self.params['coupling']
+        f0 = self.params['frequency']
+
+        if self.params['rms'] != 0:
+            amplitude = amplitude / np.sqrt(2)
+            print('Provided amplitude converted to RMS.')
+
+        units = self.params['units']
+        with self.timer.span('settle'):
+            time.sleep(1)
+
+        # DIGITIZER ----------------------------------------------------------------------------------------------------
+        filter_val = self.params['filter']
+
+        # DIGITIZED SIGNAL =============================================================================================
+        f0, Fs, N, aperture, runtime, hpf, lpf, window, method = self.get_digitize_parameters(f0, filter_val)
 
         # update measurement configuration -----------------------------------------------------------------------------
         self.panel.measurement_config_update(Fs, N, aperture)
@@ -417,27 +659,34 @@ class DistortionAnalyzer:
         if not self.DUMMY_DATA:
             # TODO: shouldn't we always want to setup digitizer for new range??
             if setup:
-                if self.USE_APERTURE:
-                    print('\tusing aperture to set sampling rate.')
-                    self.M.setup_digitize_aperture(units=units, ideal_range_val=amplitude, coupling=coupling,
-                                                   filter_val=filter_val, N=N, aperture=aperture)
-                else:
-                    print('\tusing timer to set sampling rate.')
-                    self.M.setup_digitize_timer(units=units, ideal_range_val=amplitude, coupling=coupling,
-                                                filter_val=filter_val, N=N, interval=1 / Fs)
+                with self.timer.span('digitizer setup'):
+                    if method == 'aperture':
+                        print('\tusing aperture to set sampling rate.')
+                        self.M.setup_digitize_aperture(units=units, ideal_range_val=amplitude, coupling=coupling,
+                                                       filter_val=filter_val, N=N, aperture=aperture)
+                    else:
+                        print('\tusing timer to set sampling rate.')
+                        self.M.setup_digitize_timer(units=units, ideal_range_val=amplitude, coupling=coupling,
+                                                    filter_val=filter_val, N=N, interval=1 / Fs)
             if not self.params['local']:
                 try:
                     # Run DUT ------------------------------------------------------------------------------------------
-                    if DUT_choice == 'f5560A':
-                        self.M.run_f5560A_source(units, amplitude, f0)
-                    elif DUT_choice == 'f5730A':
-                        self.M.run_f5730A_source(units, amplitude, f0)
-                    else:
-                        raise ValueError("Invalid DUT selection made!")
+                    with self.timer.span('source'):
+                        if DUT_choice == 'f5560A':
+                            self.M.run_f5560A_source(units, amplitude, f0)
+                        elif DUT_choice == 'f5730A':
+                            self.M.run_f5730A_source(units, amplitude, f0)
+                        else:
+                            raise ValueError("Invalid DUT selection made!")
+
+                    if self.CONFIRM_SETTLING:
+                        with self.timer.span('settle'):
+                            self.M.wait_for_f8588A_stable_rms(Fs, f0, N)
 
                     # Retrieve DMM -------------------------------------------------------------------------------------
                     try:
-                        yt = self.M.retrieve_digitize()
+                        with self.timer.span('retrieve'):
+                            yt = self.M.retrieve_digitize(runtime, N, progress=self.panel.acquisition_progress_update)
                     except ValueError:
                         print('error occurred while connecting to DMM. Placing 5560 in Standby.')
                         if DUT_choice == 'f5560A':
@@ -451,7 +700,8 @@ class DistortionAnalyzer:
                     print('error occurred while connecting to DUT. Exiting current measurement.')
                     raise
             else:
-                yt = self.M.retrieve_digitize()
+                with self.timer.span('retrieve'):
+                    yt = self.M.retrieve_digitize(runtime, N, progress=self.panel.acquisition_progress_update)
         else:
             try:
                 xt, yt = create_dummy_data(amplitude, f0, Fs, N)
@@ -459,11 +709,12 @@ class DistortionAnalyzer:
                 print('\n!!!\nCould not generate new dummy data. Using the DUMMY.csv currently available.\n!!!\n')
                 yt = pd.read_csv('results/history/DUMMY.csv')['yt'].to_numpy()
 
-        return self.fft(yt, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0)
+        return self.fft(yt, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0, window)
 
     # ------------------------------------------------------------------------------------------------------------------
     def test_analyze_shunt_voltage(self, setup):
         DUT_choice = self.DUT_choice
+        self.timer.reset()
 
         amplitude = self.params['amplitude']
         coupling = self.params['coupling']
@@ -474,32 +725,30 @@ class DistortionAnalyzer:
             print('Provided amplitude converted to RMS.')
 
         source_units = self.params['units']
-        if DUT_choice == 'f5560A':
-            self.M.run_f5560A_source(source_units, amplitude, f0)
-        elif DUT_choice == 'f5730A':
-            self.M.run_f5730A_source(source_units, amplitude, f0)
-        else:
-            raise ValueError("Invalid DUT selection made!")
-        time.sleep(1)
+        with self.timer.span('source'):
+            if DUT_choice == 'f5560A':
+                self.M.run_f5560A_source(source_units, amplitude, f0)
+            elif DUT_choice == 'f5730A':
+                self.M.run_f5730A_source(source_units, amplitude, f0)
+            else:
+                raise ValueError("Invalid DUT selection made!")
+        with self.timer.span('settle'):
+            time.sleep(1)
 
         # METER
-        self.M.setup_f8588A_meter(autorange=True, output_type='VOLT', mode='AC')
-        meter_outval, meter_range, meter_ft = self.M.read_f8588A_meter()
+        with self.timer.span('meter'):
+            self.M.setup_f8588A_meter(autorange=True, output_type='VOLT', mode='AC')
+            meter_outval, meter_range, meter_ft = self.M.read_f8588A_meter()
         dmm_units = 'V'
 
         # DIGITIZER ----------------------------------------------------------------------------------------------------
-        mainlobe_type = self.params['mainlobe_type']
-        mainlobe_width = self.params['mainlobe_width']
         filter_val = self.params['filter']
 
         # DIGITIZED SIGNAL =============================================================================================
         if f0 == 0:
+            f0 = 10
             lpf = 10e3
             hpf = 3  # high pass filter cutoff frequency
-            f0, Fs, N, aperture, runtime = get_FFT_parameters(f0=10, lpf=lpf,
-                                                              mainlobe_type=mainlobe_type,
-                                                              mainlobe_width=mainlobe_width,
-                                                              window=self.WINDOW_SELECTION)
         else:
             if filter_val == '100kHz':
                 lpf = 100e3  # low pass filter cutoff frequency
@@ -508,10 +757,8 @@ class DistortionAnalyzer:
             else:
                 lpf = 0
             hpf = 0
-            f0, Fs, N, aperture, runtime = get_FFT_parameters(f0=f0, lpf=lpf,
-                                                              mainlobe_type=mainlobe_type,
-                                                              mainlobe_width=mainlobe_width,
-                                                              window=self.WINDOW_SELECTION)
+        # the source is already running at f0, so the capture is never made coherent
+        f0, Fs, N, aperture, runtime, window, method = self.get_capture_parameters(f0, lpf)
 
         # update measurement configuration -----------------------------------------------------------------------------
         self.panel.measurement_config_update(Fs, N, aperture)
@@ -520,31 +767,41 @@ class DistortionAnalyzer:
         print('\tbeginning data collection process')
 
         if setup:
-            if self.USE_APERTURE:
-                print('\tusing aperture to set sampling rate.')
-                self.M.setup_digitize_aperture(units=dmm_units, ideal_range_val=amplitude, coupling=coupling,
-                                               filter_val=filter_val, N=N, aperture=aperture)
-            else:
-                print('\tusing timer to set sampling rate.')
-                self.M.setup_digitize_timer(units=dmm_units, ideal_range_val=amplitude, coupling=coupling,
-                                            filter_val=filter_val, N=N, interval=1 / Fs)
-        y = self.M.retrieve_digitize()
+            with self.timer.span('digitizer setup'):
+                if method == 'aperture':
+                    print('\tusing aperture to set sampling rate.')
+                    self.M.setup_digitize_aperture(units=dmm_units, ideal_range_val=amplitude, coupling=coupling,
+                                                   filter_val=filter_val, N=N, aperture=aperture)
+                else:
+                    print('\tusing timer to set sampling rate.')
+                    self.M.setup_digitize_timer(units=dmm_units, ideal_range_val=amplitude, coupling=coupling,
+                                                filter_val=filter_val, N=N, interval=1 / Fs)
+        with self.timer.span('retrieve'):
+            y = self.M.retrieve_digitize(runtime, N, progress=self.panel.acquisition_progress_update)
 
-        pd.DataFrame(data=y, columns=['ydata']).to_csv('results/y_data.csv')
+        # fft removes the dc offset of y in place, so the writer is given its own copy
+        with self.timer.span('history'):
+            y_data = pd.DataFrame(data=y.copy(), columns=['ydata'])
+            self.writer.submit('results/y_data.csv', y_data.to_csv, 'results/y_data.csv')
 
-        return self.fft(y, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0)
+        return self.fft(y, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0, window)
 
     # FFT ##############################################################################################################
-    def fft(self, yt, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0):
+    def fft(self, yt, runtime, Fs, N, aperture, hpf, lpf, amplitude, f0, window=None):
+        window = window or self.WINDOW_SELECTION
         yrms = rms_flat(yt)
         xt = np.arange(0, N, 1) / Fs
 
-        xf_fft, yf_fft, xf_rfft, yf_rfft, main_lobe_width = windowed_fft(yt, Fs, N, self.WINDOW_SELECTION)
+        with self.timer.span('windowed fft'):
+            xf_rfft, yf_rfft, main_lobe_width = windowed_fft(yt, Fs, N, window)
 
         # Find THD and THD+N -------------------------------------------------------------------------------------------
         try:
-            thdn, f0_sampled, noise_rms = THDN_F(xf_rfft, yf_rfft, Fs, N, main_lobe_width, hpf, lpf)
-            thd = THD(xf_rfft, yf_rfft, Fs, N, main_lobe_width)
+            spectrum = SpectrumAnalysis(xf_rfft, yf_rfft, Fs, N, hpf, lpf, coherent=is_coherent(f0, Fs, N, window))
+            with self.timer.span('THDN'):
+                thdn, f0_sampled, noise_rms = spectrum.thdn_f(main_lobe_width)
+            with self.timer.span('THD'):
+                thd = spectrum.thd(main_lobe_width)
             data = {'xt': xt, 'yt': yt, 'xf': xf_rfft, 'yf': yf_rfft,
                     'N': N, 'runtime': runtime, 'Fs': Fs, 'f0': f0}
         except ValueError as e:
@@ -563,10 +820,26 @@ class DistortionAnalyzer:
         # report results to main panel ---------------------------------------------------------------------------------
         self.panel.results_update(results_row)
 
-        # save measurement to csv --------------------------------------------------------------------------------------
-        header = ['xt', 'yt', 'xf', 'yf']
-        write_to_csv('results/history', 'measurement', header, xt, yt, xf_fft, yf_fft)
-        self.plot(data)
+        # save measurement to history ----------------------------------------------------------------------------------
+        with self.timer.span('history'):
+            if self.HISTORY_FORMAT == 'binary':
+                history_params = {'Fs': Fs, 'N': N, 'aperture': aperture, 'runtime': runtime,
+                                  'window': window, 'filter': self.params['filter'],
+                                  'hpf': hpf, 'lpf': lpf,
+                                  'amplitude': amplitude, 'units': self.params['units'], 'f0': f0}
+                self.writer.submit('measurement history', write_history, 'results/history', 'measurement',
+                                   history_params, xt=xt, yt=yt, yf=yf_rfft)
+            else:
+                header = ['xt', 'yt', 'xf', 'yf']
+                xf_fft, yf_fft = two_sided_spectrum(yf_rfft, N, Fs)
+                self.writer.submit('measurement history', write_to_csv, 'results/history', 'measurement', header,
+                                   xt, yt, xf_fft, yf_fft)
+        with self.timer.span('plot'):
+            self.plot(data)
+
+        self.results['Timing'].append(self.timer.record())
+        if self.timer.enabled:
+            print(f'\ttiming: {self.timer.summary()}')
 
         return [amplitude, f0, f0_sampled, yrms, thdn, thd, noise_rms, N, Fs, aperture]
 
@@ -1,5 +1,7 @@
 import numpy as np
-import math
+from collections import OrderedDict
+from functools import cached_property
+import threading
 
 """
 FFT Fundamentals
@@ -27,6 +29,12 @@ RMS in frequency domain
 https://stackoverflow.com/questions/23341935/find-rms-value-in-frequency-domain
 """
 
+SUM_BLOCK_SIZE = 4096  # elements per pairwise block in compensated_sum
+WINDOW_CACHE_BYTES = 256 * 2 ** 20  # memory cap on the window tables cached by windowed_fft
+MAINLOBE_BINS = {'rectangular': 2, 'bartlett': 4, 'hanning': 4, 'hamming': 4, 'blackman': 6}  # main lobe width
+COHERENT_CYCLE_TOLERANCE = 1e-6  # departure from a whole number of cycles still treated as a coherent capture
+FILTERED_MAGNITUDE = 1e-10  # magnitude left in the bins rejected by a filter, or by the notch of the fundamental
+
 
 ########################################################################################################################
 def rms_flat(a):
@@ -37,10 +45,57 @@ def rms_flat(a):
     # https://code.activestate.com/recipes/393090/
     # https://stackoverflow.com/a/33004170
     sqr = np.absolute(a) ** 2
-    mean = math.fsum(sqr) / len(sqr)  # computed from partial sums
+    mean = compensated_sum(sqr) / len(sqr)  # computed from compensated partial sums
     return np.sqrt(mean)
 
 
+def _two_sum_error(a, hi):
+    """
+    Exact rounding error of each addition hi[k + 1] = hi[k] + a[k] of a running sum (TwoSum).
+    """
+    s = hi[1:]
+    b_virtual = s - hi[:-1]
+    return (hi[:-1] - (s - b_virtual)) + (a - b_virtual)
+
+
+def compensated_sum(a, block=SUM_BLOCK_SIZE):
+    """
+    Return the sum of all the elements of *a*, flattened out. A drop-in replacement for math.fsum over numpy arrays at
+    close to the cost of np.sum:
+        + Blocks of *block* elements are summed by numpy's pairwise summation, accurate to a few ulp for the power sums
+          computed here (all terms of the same sign)
+        + The block sums are accumulated with the rounding error of each addition recovered exactly (TwoSum), so no
+          error builds up across blocks regardless of the length of *a*
+
+    Cancellation between terms of opposite sign within a block is not compensated. For ill-conditioned data of mixed
+    sign use math.fsum instead. demos/demo_precision.py benchmarks the accuracy and speed behind the default block size.
+    """
+    # https://doi.org/10.1137/030601818 (Ogita, Rump and Oishi - Accurate Sum and Dot Product, Algorithm 4.4 Sum2)
+    a = np.ravel(np.asarray(a, dtype=np.float64))
+    n = a.size - a.size % block
+    partials = np.append(a[:n].reshape(-1, block).sum(axis=1), a[n:].sum())
+
+    hi = np.zeros(partials.size + 1)
+    np.cumsum(partials, out=hi[1:])
+    return float(hi[-1] + np.sum(_two_sum_error(partials, hi)))
+
+
+def cumulative_sum(a):
+    """
+    Compensated prefix sum of *a*, returned as two arrays (hi, lo) of length len(a) + 1 where hi[k] + lo[k] is the sum
+    of the first k elements. lo accumulates the exact rounding error of each addition in hi (TwoSum), so the sum over
+    a[i:j] is recovered as (hi[j] - hi[i]) + (lo[j] - lo[i]) without the cancellation of a plain cumulative sum.
+    """
+    # https://doi.org/10.1137/030601818 (Ogita, Rump and Oishi - Accurate Sum and Dot Product)
+    a = np.asarray(a, dtype=np.float64)
+    hi = np.zeros(len(a) + 1)
+    np.cumsum(a, out=hi[1:])
+
+    lo = np.zeros(len(a) + 1)
+    np.cumsum(_two_sum_error(a, hi), out=lo[1:])
+    return hi, lo
+
+
 def find_range(f, x):
     """
     Find range between nearest local minima from peak at index x
@@ -59,7 +114,33 @@ def find_range(f, x):
     return lowermin, uppermin
 
 
-def getWindowLength(f0=10e3, fs=2.5e6, windfunc='blackman', error=0.1, mainlobe_type='relative'):
+def next_fast_length(n):
+    """
+    :param n: minimum length
+    :return: the smallest 5-smooth integer (2^a * 3^b * 5^c) not less than n. The FFT factors such lengths entirely
+    into its fastest radix kernels, where a length with a large prime factor falls back to much slower algorithms.
+    """
+    n = int(n)
+    if n <= 1:
+        return 1
+
+    best = 2 ** int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            # smallest power of 2 bringing p35 to at least n
+            quotient = -(-n // p35)
+            length = p35 * (1 << (quotient - 1).bit_length())
+            if length == n:
+                return n
+            best = min(best, length)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def getWindowLength(f0=10e3, fs=2.5e6, windfunc='blackman', error=0.1, mainlobe_type='relative', fast_length=False):
     """
     Computes the window length of the measurement. An error is expressed since the main lobe width is directly
     proportional to the number of cycles captured. The minimum value of M correlates to the lowest detectable frequency
@@ -71,6 +152,10 @@ def getWindowLength(f0=10e3, fs=2.5e6, windfunc='blackman', error=0.1, mainlobe_
     :param fs: sampling frequency
     :param windfunc: "Rectangular", "Bartlett", "Hanning", "Hamming", "Blackman"
     :param error: 100% error suggests the lowest detectable frequency is the fundamental
+    :param fast_length: round the window length up to the next 5-smooth length (see next_fast_length). The longer
+    window narrows the main lobe, so the requested resolution is kept. The record no longer holds the whole number of
+    cycles the main lobe width sets, so the fundamental falls between bins and its lobe spills past the main lobe width
+    used by THDN_F and THD. Check the figures with demos/demo_fft_length.py before relying on it.
     :return: window length of integer value (number of time series samples collected)
     """
     print('\tcomputing window length')
@@ -84,39 +169,72 @@ def getWindowLength(f0=10e3, fs=2.5e6, windfunc='blackman', error=0.1, mainlobe_
     else:
         raise ValueError('Incorrect main lobe type used!\nSelection should either be relative or absolute.')
 
-    if windfunc == 'rectangular':
-        M = int(2 * (fs / ldf))
-    elif windfunc in ('bartlett', 'hanning', 'hamming'):
-        M = int(4 * (fs / ldf))
-    elif windfunc == 'blackman':
-        M = int(6 * (fs / ldf))
-    else:
+    if windfunc not in MAINLOBE_BINS:
         raise ValueError('Not a valid windowing function.')
+    M = int(MAINLOBE_BINS[windfunc] * (fs / ldf))
+
+    if fast_length:
+        M = next_fast_length(M)
 
     return M
 
 
 ########################################################################################################################
-def windowed_fft(yt, Fs, N, windfunc='blackman'):
+class _WindowCache:
     """
-
-    :param yt: time series data
-    :param Fs: sampling frequency
-    :param N: number of samples, or the length of the time series data
-    :param windfunc: the chosen windowing function
-
-    :return:
-    xf_fft  : Two sided frequency axis.
-    yf_fft  : Two sided power spectrum.
-    xf_rfft : One sided frequency axis.
-    yf_rfft : One sided power spectrum.
-    main_lobe_width : The bandwidth (Hz) of the main lobe of the frequency domain window function.
+    Least recently used cache of the arrays windowed_fft derives from (window, N, Fs) alone. Continuous measurements
+    keep all three fixed, so the window, its correction factor and the frequency axes are only built once. Entries are
+    evicted oldest first once the arrays held exceed max_bytes. Cached arrays are returned read-only.
     """
-    print('\tperforming windowed FFT')
-
-    # remove DC offset
-    yt -= np.mean(yt)
 
+    def __init__(self, max_bytes=WINDOW_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # shared by the measurement thread and the gui (history) thread
+
+    def get(self, key, build):
+        """
+        :param key: hashable identifying the entry
+        :param build: callable returning a tuple of arrays and scalars for *key* when it is not cached. It is called
+        outside the lock, so a slow build does not hold up the other thread.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        entry = build()
+        for item in entry:
+            if isinstance(item, np.ndarray):
+                item.setflags(write=False)
+
+        size = sum(item.nbytes for item in entry if isinstance(item, np.ndarray))
+        with self._lock:
+            if key in self._entries:  # built by the other thread meanwhile
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            if size <= self.max_bytes:
+                self._entries[key] = entry
+                self.nbytes += size
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= sum(item.nbytes for item in evicted if isinstance(item, np.ndarray))
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_window_cache = _WindowCache()
+
+
+def _window_tables(windfunc, N, Fs):
+    """
+    :return: window, amplitude correction factor, main lobe width (Hz) and one sided frequency axis
+    """
     # Calculate windowing function and its length ----------------------------------------------------------------------
     if windfunc == 'rectangular':
         w = np.ones(N)
@@ -141,13 +259,38 @@ def windowed_fft(yt, Fs, N, windfunc='blackman'):
     # https://stackoverflow.com/q/47904399/3382269
     amplitude_correction_factor = 1 / np.mean(w)
 
+    xf_rfft = np.round(np.fft.rfftfreq(N, d=1. / Fs), 6)  # one-sided
+
+    return w, amplitude_correction_factor, main_lobe_width, xf_rfft
+
+
+def windowed_fft(yt, Fs, N, windfunc='blackman'):
+    """
+    Real FFT of the windowed time series. The window tables are cached on (windfunc, N, Fs), so repeated measurements
+    of the same configuration only pay for the transform itself. Use two_sided_spectrum for the two sided equivalent.
+
+    :param yt: time series data
+    :param Fs: sampling frequency
+    :param N: number of samples, or the length of the time series data
+    :param windfunc: the chosen windowing function
+
+    :return:
+    xf_rfft : One sided frequency axis.
+    yf_rfft : One sided power spectrum.
+    main_lobe_width : The bandwidth (Hz) of the main lobe of the frequency domain window function.
+    """
+    print('\tperforming windowed FFT')
+
+    # remove DC offset
+    yt -= np.mean(yt)
+
+    w, amplitude_correction_factor, main_lobe_width, xf_rfft = _window_cache.get(
+        (windfunc, N, Fs), lambda: _window_tables(windfunc, N, Fs))
+
     # Calculate the length of the FFT ----------------------------------------------------------------------------------
-    if (N % 2) == 0:
-        # for even values of N: FFT length is (N / 2) + 1
-        fft_length = int(N / 2) + 1
-    else:
-        # for odd values of N: FFT length is (N + 1) / 2
-        fft_length = int((N + 2) / 2)
+    # for even values of N: FFT length is (N / 2) + 1
+    # for odd values of N: FFT length is (N + 1) / 2
+    fft_length = len(xf_rfft)
 
     """
     Compute the FFT of the signal Divide by the length of the FFT to recover the original amplitude. Note dividing 
@@ -155,22 +298,387 @@ def windowed_fft(yt, Fs, N, windfunc='blackman'):
     However, we are only looking at one side of the FFT.
     """
     try:
-        yf_fft = (np.fft.fft(yt * w) / fft_length) * amplitude_correction_factor
-        xf_fft = np.round(np.fft.fftfreq(N, d=1. / Fs), 6)  # two-sided
-
-        yf_rfft = yf_fft[:fft_length]
-        xf_rfft = np.round(np.fft.rfftfreq(N, d=1. / Fs), 6)  # one-sided
-
+        yf_rfft = (np.fft.rfft(yt * w) / fft_length) * amplitude_correction_factor
     except ValueError as e:
         print('\n!!!\nError caught while performing fft of presumably length mismatched arrays.'
               '\nwindowed_fft method in distortion_calculator.py\n!!!\n')
         raise ValueError(e)
 
-    return xf_fft, yf_fft, xf_rfft, yf_rfft, main_lobe_width
+    return xf_rfft, yf_rfft, main_lobe_width
+
+
+def two_sided_spectrum(yf_rfft, N, Fs):
+    """
+    Rebuilds the two sided spectrum of a real signal from its one sided spectrum, using the conjugate symmetry of the
+    negative frequencies. Only needed where the full spectrum is stored, so windowed_fft does not compute it.
+
+    :param yf_rfft: one sided spectrum returned by windowed_fft
+    :param N: number of samples, or the length of the time series data
+    :param Fs: sampling frequency
+    :return: two sided frequency axis and spectrum, in np.fft.fft order
+    """
+    xf_fft = _window_cache.get(('two-sided', N, Fs), lambda: (np.round(np.fft.fftfreq(N, d=1. / Fs), 6),))[0]
+
+    yf_fft = np.empty(N, dtype=np.complex128)
+    fft_length = len(yf_rfft)
+    yf_fft[:fft_length] = yf_rfft
+    yf_fft[fft_length:] = np.conj(yf_rfft[1:N - fft_length + 1][::-1])
+
+    return xf_fft, yf_fft
+
+
+########################################################################################################################
+def is_coherent(f0, Fs, N, windfunc):
+    """
+    :return: True for a capture of whole cycles of f0 analysed with the rectangular window, as planned by
+    get_coherent_FFT_parameters
+    """
+    cycles = f0 * N / Fs
+    return windfunc == 'rectangular' and abs(cycles - round(cycles)) <= COHERENT_CYCLE_TOLERANCE
+
+
+class BandPowerIndex:
+    """
+    Compensated prefix sum of the power of each bin of a one sided spectrum (see cumulative_sum). The power between any
+    two bins is a difference of the table, so the rms of a band, with any number of lobes excluded, costs O(1) per
+    segment left in the band rather than a pass over the spectrum. Any number of filter settings can be evaluated on one
+    capture from a single index.
+
+    Frequencies map to bins as the filters of THDN_F do: a band from f1 to f2 spans bins int(f1 * N / Fs) through
+    int(f2 * N / Fs).
+
+    :param yf: one sided spectrum
+    :param Fs: sampling frequency
+    :param N: number of samples, or the length of the time series data
+    :param power: power of each bin, when already computed. Defaults to abs(yf) ** 2.
+    """
+
+    def __init__(self, yf, Fs, N, power=None):
+        if power is None:
+            power = np.abs(yf) ** 2
+        self.Fs = Fs
+        self.N = N
+        self.size = len(power)
+        self.hi, self.lo = cumulative_sum(power)
+
+    def bins(self, f1=0, f2=None):
+        """
+        :param f1: lower edge of the band in Hz
+        :param f2: upper edge of the band in Hz. None for the nyquist frequency.
+        :return: (start, stop) bins of the band
+        """
+        start = min(int(f1 * self.N / self.Fs), self.size)
+        stop = self.size if f2 is None else min(int(f2 * self.N / self.Fs) + 1, self.size)
+        return start, max(stop, start)
+
+    def power(self, start, stop):
+        """
+        :param start: first bin, or an array of them
+        :param stop: bin past the last, or an array of them. Bands with stop <= start are empty.
+        :return: power of the bins [start, stop)
+        """
+        start, stop = np.asarray(start), np.asarray(stop)
+        stop = np.maximum(stop, start)
+        return (self.hi[stop] - self.hi[start]) + (self.lo[stop] - self.lo[start])
+
+    def segments(self, start, stop, exclude=()):
+        """
+        :param exclude: (start, stop) bins of the lobes to leave out. Lobes may overlap each other or the band edges.
+        :return: arrays of the start and stop bins of the segments of [start, stop) outside every lobe. Segments with
+        stop <= start are empty.
+        """
+        exclude = np.asarray(exclude, dtype=int).reshape(-1, 2)
+        exclude = np.clip(exclude[np.argsort(exclude[:, 0], kind='stable')], start, stop)
+
+        # each segment runs from the furthest end of the lobes before it to the start of the next lobe
+        starts = np.append(start, np.maximum.accumulate(exclude[:, 1]))
+        stops = np.append(exclude[:, 0], stop)
+        return starts, stops
+
+    def band_power(self, f1=0, f2=None, exclude=()):
+        """
+        :param exclude: (start, stop) bins of the lobes to leave out (see segments)
+        :return: power between f1 and f2, excluding the lobes
+        """
+        starts, stops = self.segments(*self.bins(f1, f2), exclude)
+        return float(self.power(starts, stops).sum())
+
+    def band_rms(self, f1=0, f2=None, exclude=()):
+        """
+        :return: rms between f1 and f2, excluding the lobes (see band_power)
+        """
+        return np.sqrt(self.band_power(f1, f2, exclude))
+
+
+class SpectrumAnalysis:
+    """
+    The figures of merit of one capture, derived from intermediates computed once and shared between them: the
+    magnitude and power of each bin, the bin of the fundamental, the passband of the filters and a band power index
+    (see BandPowerIndex). The power of any band of bins is a difference of the index, so no figure copies or masks the
+    spectrum. filtered() evaluates other filter settings on the same intermediates.
+
+    As in the legacy THDN_F and THDN_R, bins rejected by the filters and the notch of the fundamental count as
+    FILTERED_MAGNITUDE towards THD+N.
+
+    :param xf: one sided frequency axis
+    :param yf: one sided spectrum
+    :param Fs: sampling frequency
+    :param N: number of samples, or the length of the time series data
+    :param hpf: high pass filter cutoff in Hz, 0 for none
+    :param lpf: low pass filter cutoff in Hz, 0 for none
+    :param coherent: true for a capture of whole cycles (see is_coherent), whose lobe edges are rounded to the nearest
+    bin rather than truncated
+    """
+
+    def __init__(self, xf, yf, Fs, N, hpf=0, lpf=100e3, coherent=False):
+        self.xf = xf
+        self.yf = yf
+        self.Fs = Fs
+        self.N = N
+        self.hpf = hpf
+        self.lpf = lpf
+        self.coherent = coherent
+        self._lobes = {}  # bins of the main lobe of the fundamental by main lobe width
+        self._harmonics = {}  # harmonics by main lobe width
+
+    # SHARED INTERMEDIATES ---------------------------------------------------------------------------------------------
+    @cached_property
+    def magnitude(self):
+        return np.abs(self.yf)
+
+    @cached_property
+    def power(self):
+        return self.magnitude ** 2
+
+    @cached_property
+    def index(self):
+        return BandPowerIndex(self.yf, self.Fs, self.N, self.power)
+
+    @cached_property
+    def fundamental_index(self):
+        # FIND FUNDAMENTAL (peak of frequency spectrum)
+        try:
+            return int(np.argmax(self.magnitude))
+        except (IndexError, ValueError):
+            raise ValueError('Failed to find fundamental. Most likely related to a zero-size array.')
+
+    @property
+    def fundamental(self):
+        return self.xf[self.fundamental_index]
+
+    @cached_property
+    def passband(self):
+        """
+        :return: (start, stop) bins passed by the high and low pass filters
+        """
+        hpf = 0
+        if not (self.hpf == 0) and (self.hpf < self.lpf):
+            print('\t>>applying high pass filter<<')
+            hpf = self.hpf
+        return self.index.bins(hpf, self.lpf or None)
+
+    @cached_property
+    def filter_mask(self):
+        start, stop = self.passband
+        mask = np.zeros(len(self.yf), dtype=bool)
+        mask[start:stop] = True
+        return mask
+
+    @cached_property
+    def filtered_magnitude(self):
+        return np.where(self.filter_mask, self.magnitude, FILTERED_MAGNITUDE)
+
+    def filtered(self, hpf=0, lpf=100e3):
+        """
+        :return: the analysis of the same capture with other filters, sharing the intermediates that do not depend on
+        the filters
+        """
+        analysis = SpectrumAnalysis(self.xf, self.yf, self.Fs, self.N, hpf, lpf, self.coherent)
+        for name in ('magnitude', 'power', 'index', 'fundamental_index'):
+            analysis.__dict__[name] = getattr(self, name)  # computed here once, for every analysis sharing them
+        analysis._harmonics = self._harmonics  # harmonics are found on the unfiltered spectrum
+        return analysis
+
+    def band_power(self, start, stop, filtered=False):
+        """
+        :param start: first bin of the band, or an array of them
+        :param stop: bin past the end of the band, or an array of them. Bands with stop <= start are empty.
+        :param filtered: when true, bins outside the passband count as FILTERED_MAGNITUDE
+        :return: power of the bins [start, stop)
+        """
+        start, stop = np.asarray(start), np.asarray(stop)
+        if filtered:
+            pass_start, pass_stop = self.passband
+            inner_start = np.clip(start, pass_start, pass_stop)
+            inner_stop = np.clip(stop, inner_start, pass_stop)
+            rejected = np.maximum(stop - start, 0) - (inner_stop - inner_start)
+            return self.index.power(inner_start, inner_stop) + rejected * FILTERED_MAGNITUDE ** 2
+
+        return self.index.power(start, stop)
+
+    def notched_power(self, exclude=()):
+        """
+        :param exclude: (start, stop) bins of the lobes notched out of the passband
+        :return: power of the passband with the lobes notched out. Rejected and notched bins count as FILTERED_MAGNITUDE
+        """
+        starts, stops = self.index.segments(*self.passband, exclude)
+        kept = np.maximum(stops - starts, 0).sum()
+        return float(self.index.power(starts, stops).sum()) + (len(self.yf) - kept) * FILTERED_MAGNITUDE ** 2
+
+    def lobe_bins(self, freq, main_lobe_width):
+        """
+        :param freq: centre frequency of the lobe, or an array of them
+        :return: (start, stop) bins of the lobe, main_lobe_width wide. Edges below DC or above the nyquist frequency
+        are clamped to the spectrum.
+        """
+        edges = (np.asarray(freq)[..., None] + np.array([-1, 1]) * main_lobe_width / 2) * (self.N / self.Fs)
+        if self.coherent:
+            # the edges of a coherent capture fall exactly on bins. Rounding rather than truncating keeps float error in
+            # the rounded frequency axis from dropping the peak bin out of the 2 bin lobe of the rectangular window
+            edges = np.rint(edges)
+        edges = np.clip(np.trunc(edges).astype(int), 0, len(self.yf))
+        return edges[..., 0], edges[..., 1]
+
+    def fundamental_lobe(self, main_lobe_width=None):
+        """
+        :param main_lobe_width: The bandwidth (Hz) of the main lobe of the frequency domain window function. When
+        None, the lobe spans the nearest local minima of the filtered spectrum around the fundamental.
+        :return: (start, stop) bins of the main lobe of the fundamental
+        """
+        if main_lobe_width not in self._lobes:
+            if main_lobe_width:
+                start, stop = self.lobe_bins(self.fundamental, main_lobe_width)
+            else:
+                start, stop = find_range(self.filtered_magnitude, self.fundamental_index)
+            self._lobes[main_lobe_width] = (int(start), int(stop))
+        return self._lobes[main_lobe_width]
+
+    def _fundamental_and_noise_power(self, main_lobe_width=None):
+        """
+        :return: filtered power of the main lobe of the fundamental, and of every other bin with the lobe notched out
+        """
+        start, stop = self.fundamental_lobe(main_lobe_width)
+        return float(self.band_power(start, stop, filtered=True)), self.notched_power([(start, stop)])
+
+    # FIGURES OF MERIT -------------------------------------------------------------------------------------------------
+    def thdn_f(self, main_lobe_width=None):
+        """
+        THD+N relative to the fundamental (see THDN_F).
+
+        :return: THDN, fundamental frequency and rms noise in uV
+        """
+        print('\tcomputing THDN_F figure')
+        fundamental, noise = self._fundamental_and_noise_power(main_lobe_width)
+        rms_noise = np.sqrt(noise)
+        return rms_noise / np.sqrt(fundamental), self.fundamental, round(1e6 * rms_noise, 2)
+
+    def thdn_r(self):
+        """
+        THD+N relative to the rms of the whole filtered signal (see THDN_R). The fundamental is notched between the
+        nearest local minima.
+
+        :return: THDN, fundamental frequency and rms of the filtered signal in uV
+        """
+        print('\tcomputing THDN_R figure')
+        n = len(self.yf)
+        _, noise = self._fundamental_and_noise_power()
+        rms_total = np.sqrt(self.notched_power() / n)  # Parseval's Theorem
+        return np.sqrt(noise / n) / rms_total, self.fundamental, round(1e6 * rms_total, 2)
+
+    def noise_rms(self, main_lobe_width=None):
+        """
+        :return: rms of the filtered spectrum with the fundamental notched out, harmonics included
+        """
+        return np.sqrt(self._fundamental_and_noise_power(main_lobe_width)[1])
+
+    def sinad(self, main_lobe_width=None):
+        """
+        :return: ratio of the fundamental to noise and distortion in dB, the reciprocal of THDN_F
+        """
+        fundamental, noise = self._fundamental_and_noise_power(main_lobe_width)
+        return 10 * np.log10(fundamental / noise)
+
+    def snr(self, main_lobe_width):
+        """
+        :return: ratio of the fundamental to the noise in dB, with the main lobes of the harmonics excluded as well
+        """
+        fundamental, _ = self._fundamental_and_noise_power(main_lobe_width)
+        _, start, stop = self._harmonic_lobes(main_lobe_width)
+        lobes = np.append([self.fundamental_lobe(main_lobe_width)], np.column_stack((start, stop)), axis=0)
+        return 10 * np.log10(fundamental / self.notched_power(lobes))
+
+    def sfdr(self, main_lobe_width=None):
+        """
+        :return: ratio of the peak of the fundamental to the largest other peak within the passband, in dB
+        """
+        pass_start, pass_stop = self.passband
+        start, stop = self.fundamental_lobe(main_lobe_width)
+        spurs = [self.magnitude[pass_start:min(start, pass_stop)], self.magnitude[max(stop, pass_start):pass_stop]]
+        spur = max((band.max() for band in spurs if band.size), default=FILTERED_MAGNITUDE)
+        return 20 * np.log10(self.magnitude[self.fundamental_index] / spur)
+
+    def _harmonic_lobes(self, main_lobe_width):
+        """
+        Locates the fundamental and each of its harmonics below the nyquist frequency. Peaks are searched over an index
+        matrix spanning 8 bins around each multiple of the fundamental bin.
+
+        :return: peak bin and (start, stop) bins of the main lobe of each harmonic. Index 0 is the fundamental.
+        """
+        f0_idx = self.fundamental_index
+        if f0_idx == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        n = len(self.yf)
+        n_harmonics = int(np.floor((self.Fs / 2) / self.fundamental) - 1)  # find maximum number of harmonics
+        local_idx = f0_idx * np.arange(1, n_harmonics + 1)
+
+        # LOCATE PEAKS -------------------------------------------------------------------------------------------------
+        if np.any(local_idx - 4 < 0) or np.any(local_idx - 4 >= n):
+            raise ValueError('Failed to capture all peaks for calculating THD.\nMost likely zero-size array.')
+
+        window_idx = local_idx[:, None] + np.arange(-4, 4)
+        window = self.magnitude[np.minimum(window_idx, n - 1)]
+        window[window_idx >= n] = -1  # bins beyond the spectrum are never selected
+        local_idx = local_idx + (4 - np.argmax(window, axis=1))
+        freq = self.xf[local_idx]
+
+        start, stop = self.lobe_bins(freq, main_lobe_width)
+        return local_idx, start, stop
+
+    def harmonics(self, main_lobe_width):
+        """
+        Integrates the energy within the main lobe of the fundamental and each of its harmonics below the nyquist
+        frequency. Lobe energies are differences of the band power index, O(1) per harmonic.
+
+        :param main_lobe_width: The bandwidth (Hz) of the main lobe of the frequency domain window function.
+        :return: frequency, rms amplitude and phase (radians) of each harmonic. Index 0 is the fundamental.
+        """
+        if main_lobe_width not in self._harmonics:
+            # https://stackoverflow.com/questions/23341935/find-rms-value-in-frequency-domain
+            local_idx, start, stop = self._harmonic_lobes(main_lobe_width)
+            energy = 2 * self.band_power(start, stop)  # of sqrt(2) * yf
+
+            amplitude = np.sqrt(energy)
+            phase = np.angle(self.yf[local_idx])
+            self._harmonics[main_lobe_width] = (self.xf[local_idx], amplitude, phase)
+        return self._harmonics[main_lobe_width]
+
+    def thd(self, main_lobe_width):
+        print('\tcomputing THD value')
+
+        freq, amplitude, phase = self.harmonics(main_lobe_width)
+
+        if amplitude.size:
+            thd = np.sqrt(compensated_sum(np.abs(amplitude[1:]) ** 2)) / np.abs(amplitude[0])
+        else:
+            print('Check the damn connection, you husk of an oat!')
+            thd = 1  # bad input usually. Check connection.
+
+        return thd
 
 
 ########################################################################################################################
-def THDN_F(xf, _yf, fs, N, main_lobe_width=None, hpf=0, lpf=100e3):
+def THDN_F(xf, _yf, fs, N, main_lobe_width=None, hpf=0, lpf=100e3, coherent=False):
     """
     [THDF compares the harmonic content of a waveform to its fundamental] and is a much better measure of harmonics
     content than THDR. Thus, the usage of THDF is advocated .
@@ -185,52 +693,7 @@ def THDN_F(xf, _yf, fs, N, main_lobe_width=None, hpf=0, lpf=100e3):
 
     :returns: THD and fundamental frequency
     """
-    print('\tcomputing THDN_F figure')
-
-    yf = np.array(_yf, copy=True)  # protects yf from mutation
-    # freqs = np.fft.rfftfreq(len(_yf))
-
-    # FIND FUNDAMENTAL (peak of frequency spectrum) --------------------------------------------------------------------
-    try:
-        f0_idx = np.argmax(np.abs(yf))
-        fundamental = xf[f0_idx]
-    except IndexError:
-        raise ValueError('Failed to find fundamental. Most likely index was outside of bounds.')
-
-    # APPLY HIGH PASS FILTERING ----------------------------------------------------------------------------------------
-    if not (hpf == 0) and (hpf < lpf):
-        print('>>applying high pass filter<<')
-        fc = int(hpf * N / fs)
-        yf[:fc] = 1e-10
-
-    # APPLY LOW PASS FILTERING -----------------------------------------------------------------------------------------
-    if lpf != 0:
-        fc = int(lpf * N / fs) + 1
-        yf[fc:] = 1e-10
-
-    # COMPUTE RMS FUNDAMENTAL ------------------------------------------------------------------------------------------
-    # https://stackoverflow.com/questions/23341935/find-rms-value-in-frequency-domain
-    # Find the local minimas of the main lobe fundamental frequency
-    if main_lobe_width:
-        left_of_lobe = int((fundamental - main_lobe_width / 2) * (N / fs))
-        right_of_lobe = int((fundamental + main_lobe_width / 2) * (N / fs))
-    else:
-        left_of_lobe, right_of_lobe = find_range(abs(yf), f0_idx)
-
-    rms_fundamental = np.sqrt(math.fsum(np.abs(yf[left_of_lobe:right_of_lobe]) ** 2))
-
-    # REJECT FUNDAMENTAL FOR NOISE RMS ---------------------------------------------------------------------------------
-    # Throws out values within the region of the main lobe fundamental frequency
-    yf[left_of_lobe:right_of_lobe] = 1e-10
-
-    # COMPUTE RMS NOISE ------------------------------------------------------------------------------------------------
-    rms_noise = np.sqrt(math.fsum(np.abs(yf) ** 2))
-
-    # THDN CALCULATION -------------------------------------------------------------------------------------------------
-    # https://www.thierry-lequeu.fr/data/PESL-00101-2003-R2.pdf
-    THDN = rms_noise / rms_fundamental
-
-    return THDN, fundamental, round(1e6 * rms_noise, 2)
+    return SpectrumAnalysis(xf, _yf, fs, N, hpf, lpf, coherent).thdn_f(main_lobe_width)
 
 
 def THDN_R(xf, yf, fs, N, hpf=0, lpf=100e3):
@@ -253,113 +716,36 @@ def THDN_R(xf, yf, fs, N, hpf=0, lpf=100e3):
 
     :returns: THD and fundamental frequency
     """
-    print('\tcomputing THDN_R figure')
-
-    _yf = np.array(yf, copy=True)  # protects yf from mutation
-    freqs = np.fft.rfftfreq(len(_yf))
-
-    # FIND FUNDAMENTAL (peak of frequency spectrum) --------------------------------------------------------------------
-    try:
-        f0_idx = np.argmax(np.abs(_yf))
-        fundamental = xf[f0_idx]
-    except IndexError:
-        raise ValueError('Failed to find fundamental. Most likely index was outside of bounds.')
-
-    # APPLY HIGH PASS FILTERING ----------------------------------------------------------------------------------------
-    if not (hpf == 0) and (hpf < lpf):
-        print('\t>>applying high pass filter<<')
-        fc = int(hpf * N / fs)
-        _yf[:fc] = 1e-10
-
-    # APPLY LOW PASS FILTERING -----------------------------------------------------------------------------------------
-    if lpf != 0:
-        fc = int(lpf * N / fs) + 1
-        _yf[fc:] = 1e-10
-
-    # REJECT FUNDAMENTAL FOR NOISE RMS ---------------------------------------------------------------------------------
-    # https://stackoverflow.com/questions/ 23341935/find-rms-value-in-frequency-domain
-    rms_total = rms_flat(_yf)  # Parseval'sTheorem
-
-    # NOTCH REJECT FUNDAMENTAL AND MEASURE NOISE -----------------------------------------------------------------------
-    # Find local minimas around main lobe fundamental frequency and throws out values within this window.
-    # TODO: Calculate mainlobe width of the windowing function rather than finding local minimas?
-    left_of_lobe, right_of_lobe = find_range(abs(_yf), f0_idx)
-    _yf[left_of_lobe:right_of_lobe] = 1e-10
-
-    # COMPUTE RMS NOISE ------------------------------------------------------------------------------------------------
-    rms_noise = rms_flat(_yf)  # Parseval's Theorem
-
-    # THDN CALCULATION -------------------------------------------------------------------------------------------------
-    # https://www.thierry-lequeu.fr/data/PESL-00101-2003-R2.pdf
-    THDN = rms_noise / rms_total
-
-    return THDN, fundamental, round(1e6 * rms_total, 2)
+    return SpectrumAnalysis(xf, yf, fs, N, hpf, lpf).thdn_r()
 
 
 ########################################################################################################################
-def THD(xf, yf, Fs, N, main_lobe_width):
-    print('\tcomputing THD value')
-    _yf = np.array(yf, copy=True)  # protects yf from mutation
-    _yf_data_peak = max(abs(yf))
-    # FIND FUNDAMENTAL (peak of frequency spectrum)
-    try:
-        f0_idx = np.argmax(np.abs(_yf))
-        f0 = xf[f0_idx]
-    except IndexError:
-        raise ValueError('Failed to find fundamental for computing the THD.\nMost likely related to a zero-size array.')
-
-    # COMPUTE RMS FUNDAMENTAL ------------------------------------------------------------------------------------------
-    # https://stackoverflow.com/questions/23341935/find-rms-value-in-frequency-domain
-    # Find the local minimas of the main lobe fundamental frequency
-
-    if f0_idx != 0:
-        n_harmonics = int(np.floor((Fs / 2) / f0) - 1)  # find maximum number of harmonics
-        amplitude = np.zeros(n_harmonics)
-
-        for h in range(n_harmonics):
-            local_idx = f0_idx * int(h + 1)
-            try:
-                local_idx = local_idx + (4-np.argmax(np.abs(yf[local_idx - 4:local_idx + 4])))
-                freq = xf[local_idx]
-
-                left_of_lobe = int((freq - main_lobe_width / 2) * (N / Fs))
-                right_of_lobe = int((freq + main_lobe_width / 2) * (N / Fs))
-
-                amplitude[h] = np.sqrt(math.fsum(np.abs(np.sqrt(2)*yf[left_of_lobe:right_of_lobe]) ** 2))
+def harmonics(xf, yf, Fs, N, main_lobe_width, coherent=False):
+    """
+    See SpectrumAnalysis.harmonics. Build one SpectrumAnalysis per capture to share its intermediates between figures.
+    """
+    return SpectrumAnalysis(xf, yf, Fs, N, coherent=coherent).harmonics(main_lobe_width)
 
-            except ValueError:
-                raise ValueError('Failed to capture all peaks for calculating THD.\nMost likely zero-size array.')
-        thd = np.sqrt(math.fsum(np.abs(amplitude[1:]) ** 2)) / np.abs(amplitude[0])
-    else:
-        print('Check the damn connection, you husk of an oat!')
-        thd = 1  # bad input usually. Check connection.
 
-    return thd
+def THD(xf, yf, Fs, N, main_lobe_width, coherent=False):
+    return SpectrumAnalysis(xf, yf, Fs, N, coherent=coherent).thd(main_lobe_width)
 
 
 def rms_noise(yf, fs, N, hpf=0, lpf=100e3):
-    # APPLY HIGH PASS FILTERING
-    if not (hpf == 0) and (hpf < lpf):
-        fc = int(hpf * N / fs)
-        yf[:fc] = 1e-10
-
-    # APPLY LOW PASS FILTERING
-    if lpf != 0:
-        fc = int(lpf * N / fs)
-        yf[fc:] = 1e-10
+    """
+    Masks the spectrum outside the passband of THDN_F, hpf to lpf, in place. The edges come from the same band power
+    index (see BandPowerIndex.bins), so the bin of the low pass filter is passed here as it is there.
 
+    :return: yf, with the rejected bins set to FILTERED_MAGNITUDE
+    """
+    yf[~SpectrumAnalysis(None, yf, fs, N, hpf, lpf).filter_mask] = FILTERED_MAGNITUDE
     return yf
 
 
 def flicker_noise(yf, fs, N, hpf=0.1, lpf=10):
-    # APPLY HIGH PASS FILTERING
-    if not (hpf == 0) and (hpf < lpf):
-        fc = int(hpf * N / fs)
-        yf[:fc] = 1e-10
-
-    # APPLY LOW PASS FILTERING
-    if lpf != 0:
-        fc = int(lpf * N / fs)
-        yf[fc:] = 1e-10
+    """
+    rms_noise over the flicker noise band, 0.1 Hz to 10 Hz by default.
 
-    return yf
+    :return: yf, masked
+    """
+    return rms_noise(yf, fs, N, hpf, lpf)
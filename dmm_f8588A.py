@@ -2,14 +2,53 @@ import VisaClient
 import time
 import numpy as np
 
+from instrument_profiles import ProfileIndex
+
 DIGITIZER_SAMPLING_FREQUENCY = 5e6
+READING_TIME = 1 / DIGITIZER_SAMPLING_FREQUENCY  # duration of the shortest reading, 200 ns
+
+# Settings that lower the sampling frequency of the digitizer (see get_aperture and setup_digitize_timer)
+APERTURE_FINE_LIMIT = 1e-3  # the aperture steps by one reading time up to 1 ms
+APERTURE_COARSE_STEP = 100e-6  # and by 100 us from 1 ms
+APERTURE_MAX = 3e-3
+TIMER_RESOLUTION = 20e-9  # the trigger timer steps by 20 ns from one reading time
+
+# The deadline for a capture to complete is derived from its expected runtime
+DIGITIZE_TIMEOUT_MARGIN = 1.5  # multiple of the expected runtime
+DIGITIZE_TIMEOUT_OVERHEAD = 2.0  # seconds allowed for triggering and instrument overhead
+
+# FORMat:DATA options for transferring the digitizer buffer as an IEEE 488.2 block. 'ASCII' remains as a fallback.
+TRANSFER_FORMATS = {'REAL64': 'd', 'REAL32': 'f'}
+
+# Records longer than the threshold are removed from the reading memory in blocks of DIGITIZE_CHUNK_SIZE samples, so
+# only one block is ever held in transit alongside the preallocated buffer
+CHUNKED_ACQUISITION_THRESHOLD = 1_000_000  # samples
+DIGITIZE_CHUNK_SIZE = 100_000  # samples
+
+# Confirmation that the source has settled, from the rms of successive short captures
+STABLE_RMS_PERIODS = 10  # periods of the fundamental per short capture
+STABLE_RMS_TOLERANCE = 1e-4  # relative change in rms between captures accepted as settled
+STABLE_RMS_MAX_CAPTURES = 10
+
+# Averaged meter readings are triggered as one burst of TRIGger:COUNt readings and fetched in a single query
+METER_SETTLE_DELAY = 1.0  # seconds allowed for the reading to settle before the burst
+METER_READING_TIMEOUT = 2.0  # seconds allowed per reading of the burst
+
+# Setups saved to the instrument memory (*SAV) and recalled (*RCL) per point of a sweep. The settings that vary between
+# points, and the transfer format, which a saved setup does not hold, are sent after each recall.
+PROFILE_SLOTS = tuple(range(1, 9))
+PROFILE_VARIABLES = ('aperture', 'timer', 'count')
+PROFILE_UNSAVED = ('format', 'border')
 instruments = {'f8588A': {'address': '10.205.92.156', 'port': '3490', 'gpib': '6', 'mode': 'SOCKET'}}
 
 
 ########################################################################################################################
 def to_float(string_val):
     try:
-        float_val = float(string_val)
+        float_val = VisaClient.scpi_float(string_val)
+    except VisaClient.OverloadError:
+        print('[ERROR] Measurement over-range. The Fluke 8588A reported an overload or no valid reading.')
+        raise
     except ValueError:
         print('[ERROR] Measurement could not be converted to float. Possible issues with configuration.')
         raise ValueError('Prospective measurement obtained by the Fluke 8588A could not be converted to float. Suspect '
@@ -18,6 +57,19 @@ def to_float(string_val):
         return float_val
 
 
+def to_readings(string_val):
+    # comma separated readings, as returned by FETCH? for a burst of readings
+    return np.array([to_float(value) for value in string_val.split(',')])
+
+
+def getIdealSamplingFrequency(f0, bw=100e3):
+    """
+    :return: the lowest sampling frequency placing the Nyquist frequency an octave above the filter cutoff, bw, and
+    resolving 50 harmonics of f0 (see getSamplingFrequency), limited to the 5 MHz the digitizer samples at most
+    """
+    return min(max(2 * (2*bw), 100 * f0), DIGITIZER_SAMPLING_FREQUENCY)
+
+
 def getSamplingFrequency(f0, bw=100e3):
     """
     The maximum detectable frequency resolved by an FFT is defined as half the sampling frequency.
@@ -33,8 +85,7 @@ def getSamplingFrequency(f0, bw=100e3):
     Since a 1-pole filter attenuates 6 dB/octave, then Nyquist should be placed at 2BW or fs = 4BW to place the 
     Nyquist 6dB down from the filter cutoff. 2BW is 1 octave from the BW
     """
-    # Ideal sampling frequency
-    _Fs = max(2 * (2*bw), 100 * f0)
+    _Fs = getIdealSamplingFrequency(f0, bw)
 
     # An integer number of samples averaged per measurement determines actual sampling frequency
     N = max(round(DIGITIZER_SAMPLING_FREQUENCY / _Fs), 1)
@@ -103,15 +154,52 @@ def get_aperture(Fs, N):
     Navg = max(round(DIGITIZER_SAMPLING_FREQUENCY / Fs), 1)  # The number of samples averaged per trigger
 
     # The duration of the digitizer averaging per trigger
-    aperture = max(200e-9 * (Navg - 1), 0)
-    if aperture > 1e-3:
-        aperture = max(100e-6 * (Navg - 1), 0)
+    aperture = READING_TIME * (Navg - 1)
+    if aperture > APERTURE_FINE_LIMIT:
+        # the nearest 100 us step. The sampling frequency achieved is aperture_sampling_frequency(aperture), not Fs
+        aperture = min(round(aperture / APERTURE_COARSE_STEP), round(APERTURE_MAX / APERTURE_COARSE_STEP))
+        aperture = aperture * APERTURE_COARSE_STEP
 
-    runtime = N * (aperture + 200e-9)  # The total runtime
+    runtime = N * (aperture + READING_TIME)  # The total runtime
 
     return aperture, runtime
 
 
+def aperture_sampling_frequency(aperture):
+    """
+    :return: the sampling frequency achieved by the aperture. Every aperture step is a whole number of readings.
+    """
+    return DIGITIZER_SAMPLING_FREQUENCY / round((aperture + READING_TIME) * DIGITIZER_SAMPLING_FREQUENCY)
+
+
+def aperture_settings(Fs_min):
+    """
+    :param Fs_min: lowest sampling frequency accepted
+    :return: generator of (aperture, Fs) for every aperture step sampling at Fs_min or above, from the lowest Fs up
+    """
+    fine_readings = round(APERTURE_FINE_LIMIT / READING_TIME) + 1
+    coarse_step = round(APERTURE_COARSE_STEP / READING_TIME)
+    readings = list(range(1, fine_readings + 1))
+    readings += list(range(fine_readings + coarse_step, round(APERTURE_MAX / READING_TIME) + 2, coarse_step))
+
+    for n in reversed(readings):
+        Fs = DIGITIZER_SAMPLING_FREQUENCY / n
+        if Fs >= Fs_min:
+            yield READING_TIME * (n - 1), Fs
+
+
+def timer_settings(Fs_min):
+    """
+    :param Fs_min: lowest sampling frequency accepted
+    :return: generator of (interval, Fs) for every trigger timer interval sampling at Fs_min or above, from the lowest
+    Fs up
+    """
+    clock = round(1 / TIMER_RESOLUTION)
+    shortest = round(READING_TIME / TIMER_RESOLUTION)
+    for ticks in range(int(clock // Fs_min), shortest - 1, -1):
+        yield ticks * TIMER_RESOLUTION, clock / ticks
+
+
 class f8588A_instrument:
     """"""
 
@@ -125,9 +213,18 @@ class f8588A_instrument:
         self.output_type = 'VOLT'
         self.mode = 'DC'
 
+        self.transfer_format = 'REAL64'  # 'REAL64', 'REAL32' or 'ASCII'
+        self.byte_order = 'SWAPped'  # 'NORMal' (big-endian) or 'SWAPped' (little-endian)
+        self.chunk_size = DIGITIZE_CHUNK_SIZE  # samples per block of a chunked retrieval
+        self.buffered_readings = True  # average meter readings from a single triggered burst
+        self.digitize_settings = None  # digitizer configuration last sent, by setting. None when unknown
+        self.profile_index = ProfileIndex()  # setups saved to the instrument memory, by instrument and slot
+        self.use_profiles = False  # recall saved setups. Set by store_f8588A_profiles
+
     def connect_to_f8588A(self, instr_id):
         # ESTABLISH COMMUNICATION TO INSTRUMENTS -----------------------------------------------------------------------
         self.f8588A = VisaClient.VisaClient(instr_id)  # Fluke 8588A
+        self.digitize_settings = None
 
         if self.f8588A.healthy:
             self.f8588_connected = True
@@ -155,6 +252,7 @@ class f8588A_instrument:
         print('\tsetting up 8588A')
 
         self.output_type, self.mode = self._get_function_params(**kwds)  # Example: ('VOLT', 'AC')
+        self.digitize_settings = None  # leaves the digitize function
 
         try:
             self.f8588A.write(f'CONF:{self.output_type}:{self.mode}')
@@ -162,6 +260,7 @@ class f8588A_instrument:
 
             if autorange:
                 self.f8588A.write(f'{self.output_type}:{self.mode}:RANGE:AUTO ON')
+                self.f8588A.verify_writes()
             else:
                 # Set Fluke 884xA to largest range for internal protection by default.
                 self.set_f8588A_range(ideal_range_val=1000, output_type=self.output_type, mode=self.mode)
@@ -311,6 +410,7 @@ class f8588A_instrument:
 
         # Get function parameters for Fluke 8588A ----------------------------------------------------------------------
         self.output_type, self.mode = self._get_function_params(**kwds)  # ('VOLT', 'AC')
+        self.digitize_settings = None
 
         # Causes the meter to exit autoranging on the primary display and enter manual ranging. The present range ------
         # becomes the selected range. ----------------------------------------------------------------------------------
@@ -322,6 +422,7 @@ class f8588A_instrument:
         # Set new range ------------------------------------------------------------------------------------------------
         try:
             self.f8588A.write(f"{self.output_type}:{self.mode}:RANGE {range_val}")
+            self.f8588A.verify_writes()
             print(f"Successfully set range of Fluke 884xA to {range_val} ({range_string})")
             return True
         except Exception:
@@ -340,26 +441,40 @@ class f8588A_instrument:
         """
         if self.setup_complete:
             time.sleep(1)
-            self.f8588A.write('INIT:IMM')
+            self.f8588A.write('INIT:IMM', verify=False)
 
             # Primary result = 1 (page 17 of 8588A's programmers manual)
             # A return of 9.91E+37 indicates there is not a valid value to return (NaN - not a number)
             # time delay prevents NaN result
             time.sleep(0.2)
-            outval = to_float(self.f8588A.query('FETCH? 1'))
-            dmm_range = self.get_f8588A_range()
-
+            cmds = ['FETCH? 1', f'{self.output_type}:{self.mode}:RANGE?']
             if self.mode == 'AC':
                 # FREQuency = 2 (page 17 of 8588A's programmers manual)
-                freqval = to_float(self.f8588A.query('FETCH? 2'))
-            else:
-                freqval = 0.0
+                cmds.append('FETCH? 2')
+
+            values = self.f8588A.query_many(cmds, [to_float] * len(cmds))
+            outval, dmm_range = values[:2]
+            freqval = values[2] if self.mode == 'AC' else 0.0
 
             return outval, freqval, dmm_range
         else:
             raise ValueError('Fluke 8588A has not been configured for measurement properly or has been disconnected.')
 
     def average_f8588A_reading(self, samples=10, dt=0.1):
+        """
+        :param samples: number of readings averaged
+        :param dt: delay between readings when they are taken one at a time
+        :return: mean, secondary (frequency) value and standard deviation of the readings
+        """
+        if self.buffered_readings:
+            try:
+                return self.average_f8588A_buffered(samples)
+            except VisaClient.OverloadError:
+                raise
+            except ValueError as e:
+                print(f'buffered readings failed ({e}). Falling back to single readings.')
+                self.buffered_readings = False
+
         readings = np.zeros(samples)
         freqval = 0.0
 
@@ -372,6 +487,44 @@ class f8588A_instrument:
 
         return mean, freqval, std
 
+    def average_f8588A_buffered(self, samples=10):
+        """
+        Triggers the readings as a single burst (TRIGger:COUNt) once the input has settled, and fetches every primary
+        reading together with the secondary (frequency) reading in one query. Replaces a settling delay and three
+        queries per reading with one delay and one query per average.
+
+        :param samples: number of readings averaged
+        :return: mean, secondary (frequency) value and standard deviation of the readings
+        """
+        if not self.setup_complete:
+            raise ValueError('Fluke 8588A has not been configured for measurement properly or has been disconnected.')
+
+        time.sleep(METER_SETTLE_DELAY)
+        self.digitize_settings = None  # FORMat:DATA is changed until the burst is over
+        try:
+            self.f8588A.write_many(['FORMat:DATA ASCii', f'TRIGger:COUNt {samples}', '*CLS', 'INITiate:IMMediate',
+                                    '*OPC'])
+            timeout = samples * METER_READING_TIMEOUT
+            if not self.f8588A.wait_for_complete(timeout):
+                print(f'\tmeter did not report completion within {round(timeout, 3)}s. Fetching anyway.')
+
+            # FREQuency = 2 (page 17 of 8588A's programmers manual)
+            if self.mode == 'AC':
+                readings, freqval = self.f8588A.query_many(['FETCH?', 'FETCH? 2'], [to_readings, to_float])
+            else:
+                readings, freqval = to_readings(self.f8588A.query('FETCH?')), 0.0
+        finally:
+            # the digitizer reads back its buffer in the transfer format, which a later retrieve_digitize assumes
+            self.f8588A.write_many(['TRIGger:COUNt 1'] + list(self._f8588A_transfer_format_settings().values()))
+
+        if len(readings) != samples:
+            raise ValueError(f'expected {samples} readings but received {len(readings)}')
+
+        mean = readings.mean()
+        std = np.sqrt(np.mean(abs(readings - mean) ** 2))
+
+        return mean, freqval, std
+
     # DIGITIZER ########################################################################################################
     def setup_digitize_aperture(self, units, ideal_range_val, coupling, filter_val, N, aperture):
         """
@@ -386,37 +539,11 @@ class f8588A_instrument:
         # determine the appropriate digitzer mode from output_type. Setting the mode here doesn't matter
         self.output_type, self.mode = self._get_function_params(units=units, mode='AC')
 
-        # Calculate the closest range for measurement ------------------------------------------------------------------
-        range_val, range_string = self.determine_f8588A_range(ideal_range_val, self.output_type)  # (0.1, '0.1A')
-
-        self.f8588A.write('*RST')
-
         try:
-            self.f8588A.write(f':FUNC "DIGitize:{self.output_type}" ')
-            self.f8588A.write(f':DIGitize:{self.output_type}:RANGe {range_val}')
+            settings, range_string = self.digitize_aperture_settings(units, ideal_range_val, coupling, filter_val,
+                                                                     N, aperture)
+            self.write_f8588A_digitize_settings(settings)
             print(f"Successfully set range of Fluke 8588A to {range_string}")
-
-            # :FILTer OFF|100Khz|3MHZ ----------------------------------------------------------------------------------
-            if filter_val not in ('None', '2MHz', '2.4MHz'):
-                self.f8588A.write(f':DIGitize:FILTer {filter_val}')
-            else:
-                self.f8588A.write(f':DIGitize:FILTer OFF')
-
-            # AC1M = AC Coupling, 1Mohm input impedance
-            # AC10M = AC Coupling, 10Mohm input impedance
-            # DC1M = DC Coupling, 1Mohm input impedance
-            # DC10M - DC Coupling, 10 Mohm input impedance
-            # DCAuto = DC Coupling, maximum avialable input impedance
-            self.f8588A.write(f':DIGitize:VOLTage:COUPling:SIGNal {coupling}')
-
-            # setup digitizer with aperture length ---------------------------------------------------------------------
-            # f8588A has a 5MHz sampled rate clock. adjusting aperture time,
-            # averages more points, which adjusts sample rate
-            self.f8588A.write(f':DIGitize:APERture {aperture}')
-            self.f8588A.write('TRIGger:RESet')
-            self.f8588A.write(f'TRIGGER:COUNT {N}')
-            self.f8588A.write('TRIGger:DELay:AUTO OFF')
-            self.f8588A.write('TRIGGER:DELay 0')
             return True  # returns true if digitizer setup completes successfully
 
         except Exception as e:
@@ -448,55 +575,336 @@ class f8588A_instrument:
         # determine the appropriate digitzer mode from output_type. Setting the mode here doesn't matter
         self.output_type, self.mode = self._get_function_params(units=units, mode='AC')
 
-        # Calculate the closest range for measurement ------------------------------------------------------------------
-        range_val, range_string = self.determine_f8588A_range(ideal_range_val, self.output_type)  # (0.1, '0.1A')
-
-        self.f8588A.write('*RST')
-
         try:
-            self.f8588A.write(f':FUNC "DIGitize:{self.output_type}" ')
-            self.f8588A.write(f':DIGitize:{self.output_type}:RANGe {range_val}')
+            settings, range_string = self.digitize_timer_settings(units, ideal_range_val, coupling, filter_val,
+                                                                  N, interval)
+            self.write_f8588A_digitize_settings(settings)
             print(f"Successfully set range of Fluke 8588A to {range_string}")
 
-            # :FILTer OFF|100Khz|3MHZ ----------------------------------------------------------------------------------
-            if filter_val not in ('None', '2MHz', '2.4MHz'):
-                self.f8588A.write(f':DIGitize:FILTer {filter_val}')
-            else:
-                self.f8588A.write(f':DIGitize:FILTer OFF')
-
-            self.f8588A.write(f':DIGitize:VOLTage:COUPling:SIGNal {coupling}')
-
-            # setup digitizer with trigger timer -----------------------------------------------------------------------
-            self.f8588A.write("SENSE:DIG:APERTURE 0.000")
-            self.f8588A.write("TRIGger:RESet")
-            self.f8588A.write("TRIGger:SOURce TIMer")
-            self.f8588A.write(f"TRIGger:TIMer {interval}")
-            self.f8588A.write(f'TRIGGER:COUNT {N}')
-            self.f8588A.write("TRIGger:DELay:AUTO OFF")
-            self.f8588A.write("TRIGger:DELay 0")
-
         except Exception as e:
             print('setup_digitizer for the Fluke 8588A failed. What error was thrown here?')
             print(e)
             raise ValueError('Setting up digitizer for Fluke 8588A failed.'
                              '\nCheck connection and configuration to instrument.')
 
-    def retrieve_digitize(self):
+    def digitize_aperture_settings(self, units, ideal_range_val, coupling, filter_val, N, aperture):
+        """
+        :return: the settings sent by setup_digitize_aperture, without sending them, and the range as a string
+        """
+        settings, range_string = self._digitize_input_settings(units, ideal_range_val, coupling, filter_val)
+
+        # setup digitizer with aperture length -------------------------------------------------------------------------
+        # f8588A has a 5MHz sampled rate clock. adjusting aperture time,
+        # averages more points, which adjusts sample rate
+        settings.update({'aperture': f':DIGitize:APERture {aperture}',
+                         'trigger': 'TRIGger:RESet',
+                         'count': f'TRIGGER:COUNT {N}',
+                         'delay auto': 'TRIGger:DELay:AUTO OFF',
+                         'delay': 'TRIGGER:DELay 0'})
+        settings.update(self._f8588A_transfer_format_settings())
+        return settings, range_string
+
+    def digitize_timer_settings(self, units, ideal_range_val, coupling, filter_val, N, interval):
+        """
+        :return: the settings sent by setup_digitize_timer, without sending them, and the range as a string
+        """
+        settings, range_string = self._digitize_input_settings(units, ideal_range_val, coupling, filter_val)
+
+        # setup digitizer with trigger timer ---------------------------------------------------------------------------
+        settings.update({'aperture': "SENSE:DIG:APERTURE 0.000",
+                         'trigger': "TRIGger:RESet",
+                         'source': "TRIGger:SOURce TIMer",
+                         'timer': f"TRIGger:TIMer {interval}",
+                         'count': f'TRIGGER:COUNT {N}',
+                         'delay auto': "TRIGger:DELay:AUTO OFF",
+                         'delay': "TRIGger:DELay 0"})
+        settings.update(self._f8588A_transfer_format_settings())
+        return settings, range_string
+
+    def _digitize_input_settings(self, units, ideal_range_val, coupling, filter_val):
+        output_type, mode = self._get_function_params(units=units, mode='AC')
+
+        # Calculate the closest range for measurement ------------------------------------------------------------------
+        range_val, range_string = self.determine_f8588A_range(ideal_range_val, output_type)  # (0.1, '0.1A')
+
+        settings = {'function': f':FUNC "DIGitize:{output_type}" ',
+                    'range': f':DIGitize:{output_type}:RANGe {range_val}'}
+
+        # :FILTer OFF|100Khz|3MHZ --------------------------------------------------------------------------------------
+        if filter_val not in ('None', '2MHz', '2.4MHz'):
+            settings['filter'] = f':DIGitize:FILTer {filter_val}'
+        else:
+            settings['filter'] = f':DIGitize:FILTer OFF'
+
+        # AC1M = AC Coupling, 1Mohm input impedance
+        # AC10M = AC Coupling, 10Mohm input impedance
+        # DC1M = DC Coupling, 1Mohm input impedance
+        # DC10M - DC Coupling, 10 Mohm input impedance
+        # DCAuto = DC Coupling, maximum avialable input impedance
+        settings['coupling'] = f':DIGitize:VOLTage:COUPling:SIGNal {coupling}'
+        return settings, range_string
+
+    def write_f8588A_digitize_settings(self, settings):
+        """
+        Brings the digitizer to the configuration described by settings, sending only what differs from the
+        configuration last sent. The digitizer is reset and fully configured when the last configuration is unknown
+        (after connecting, a meter setup or an error), or when the function or the trigger method changes. Sweeps that
+        keep the range, filter and coupling only send the new trigger count.
+
+        With use_profiles set, a change to a setup saved by store_f8588A_profiles is made with a single *RCL, followed
+        by the settings that vary between points and those a saved setup does not hold.
+
+        :param settings: dictionary of command by setting, in the order they are sent
+        """
+        previous = self.digitize_settings
+        profile = self.f8588A_profile(settings)
+        slot = self.profile_index.find(self.f8588A_IDN, profile) if self.use_profiles else None
+
+        if slot is not None and (previous is None or self.f8588A_profile(previous) != profile):
+            self.recall_f8588A_profile(slot, settings)
+            return
+
+        if previous is None or previous.keys() != settings.keys() or previous['function'] != settings['function']:
+            cmds = ['*RST'] + list(settings.values())
+        else:
+            cmds = [cmd for key, cmd in settings.items() if previous[key] != cmd]
+
+        self.digitize_settings = None  # unknown until the write succeeds
+        if cmds:
+            self.f8588A.write_many(cmds)
+        self.digitize_settings = settings
+
+    # SAVED SETUPS #####################################################################################################
+    def recall_f8588A_profile(self, slot, settings):
+        """
+        Recalls the setup saved to slot, then sends the settings it does not hold.
+
+        :param slot: slot holding the profile of settings
+        :param settings: dictionary of command by setting, in the order they are sent
+        """
+        self.digitize_settings = None  # unknown until the write succeeds
+        try:
+            self.f8588A.write_many([f'*RCL {slot}'] + [cmd for key, cmd in settings.items()
+                                                        if key in PROFILE_VARIABLES + PROFILE_UNSAVED])
+        except ValueError:
+            # the slot no longer holds the setup (cleared, or overwritten from the front panel). Forget it
+            print(f'\trecalling digitizer setup from slot {slot} failed. Configuring command by command.')
+            self.profile_index.remove(self.f8588A_IDN, slot)
+            self.profile_index.save()
+            self.f8588A.write_many(['*RST'] + list(settings.values()))
+        self.digitize_settings = settings
+
+    def f8588A_profile(self, settings):
+        """
+        :param settings: digitizer settings, as built by digitize_aperture_settings or digitize_timer_settings
+        :return: the settings held by a saved setup. Those that vary between points, and those a saved setup does not
+        hold, are left out.
+        """
+        return {key: cmd for key, cmd in settings.items() if key not in PROFILE_VARIABLES + PROFILE_UNSAVED}
+
+    def store_f8588A_profiles(self, settings_list):
+        """
+        Saves the distinct digitizer setups of a sweep to the instrument memory (*SAV), so each point of the sweep
+        changes setup with a single *RCL. Setups already recorded in the profile index for this instrument are not
+        saved again. Slots holding setups the sweep does not need are reused. When the sweep needs more setups than
+        there are PROFILE_SLOTS, the remaining setups are configured command by command.
+
+        :param settings_list: digitizer settings of each point of the sweep
+        :return: number of setups saved
+        """
+        profiles = []
+        for settings in settings_list:
+            profile = self.f8588A_profile(settings)
+            if profile not in profiles:
+                profiles.append(profile)
+
+        needed = [self.profile_index.find(self.f8588A_IDN, profile) for profile in profiles]
+        free = [slot for slot in PROFILE_SLOTS if slot not in needed]
+        missing = [profile for profile, slot in zip(profiles, needed) if slot is None]
+
+        if len(missing) > len(free):
+            print(f'\t{len(profiles)} digitizer setups needed but only {len(PROFILE_SLOTS)} can be saved. '
+                  f'The remaining setups are configured command by command.')
+
+        saved = 0
+        try:
+            for profile, slot in zip(missing, free):
+                print(f'\tsaving digitizer setup to slot {slot}')
+                self.digitize_settings = None
+                self.profile_index.remove(self.f8588A_IDN, slot)
+                self.f8588A.write_many(['*RST'] + list(profile.values()) + [f'*SAV {slot}'])
+                self.profile_index.store(self.f8588A_IDN, slot, profile)
+                saved += 1
+        finally:
+            self.profile_index.save()
+
+        self.use_profiles = True
+        return saved
+
+    def set_f8588A_transfer_format(self):
+        """
+        Selects how the reading buffer is transferred by FETCH?. The binary formats return an IEEE 488.2 definite-length
+        block, which avoids formatting and parsing a comma separated string of every sample.
+            FORMat:DATA ASCii | REAL,32 | REAL,64
+            FORMat:BORDer NORMal | SWAPped
+        """
+        self.digitize_settings = None
+        self.f8588A.write_many(list(self._f8588A_transfer_format_settings().values()))
+
+    def _f8588A_transfer_format_settings(self):
+        if self.transfer_format in TRANSFER_FORMATS:
+            return {'format': f'FORMat:DATA REAL,{self.transfer_format[-2:]}',
+                    'border': f'FORMat:BORDer {self.byte_order}'}
+        else:
+            return {'format': 'FORMat:DATA ASCii'}
+
+    def wait_for_f8588A_digitize(self, runtime=None):
+        """
+        Polls the event status register for the completion of the capture started by INIT:IMM;*OPC. The deadline
+        scales with the expected runtime returned by get_aperture. Without a runtime, the legacy fixed delay is used.
+
+        :param runtime: expected duration of the capture in seconds
+        """
+        if runtime is None:
+            time.sleep(5)
+            return
+
+        timeout = DIGITIZE_TIMEOUT_MARGIN * runtime + DIGITIZE_TIMEOUT_OVERHEAD
+        if not self.f8588A.wait_for_complete(timeout):
+            print(f'\tdigitizer did not report completion within {round(timeout, 3)}s. Fetching anyway.')
+
+    def wait_for_f8588A_stable_rms(self, Fs, f0, N, tolerance=STABLE_RMS_TOLERANCE,
+                                   max_captures=STABLE_RMS_MAX_CAPTURES):
+        """
+        Repeats short captures of a whole number of periods until the rms of two in a row agree within tolerance. The
+        trigger count of the digitizer is restored to N afterwards, so it must already be set up for the full capture.
+
+        :param Fs: sampling frequency the digitizer is set up for
+        :param f0: frequency of the fundamental. DC signals use a tenth of the full capture.
+        :param N: trigger count of the full capture
+        :return: True if the rms converged within max_captures
+        """
+        if f0 > 0:
+            n = int(min(N, max(round(STABLE_RMS_PERIODS * Fs / f0), 2)))
+        else:
+            n = max(N // 10, 2)
+
+        previous = None
+        converged = False
+        try:
+            self.f8588A.write(f'TRIGger:COUNt {n}')
+            self.f8588A.verify_writes()
+            for _ in range(max_captures):
+                y = self.retrieve_digitize(n / Fs, n)
+                rms = np.sqrt(np.mean(y ** 2)) if f0 == 0 else np.std(y)
+                if previous is not None and abs(rms - previous) <= tolerance * max(abs(rms), abs(previous)):
+                    converged = True
+                    break
+                previous = rms
+        finally:
+            self.f8588A.write(f'TRIGger:COUNt {N}')
+        self.f8588A.verify_writes()
+
+        if not converged:
+            print(f'\trms did not converge within {max_captures} captures. Continuing anyway.')
+        return converged
+
+    def retrieve_digitize(self, runtime=None, N=None, progress=None, out=None):
+        """
+        Triggers the digitizer and retrieves the capture once complete.
+
+        :param runtime: expected duration of the capture in seconds, used to time the wait for completion
+        :param N: number of samples in the capture. Captures longer than CHUNKED_ACQUISITION_THRESHOLD are retrieved
+        in blocks of self.chunk_size samples (see fetch_f8588A_chunked).
+        :param progress: called as progress(received, N) after each block of a chunked retrieval
+        :param out: preallocated array or np.memmap of N samples that receives a chunked retrieval
+        :return: numpy array of the samples
+        """
         print('\tretrieving digitizer data')
 
-        self.f8588A.write('INIT:IMM')
-        time.sleep(5)
-        read = self.f8588A.query('FETCH?')
-        buffer = [float(i) for i in read.split(',')]
+        try:
+            self.f8588A.write('*CLS;:INIT:IMM;*OPC', verify=False)
+            self.wait_for_f8588A_digitize(runtime)
+
+            if N is not None and (N > CHUNKED_ACQUISITION_THRESHOLD or out is not None):
+                return self.fetch_f8588A_chunked(N, progress=progress, out=out)
+
+            if self.transfer_format in TRANSFER_FORMATS:
+                try:
+                    return self.fetch_f8588A_binary()
+                except ValueError as e:
+                    print(f'binary transfer failed ({e}). Falling back to ASCII transfer.')
+                    self.transfer_format = 'ASCII'
+                    self.set_f8588A_transfer_format()
+
+            return self.fetch_f8588A_ascii()
+        except ValueError:
+            self.digitize_settings = None  # the configuration is uncertain after a failed capture
+            raise
+
+    def fetch_f8588A_chunked(self, N, progress=None, out=None):
+        """
+        Removes the capture from the reading memory in blocks (DATA:REMove?) and writes each block into a preallocated
+        buffer as it arrives. Peak memory is the buffer plus a single block, where a single FETCH? holds the full reply
+        alongside its decoded copy.
+
+        :param N: number of samples in the capture
+        :param progress: called as progress(received, N) after each block
+        :param out: preallocated array or np.memmap of N samples. Allocated when not given.
+        :return: the filled buffer
+        """
+        print(f'\tretrieving {N} samples in blocks of {self.chunk_size}')
+
+        buffer = np.empty(N, dtype=np.float64) if out is None else out
+        if len(buffer) < N:
+            raise ValueError(f'Buffer of {len(buffer)} samples cannot hold the {N} samples requested.')
+
+        received = 0
+        while received < N:
+            count = min(self.chunk_size, N - received)
+            cmd = f'DATA:REMove? {count}'
+            if self.transfer_format in TRANSFER_FORMATS:
+                try:
+                    block = self.fetch_f8588A_binary(cmd)
+                except ValueError as e:
+                    print(f'binary transfer failed ({e}). Falling back to ASCII transfer.')
+                    self.transfer_format = 'ASCII'
+                    self.set_f8588A_transfer_format()
+                    # the readings of a failed block may have already been removed from memory
+                    raise ValueError(f'Chunked retrieval interrupted after {received} of {N} samples: {e}')
+            else:
+                block = self.fetch_f8588A_ascii(cmd)
+
+            if len(block) == 0:
+                raise ValueError(f'Reading memory emptied after {received} of {N} samples.')
+            if len(block) > N - received:
+                raise ValueError(f'Received {received + len(block)} samples, but only {N} were requested.')
+
+            buffer[received:received + len(block)] = block
+            received += len(block)
+
+            if progress:
+                progress(received, N)
+
         return buffer
 
+    def fetch_f8588A_binary(self, cmd='FETCH?'):
+        datatype = TRANSFER_FORMATS[self.transfer_format]
+        is_big_endian = self.byte_order.upper().startswith('NORM')
+        return self.f8588A.query_binary(cmd, datatype=datatype, is_big_endian=is_big_endian)
+
+    def fetch_f8588A_ascii(self, cmd='FETCH?'):
+        read = self.f8588A.query(cmd)
+        return np.array(read.split(','), dtype=np.float64)
+
     ####################################################################################################################
     def close_f8588A(self):
         if self.f8588_connected:
             time.sleep(1)
-            self.f8588A.write('LOCal')
+            self.f8588A.write('LOCal', verify=False)
             self.f8588A.close()
             self.f8588_connected = False
+            self.digitize_settings = None
 
 
 # Run
@@ -5,11 +5,18 @@ import numpy as np
 instruments = {'f884xA': {'address': '10.205.92.156', 'port': '3490', 'gpib': '8', 'mode': 'SOCKET'}}
 INFO = "file:///C:/Users/rholle/AppData/Local/Temp/8845A___pmeng0300.pdf"
 
+# Averaged readings are triggered as one burst of SAMPle:COUNt readings and fetched in a single query
+METER_SETTLE_DELAY = 1.0  # seconds allowed for the reading to settle before the burst
+METER_READING_TIMEOUT = 2.0  # seconds allowed per reading of the burst
+
 
 ########################################################################################################################
 def to_float(string_val):
     try:
-        float_val = float(string_val)
+        float_val = VisaClient.scpi_float(string_val)
+    except VisaClient.OverloadError:
+        print('[ERROR] Measurement over-range. The Fluke 884xA reported an overload or no valid reading.')
+        raise
     except ValueError:
         print('[ERROR] Measurement could not be converted to float. Possible issues with configuration.')
         raise ValueError('Prospective measurement obtained by the Fluke 884xA could not be converted to float. Suspect '
@@ -18,6 +25,11 @@ def to_float(string_val):
         return float_val
 
 
+def to_readings(string_val):
+    # comma separated readings, as returned by FETCh1? for a burst of readings
+    return np.array([to_float(value) for value in string_val.split(',')])
+
+
 class f884xA_instrument:
 
     def __init__(self):
@@ -28,6 +40,7 @@ class f884xA_instrument:
         self.setup_complete = True
         self.output_type = 'VOLT'
         self.mode = 'DC'
+        self.buffered_readings = True  # average readings from a single triggered burst
 
     def connect_to_f884xA(self, instr_id):
         # ESTABLISH COMMUNICATION TO INSTRUMENTS -----------------------------------------------------------------------
@@ -38,6 +51,7 @@ class f884xA_instrument:
             try:
                 self.f884xA_IDN = self.f884xA.query('*IDN?')
                 self.f884xA.write("SYSTem:REMote")
+                self.f884xA.verify_writes()
             except ValueError:
                 raise
         else:
@@ -65,6 +79,7 @@ class f884xA_instrument:
 
             if autorange:
                 self.f884xA.write(f'{self.output_type}:{self.mode}:RANGE:AUTO ON')
+                self.f884xA.verify_writes()
             else:
                 # Set Fluke 884xA to largest range for internal protection by default.
                 self.set_f884xA_range(ideal_range_val=1000, output=self.output_type, mode=self.mode)
@@ -98,6 +113,7 @@ class f884xA_instrument:
         """
         if new_rate in ("S", "M", "F"):
             self.f884xA.write(f'{self.output_type}:{self.mode}:RATE {new_rate}')
+            self.f884xA.verify_writes()
             return True
         else:
             rate = self.get_rate()
@@ -221,6 +237,7 @@ class f884xA_instrument:
         # Set new range ------------------------------------------------------------------------------------------------
         try:
             self.f884xA.write(f"{self.output_type}:{self.mode}:RANGE {range_val}")
+            self.f884xA.verify_writes()
             print(f"Successfully set range of Fluke 884xA to {range_val} ({range_string})")
             return True
         except Exception:
@@ -231,24 +248,38 @@ class f884xA_instrument:
         if self.setup_complete:
             time.sleep(1)
             # Initiate Triggering - (MEASure? or READ? or INITiate)
-            self.f884xA.write('INIT')
+            self.f884xA.write('INIT', verify=False)
             time.sleep(0.2)
 
             # FETCh1? Returns measurements from the primary display
-            outval = to_float(self.f884xA.query('FETCh1?'))
-            dmm_range = self.get_f884xA_range()
-
+            cmds = ['FETCh1?', f'{self.output_type}:{self.mode}:RANGE?']
             if self.mode == 'AC':
                 # FETCh2? Returns readings from the secondary display
-                freqval = to_float(self.f884xA.query('FETCh2?'))
-            else:
-                freqval = 0.0
+                cmds.append('FETCh2?')
+
+            values = self.f884xA.query_many(cmds, [to_float] * len(cmds))
+            outval, dmm_range = values[:2]
+            freqval = values[2] if self.mode == 'AC' else 0.0
 
             return outval, freqval, dmm_range
         else:
             raise ValueError('Fluke 884xA has not been configured for measurement.')
 
     def average_f884xA_reading(self, samples=10, dt=0.1):
+        """
+        :param samples: number of readings averaged
+        :param dt: delay between readings when they are taken one at a time
+        :return: mean, secondary (frequency) value and standard deviation of the readings
+        """
+        if self.buffered_readings:
+            try:
+                return self.average_f884xA_buffered(samples)
+            except VisaClient.OverloadError:
+                raise
+            except ValueError as e:
+                print(f'buffered readings failed ({e}). Falling back to single readings.')
+                self.buffered_readings = False
+
         readings = np.zeros(samples)
         freqval = 0.0
 
@@ -261,6 +292,41 @@ class f884xA_instrument:
 
         return mean, freqval, std
 
+    def average_f884xA_buffered(self, samples=10):
+        """
+        Triggers the readings as a single burst (SAMPle:COUNt) once the input has settled, and fetches every reading of
+        the primary display together with the secondary display in one query.
+
+        :param samples: number of readings averaged
+        :return: mean, secondary (frequency) value and standard deviation of the readings
+        """
+        if not self.setup_complete:
+            raise ValueError('Fluke 884xA has not been configured for measurement.')
+
+        time.sleep(METER_SETTLE_DELAY)
+        try:
+            self.f884xA.write_many([f'SAMPle:COUNt {samples}', '*CLS', 'INITiate', '*OPC'])
+            timeout = samples * METER_READING_TIMEOUT
+            if not self.f884xA.wait_for_complete(timeout):
+                print(f'\tmeter did not report completion within {round(timeout, 3)}s. Fetching anyway.')
+
+            # FETCh1? returns readings from the primary display, FETCh2? from the secondary display
+            if self.mode == 'AC':
+                readings, freqval = self.f884xA.query_many(['FETCh1?', 'FETCh2?'], [to_readings, to_float])
+            else:
+                readings, freqval = to_readings(self.f884xA.query('FETCh1?')), 0.0
+        finally:
+            self.f884xA.write('SAMPle:COUNt 1')
+        self.f884xA.verify_writes()
+
+        if len(readings) != samples:
+            raise ValueError(f'expected {samples} readings but received {len(readings)}')
+
+        mean = readings.mean()
+        std = np.sqrt(np.mean(abs(readings - mean) ** 2))
+
+        return mean, freqval, std
+
     ####################################################################################################################
     def close_f884xA(self):
         if self.f884xA_connected:
@@ -3,6 +3,29 @@ import time
 
 instruments = {'f5560A': {'address': '129.196.136.130', 'port': '3490', 'gpib': '6', 'mode': 'SOCKET'}}
 
+# Settling modes
+SETTLE_FIXED = 'fixed'  # legacy behaviour. Fixed worst case delays after every output change
+SETTLE_STATUS = 'status'  # the Instrument Status Register (ISR?) is polled until the output reports settled
+
+ISR_OPERATE = 1 << 0  # output is in operate
+ISR_SETTLED = 1 << 12  # output has settled to within specification
+SETTLE_TIMEOUT = 30  # seconds allowed for the output to settle
+STANDBY_TIMEOUT = 5  # seconds allowed for the output to enter standby
+
+# Output changes across these limits are made from standby, even when the output is kept in operate between points
+HIGH_VOLTAGE_LIMIT = 33  # V. The calibrator requires operate to be confirmed again above this voltage
+CURRENT_TERMINAL_LIMIT = 3  # A. Larger currents are sourced through the 20A terminal
+
+
+def output_region(mode, rms, Ft):
+    """
+    :return: the output function, coupling and terminals of a setting. The output may only be changed in operate
+    between two settings of the same region.
+    """
+    units = mode.upper()
+    limit = HIGH_VOLTAGE_LIMIT if units == 'V' else CURRENT_TERMINAL_LIMIT
+    return units, Ft == 0, abs(rms) > limit
+
 
 ########################################################################################################################
 class f5560A_instrument:
@@ -13,6 +36,9 @@ class f5560A_instrument:
         self.measurement = []
         self.f5560A_IDN = ''
         self.f5560_connected = False
+        self.f5560A_settling = SETTLE_FIXED
+        self.f5560A_operating = False  # the output was left in operate by the last run_f5560A_source
+        self.f5560A_region = None  # output_region of the last setting sourced
 
     def connect_to_f5560A(self, instr_id):
         # ESTABLISH COMMUNICATION TO INSTRUMENT -----------------------------------------------------------------------
@@ -21,53 +47,101 @@ class f5560A_instrument:
         if self.f5560A.healthy:
             self.f5560_connected = True
             self.f5560A_IDN = self.f5560A.query('*IDN?')
+            self.f5560A.error_query = 'ERR?'  # calibrators do not implement SYST:ERR?
         else:
             print('[X] Unable to connect to the Fluke 5560A. Check software configuration, ensure instrument is'
                   '\nconnected properly or not being used by another remote session. Consider power cycling the '
                   '\nsuspected instrument\n')
 
     def setup_f5560A_source(self):
-        self.f5560A.write('*RST')
+        self.f5560A.write('*RST', verify=False)
+        self.f5560A_operating = False
         time.sleep(1)
-        self.f5560A.write('wizard elbereth; ponwiz on')
-        self.f5560A.write('COMM_MODE SERIAL, COMP')
-        self.f5560A.write('COMM_MODE TELNET, COMP')
-        self.f5560A.write('^C')
+        self.f5560A.write('wizard elbereth; ponwiz on', verify=False)
+        self.f5560A.write('COMM_MODE SERIAL, COMP', verify=False)
+        self.f5560A.write('COMM_MODE TELNET, COMP', verify=False)
+        self.f5560A.write('^C', verify=False)
         time.sleep(0.5)
         self.f5560A.write('MONITOR OFF')
+        self.f5560A.verify_writes()
         print(f"\nmonitor: {self.f5560A.query('MONITOR?')}")
 
     def run_f5560A_source(self, mode, rms, Ft):
+        """
+        Sources the setting and waits for the output to settle. An output still in operate from the previous setting
+        is changed in operate, unless the change crosses into another output_region.
+        """
+        fixed = self.f5560A_settling == SETTLE_FIXED
+        region = output_region(mode, rms, Ft)
+        if self.f5560A_operating and region != self.f5560A_region:
+            print('\toutput function or terminals change. Placing output in standby first.')
+            self.standby_f5560A()
+
         try:
             if mode in ("a", "A"):
                 self.f5560A.write(f'\nout {rms}A, {Ft}Hz')
-                time.sleep(2)
+                if fixed:
+                    time.sleep(2)
                 print(f'[5560A command] out: {rms}A, {Ft}Hz')
 
             elif mode in ("v", "V"):
                 self.f5560A.write(f'\nout {rms}V, {Ft}Hz')
-                time.sleep(2)
+                if fixed:
+                    time.sleep(2)
                 print(f'\nout: {rms}V, {Ft}Hz')
 
             else:
                 raise ValueError("Invalid mode selected. Specify units 'V' or 'A'.")
-            time.sleep(1)
-
-            self.f5560A.write('oper')
-            time.sleep(5)
+            if not self.f5560A_operating:
+                if fixed:
+                    time.sleep(1)
+                self.f5560A.write('oper')
+            self.f5560A.verify_writes()
+            self.wait_for_f5560A_settled()
+            self.f5560A_operating = True
+            self.f5560A_region = region
         except ValueError:
             raise
 
+    def wait_for_f5560A_settled(self, timeout=SETTLE_TIMEOUT):
+        """
+        Waits for the output to be in operate and settled, as reported by the OPER (bit 0) and SETTLED (bit 12) bits
+        of the Instrument Status Register. The wait ends as soon as the output settles, where the fixed delays of
+        SETTLE_FIXED always assume the worst case.
+
+        :param timeout: seconds to wait for the output to settle
+        :return: True once the output has settled. Raises ValueError if it does not settle within the timeout, rather
+        than measuring an output that may be unsettled or still in standby.
+        """
+        if self.f5560A_settling == SETTLE_FIXED:
+            time.sleep(5)
+            return True
+
+        settled = ISR_OPERATE | ISR_SETTLED
+        if self.f5560A.poll('ISR?', lambda isr: (int(float(isr)) & settled) == settled, timeout, interval=0.02):
+            return True
+        raise ValueError(f'Fluke 5560A output did not report settled within {timeout}s.')
+
     def standby_f5560A(self):
-        time.sleep(1)
+        self.f5560A_operating = False
+        if self.f5560A_settling == SETTLE_FIXED:
+            time.sleep(1)
+            self.f5560A.write('STBY')
+            self.f5560A.write('*WAI')
+            self.f5560A.verify_writes()
+            time.sleep(1)
+            return
+
         self.f5560A.write('STBY')
-        self.f5560A.write('*WAI')
-        time.sleep(1)
+        self.f5560A.verify_writes()
+        if not self.f5560A.poll('ISR?', lambda isr: not (int(float(isr)) & ISR_OPERATE), STANDBY_TIMEOUT,
+                                interval=0.02):
+            print(f'\tFluke 5560A did not report standby within {STANDBY_TIMEOUT}s.')
 
     def close_f5560A(self):
         if self.f5560_connected:
             time.sleep(1)
-            self.f5560A.write('LOCal')
+            self.f5560A.write('LOCal', verify=False)
             self.f5560A.close()
             self.f5560_connected = False
 
@@ -3,6 +3,28 @@ import time
 
 instruments = {'f5730A': {'address': '129.196.136.130', 'port': '3490', 'gpib': '6', 'mode': 'SOCKET'}}
 
+# Settling modes
+SETTLE_FIXED = 'fixed'  # legacy behaviour. Fixed worst case delays after every output change
+SETTLE_STATUS = 'status'  # the Instrument Status Register (ISR?) is polled until the output reports settled
+
+ISR_OPERATE = 1 << 0  # output is in operate
+ISR_SETTLED = 1 << 12  # output has settled to within specification
+SETTLE_TIMEOUT = 30  # seconds allowed for the output to settle
+STANDBY_TIMEOUT = 5  # seconds allowed for the output to enter standby
+
+# Output changes across these limits are made from standby, even when the output is kept in operate between points
+HIGH_VOLTAGE_LIMIT = 22  # V. The calibrator requires operate to be confirmed again above this voltage
+CURRENT_TERMINAL_LIMIT = 2.2  # A. Larger currents are sourced through an external amplifier
+
+
+def output_region(mode, rms, Ft):
+    """
+    :return: (units, is DC, beyond the limit of its units). Settings of different regions are changed from standby.
+    """
+    units = mode.upper()
+    limit = HIGH_VOLTAGE_LIMIT if units == 'V' else CURRENT_TERMINAL_LIMIT
+    return units, Ft == 0, abs(rms) > limit
+
 
 ########################################################################################################################
 class f5730A_instrument:
@@ -13,6 +35,9 @@ class f5730A_instrument:
         self.measurement = []
         self.f5730A_IDN = ''
         self.f5730_connected = False
+        self.f5730A_settling = SETTLE_FIXED
+        self.f5730A_operating = False  # the output was left in operate by the last run_f5730A_source
+        self.f5730A_region = None  # output_region of the last setting sourced
 
     def connect_to_f5730A(self, instr_id):
         # ESTABLISH COMMUNICATION TO INSTRUMENT -----------------------------------------------------------------------
@@ -21,50 +46,94 @@ class f5730A_instrument:
         if self.f5730A.healthy:
             self.f5730_connected = True
             self.f5730A_IDN = self.f5730A.query('*IDN?')
+            self.f5730A.error_query = 'ERR?'  # calibrators do not implement SYST:ERR?
         else:
             print('[X] Unable to connect to the Fluke 5730A. Check software configuration, ensure instrument is'
                   '\nconnected properly or not being used by another remote session. Consider power cycling the '
                   '\nsuspected instrument\n')
 
     def setup_f5730A_source(self):
-        self.f5730A.write('*RST')
+        self.f5730A.write('*RST', verify=False)
+        self.f5730A_operating = False
         time.sleep(1)
-        self.f5730A.write('REM_MODE SERIAL, COMP')
-        self.f5730A.write('REM_MODE ENET, TERM')
-        self.f5730A.write('^C')
+        self.f5730A.write('REM_MODE SERIAL, COMP', verify=False)
+        self.f5730A.write('REM_MODE ENET, TERM', verify=False)
+        self.f5730A.write('^C', verify=False)
         time.sleep(0.5)
 
     def run_f5730A_source(self, mode, rms, Ft):
+        """
+        Sources the setting and waits for it to settle, staying in operate when the region of the output is unchanged.
+        """
+        fixed = self.f5730A_settling == SETTLE_FIXED
+        region = output_region(mode, rms, Ft)
+        if self.f5730A_operating and region != self.f5730A_region:
+            print('\toutput function or terminals change. Placing output in standby first.')
+            self.standby_f5730A()
+
         try:
             if mode in ("a", "A"):
                 self.f5730A.write(f'\nout {rms}A, {Ft}Hz')
-                time.sleep(2)
+                if fixed:
+                    time.sleep(2)
                 print(f'[5730A command] out: {rms}A, {Ft}Hz')
 
             elif mode in ("v", "V"):
                 self.f5730A.write(f'\nout {rms}V, {Ft}Hz')
-                time.sleep(2)
+                if fixed:
+                    time.sleep(2)
                 print(f'\nout: {rms}V, {Ft}Hz')
 
             else:
                 raise ValueError("Invalid mode selected. Specify units 'V' or 'A'.")
-            time.sleep(1)
-
-            self.f5730A.write('oper')
-            time.sleep(5)
+            if not self.f5730A_operating:
+                if fixed:
+                    time.sleep(1)
+                self.f5730A.write('oper')
+            self.f5730A.verify_writes()
+            self.wait_for_f5730A_settled()
+            self.f5730A_operating = True
+            self.f5730A_region = region
         except ValueError:
             raise
 
+    def wait_for_f5730A_settled(self, timeout=SETTLE_TIMEOUT):
+        """
+        Waits for the OPER and SETTLED bits of the Instrument Status Register.
+
+        :param timeout: seconds to wait for the output to settle
+        :return: True once the output has settled. Raises ValueError if it does not settle within the timeout, rather
+        than measuring an output that may be unsettled or still in standby.
+        """
+        if self.f5730A_settling == SETTLE_FIXED:
+            time.sleep(5)
+            return True
+
+        settled = ISR_OPERATE | ISR_SETTLED
+        if self.f5730A.poll('ISR?', lambda isr: (int(float(isr)) & settled) == settled, timeout, interval=0.02):
+            return True
+        raise ValueError(f'Fluke 5730A output did not report settled within {timeout}s.')
+
     def standby_f5730A(self):
-        time.sleep(1)
+        self.f5730A_operating = False
+        if self.f5730A_settling == SETTLE_FIXED:
+            time.sleep(1)
+            self.f5730A.write('STBY')
+            self.f5730A.write('*WAI')
+            self.f5730A.verify_writes()
+            time.sleep(1)
+            return
+
         self.f5730A.write('STBY')
-        self.f5730A.write('*WAI')
-        time.sleep(1)
+        self.f5730A.verify_writes()
+        if not self.f5730A.poll('ISR?', lambda isr: not (int(float(isr)) & ISR_OPERATE), STANDBY_TIMEOUT,
+                                interval=0.02):
+            print(f'\tFluke 5730A did not report standby within {STANDBY_TIMEOUT}s.')
 
     def close_f5730A(self):
         if self.f5730_connected:
             time.sleep(1)
-            self.f5730A.write('LOCal')
+            self.f5730A.write('LOCal', verify=False)
             self.f5730A.close()
             self.f5730_connected = False
 
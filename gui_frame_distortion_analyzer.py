@@ -6,6 +6,7 @@ from gui_panel_aboutpage import AboutTab
 
 from gui_dialog_instruments import *
 from instruments_RWConfig import *
+from dut_f5560A import SETTLE_FIXED, SETTLE_STATUS
 
 from gui_dialog_specwizard import *
 
@@ -63,6 +64,23 @@ class TestFrame(wx.Frame):
         self.menu_trigger_aperture = self.radio_menu_trigger.AppendRadioItem(wx.ID_ANY, 'Aperture', '1')
         self.menu_trigger_timer = self.radio_menu_trigger.AppendRadioItem(wx.ID_ANY, 'Timer', '2')
         menu_tree_settings_tab.AppendSubMenu(self.radio_menu_trigger, 'T&rigger')
+        self.menu_plan = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Plan Cheapest Acquisition?",
+                                                                "Chooses the aperture or timer per measurement")
+        self.menu_coherent = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Coherent Sampling?",
+                                                                    "Captures whole cycles with the rectangular "
+                                                                    "window where the 8588A timing allows")
+        self.menu_settle_status = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Poll Source Settling?",
+                                                                         "Waits on the calibrator status register "
+                                                                         "instead of the fixed worst case delays")
+        self.menu_confirm_settling = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Confirm Source Settling?",
+                                                                            "Short captures confirm the output has "
+                                                                            "settled before each measurement")
+        self.menu_keep_operate = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Keep Source in Operate?",
+                                                                        "Leaves the calibrator in operate between "
+                                                                        "sweep points")
+        self.menu_profiles = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Use Instrument Profiles?",
+                                                                    "Saves the digitizer setups of a sweep to the "
+                                                                    "8588A and recalls them per point")
         menu_tree_settings_tab.AppendSeparator()
 
         self.menu_DUMMY = menu_tree_settings_tab.AppendCheckItem(wx.ID_ANY, "Use DUMMY Data?")
@@ -119,6 +137,12 @@ class TestFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self.OnWindowSelection, self.menu_windowing_blac)
         self.Bind(wx.EVT_MENU, self.OnTriggerSelection, self.menu_trigger_aperture)
         self.Bind(wx.EVT_MENU, self.OnTriggerSelection, self.menu_trigger_timer)
+        self.Bind(wx.EVT_MENU, self.OnPlanChecked, self.menu_plan)
+        self.Bind(wx.EVT_MENU, self.OnCoherentChecked, self.menu_coherent)
+        self.Bind(wx.EVT_MENU, self.OnSettleStatusChecked, self.menu_settle_status)
+        self.Bind(wx.EVT_MENU, self.OnConfirmSettlingChecked, self.menu_confirm_settling)
+        self.Bind(wx.EVT_MENU, self.OnKeepOperateChecked, self.menu_keep_operate)
+        self.Bind(wx.EVT_MENU, self.OnProfilesChecked, self.menu_profiles)
         self.Bind(wx.EVT_MENU, self.OnDummyChecked, self.menu_DUMMY)
         # self.Bind(wx.EVT_MENU, self.open_breakpoints, self.menu_brkpts)
         self.Bind(wx.EVT_MENU, self.reset_view, self.menu_reset_view)
@@ -245,6 +269,7 @@ class TestFrame(wx.Frame):
 
     def OnCloseWindow(self, evt):
         self.close_all_instruments()
+        self.tab_analyzer.da.close_results_writer()
         self.Destroy()
 
     def OnWindowSelection(self, evt):
@@ -265,6 +290,55 @@ class TestFrame(wx.Frame):
         self.tab_analyzer.da.USE_APERTURE = trigger_value
         print(f"[{trigger_value}] Selected as the trigger method.")
 
+    def OnPlanChecked(self, event):
+        if self.menu_plan.IsChecked():
+            self.tab_analyzer.da.PLAN_ACQUISITION = True
+            print('planning the cheapest aperture or timer acquisition of each measurement.')
+        else:
+            self.tab_analyzer.da.PLAN_ACQUISITION = False
+            print('No longer planning acquisitions.')
+
+    def OnCoherentChecked(self, event):
+        if self.menu_coherent.IsChecked():
+            self.tab_analyzer.da.COHERENT_SAMPLING = True
+            print('capturing whole cycles with the rectangular window where possible.')
+        else:
+            self.tab_analyzer.da.COHERENT_SAMPLING = False
+            print('No longer sampling coherently.')
+
+    def OnSettleStatusChecked(self, event):
+        settling = SETTLE_STATUS if self.menu_settle_status.IsChecked() else SETTLE_FIXED
+        for M in (self.tab_analyzer.da.M, self.tab_multimeter.dmm.M):
+            M.f5560A_settling = settling
+            M.f5730A_settling = settling
+        print(f"[{settling}] Selected as the source settling method.")
+
+    def OnConfirmSettlingChecked(self, event):
+        if self.menu_confirm_settling.IsChecked():
+            self.tab_analyzer.da.CONFIRM_SETTLING = True
+            print('confirming the source output has settled before each measurement.')
+        else:
+            self.tab_analyzer.da.CONFIRM_SETTLING = False
+            print('No longer confirming source settling.')
+
+    def OnKeepOperateChecked(self, event):
+        if self.menu_keep_operate.IsChecked():
+            self.tab_analyzer.da.KEEP_OPERATE = True
+            self.tab_multimeter.dmm.KEEP_OPERATE = True
+            print('keeping the source in operate between sweep points.')
+        else:
+            self.tab_analyzer.da.KEEP_OPERATE = False
+            self.tab_multimeter.dmm.KEEP_OPERATE = False
+            print('No longer keeping the source in operate.')
+
+    def OnProfilesChecked(self, event):
+        if self.menu_profiles.IsChecked():
+            self.tab_analyzer.da.USE_PROFILES = True
+            print('recalling saved 8588A digitizer profiles per sweep point.')
+        else:
+            self.tab_analyzer.da.USE_PROFILES = False
+            print('No longer using instrument profiles.')
+
     def OnDummyChecked(self, event):
         if self.menu_DUMMY.IsChecked():
             self.tab_analyzer.da.DUMMY_DATA = True
@@ -616,6 +616,10 @@ class DistortionAnalyzerTab(wx.Panel):
         self.label_samples_report.SetLabelText(str(N))
         self.label_aperture_report.SetLabelText(f'{round(aperture * 1e6, 4)}us')
 
+    def acquisition_progress_update(self, received, N):
+        # called from the measurement thread while a long capture is transferred
+        wx.CallAfter(self.label_samples_report.SetLabelText, f'{received} / {N}' if received < N else str(N))
+
     def results_update(self, results):
         print('\tupdating results panel')
 
@@ -644,6 +648,10 @@ class DistortionAnalyzerTab(wx.Panel):
         dial = wx.MessageDialog(None, str(error_message), 'Error', wx.OK | wx.ICON_ERROR)
         dial.ShowModal()
 
+    def post_error_dialog(self, error_message):
+        # for errors raised outside of the gui thread, such as by the results writer
+        wx.CallAfter(self.error_dialog, error_message)
+
 
 # FOR RUNNING INDEPENDENTLY ============================================================================================
 class MyDistortionAnalyzerFrame(wx.Frame):
@@ -678,6 +686,7 @@ class MyDistortionAnalyzerFrame(wx.Frame):
     def OnCloseWindow(self, evt):
         self.panel.da.close_instruments()
         print("\tremote connection to instruments used in distortion analyzer are closed.")
+        self.panel.da.close_results_writer()
         self.Destroy()
 
     # ------------------------------------------------------------------------------------------------------------------
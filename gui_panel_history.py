@@ -1,7 +1,7 @@
 from distortion_calculator import *
+from history_store import read_history, read_csv_history
 
 import numpy as np
-import pandas as pd
 from pathlib import Path
 
 import wx
@@ -105,7 +105,9 @@ class HistoryTab(wx.Panel):
 
     def OnOpen(self, event):
         Path("results/history").mkdir(parents=True, exist_ok=True)
-        with wx.FileDialog(self, "Open previous measurement:", wildcard="CSV files (*.csv)|*.csv",
+        with wx.FileDialog(self, "Open previous measurement:",
+                           wildcard="History files (*.json;*.csv)|*.json;*.csv|"
+                                    "Binary history (*.json)|*.json|CSV files (*.csv)|*.csv",
                            defaultDir="results/history",
                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
 
@@ -115,38 +117,48 @@ class HistoryTab(wx.Panel):
             # Proceed loading the file chosen by the user
             pathname = fileDialog.GetPath()
             try:
-                with open(pathname, 'r') as file:
-                    self.open_history(file)
+                self.open_history(pathname)
             except (IOError, ValueError) as e:
                 wx.LogError("Cannot open file '%s'." % pathname)
                 self.error_dialog(e)
 
-    def open_history(self, file):
-        df = pd.read_csv(file)
-
-        try:
-            xt = df['xt'].to_numpy()
-            yt = df['yt'].to_numpy()
-
-            xf = df['xf'].to_numpy()
-            # https://stackoverflow.com/a/18919965/3382269
-            # https://stackoverflow.com/a/51725795/3382269
-            df['yf'] = df['yf'].str.replace('i', 'j').apply(lambda x: np.complex(x))
-            yf = df['yf'].to_numpy()
-
-        except KeyError:
-            raise ValueError('Incorrect file attempted to be opened. '
-                             '\nCheck data headers. xt, yt, xf, yf should be present')
-
-        self.process_raw_input(xt, yt, xf, yf)
-
-    def process_raw_input(self, xt, yt, xf, yf):
+    def open_history(self, pathname):
+        if Path(pathname).suffix == '.json':
+            # binary history: arrays are memory mapped, so only the sidecar is parsed up front
+            arrays, params = read_history(pathname)
+            try:
+                xt = arrays['xt']
+                yt = arrays['yt']
+                yf = arrays['yf']
+            except KeyError:
+                raise ValueError('Incorrect file attempted to be opened. '
+                                 '\nCheck the sidecar. xt, yt, yf should be present')
+            xf = np.round(np.fft.rfftfreq(len(xt), d=1. / params['Fs']), 6)
+        else:
+            xt, yt, xf, yf = read_csv_history(pathname)
+            params = {}
+
+        self.process_raw_input(xt, yt, xf, yf, params)
+
+    def process_raw_input(self, xt, yt, xf, yf, params=None):
+        """
+        :param params: run parameters of the sidecar. The window, filters and sampling frequency of the measurement are
+        taken from them, so the figures match the ones reported when it was taken. Legacy csv captures carry none and
+        are analysed as a blackman capture through the 100 kHz filter.
+        """
+        params = params or {}
         yrms = np.sqrt(np.mean(np.abs(yt) ** 2))
         N = len(xt)
-        Fs = round(1 / (xt[1] - xt[0]), 2)
+        Fs = params.get('Fs', round(1 / (xt[1] - xt[0]), 2))
+        window = params.get('window', 'blackman')
+        hpf = params.get('hpf', 0)
+        lpf = params.get('lpf', 100e3)
+        coherent = 'f0' in params and is_coherent(params['f0'], Fs, N, window)
 
         # SPECTRAL -----------------------------------------------------------------------------------------------------
-        main_lobe_width = 6 * (Fs / N)
+        if window not in MAINLOBE_BINS:
+            raise ValueError(f'Unknown window "{window}" in the history parameters.')
+        main_lobe_width = MAINLOBE_BINS[window] * (Fs / N)  # as windowed_fft reports it
 
         if (N % 2) == 0:
             # for even values of N: length is (N / 2) + 1
@@ -158,8 +170,9 @@ class HistoryTab(wx.Panel):
         yf_rfft = yf[:fft_length]
         xf_rfft = np.round(np.fft.rfftfreq(N, d=1. / Fs), 6)  # one-sided
 
-        thdn, *_ = THDN_F(xf_rfft, yf_rfft, Fs, N, main_lobe_width, hpf=0, lpf=100e3)
-        thd = THD(xf_rfft, yf_rfft, Fs, N, main_lobe_width)
+        spectrum = SpectrumAnalysis(xf_rfft, yf_rfft, Fs, N, hpf=hpf, lpf=lpf, coherent=coherent)
+        thdn, *_ = spectrum.thdn_f(main_lobe_width)
+        thd = spectrum.thd(main_lobe_width)
 
         self.plot(xt, yt, fft_length, xf_rfft, yf_rfft)
         self.results_update(Fs, N, yrms, thdn, thd)
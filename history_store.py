@@ -0,0 +1,155 @@
+"""
+Binary measurement history.
+
+Each capture is stored as two files sharing a name:
+    + <name>.bin  : the raw arrays (xt, yt, yf) laid end to end in native byte order
+    + <name>.json : sidecar describing the dtype, byte offset and shape of each array, and the run parameters
+
+Arrays are written straight from their buffers with ndarray.tofile and read back as memory maps, so opening a capture
+costs little more than parsing the sidecar regardless of its length. Legacy csv captures written by write_to_csv can be
+converted with convert_csv_history.
+"""
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from run_files import getFilepath
+
+HISTORY_VERSION = 1
+
+
+########################################################################################################################
+def _to_builtin(value):
+    # numpy scalars in the run parameters are not json serializable
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+########################################################################################################################
+def write_history(path, fname, params, **arrays):
+    """
+    Writes a capture to a new binary history file in the directory *path*.
+
+    :param path: directory of the history files
+    :param fname: prefix of the file name. The date and an index are appended.
+    :param params: run parameters stored in the sidecar (Fs, N, aperture, window, hpf, lpf, ...)
+    :param arrays: the arrays to store, by name (xt, yt, yf)
+    :return: path of the json sidecar
+    """
+    sidecar = getFilepath(path, fname, extension='json')
+    data_file = Path(sidecar).with_suffix('.bin')
+
+    layout = {}
+    offset = 0
+    with open(data_file, 'wb') as outfile:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)  # no copy for arrays that are already contiguous
+            array.tofile(outfile)
+            layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'shape': list(array.shape)}
+            offset += array.nbytes
+
+    header = {'version': HISTORY_VERSION, 'data': data_file.name, 'arrays': layout,
+              'params': {key: _to_builtin(value) for key, value in params.items()}}
+    with open(sidecar, 'w') as outfile:
+        json.dump(header, outfile, indent=2)
+
+    return sidecar
+
+
+def read_history(path):
+    """
+    Opens a binary history file. The arrays are read-only memory maps of the data file.
+
+    :param path: path of the json sidecar
+    :return: dictionary of arrays by name, and the dictionary of run parameters
+    """
+    with open(path, 'r') as infile:
+        header = json.load(infile)
+
+    if header.get('version') != HISTORY_VERSION:
+        raise ValueError(f"Unsupported history file version: {header.get('version')}")
+
+    data_file = Path(path).parent / header['data']
+    arrays = {}
+    for name, layout in header['arrays'].items():
+        shape = tuple(layout['shape'])
+        if np.prod(shape) == 0:
+            arrays[name] = np.zeros(shape, dtype=layout['dtype'])
+        else:
+            arrays[name] = np.memmap(data_file, dtype=layout['dtype'], mode='r', offset=layout['offset'], shape=shape)
+
+    return arrays, header['params']
+
+
+########################################################################################################################
+def read_csv_history(path):
+    """
+    Parses a history csv written by write_to_csv. yf is stored as python complex strings, or with an 'i' imaginary
+    unit by other tools.
+
+    :return: xt, yt, xf, yf
+    """
+    with open(path, 'r', newline='') as infile:
+        reader = csv.reader(infile)
+        header = next(reader)
+        try:
+            columns = [header.index(name) for name in ('xt', 'yt', 'xf', 'yf')]
+        except ValueError:
+            raise ValueError('Incorrect file attempted to be opened. '
+                             '\nCheck data headers. xt, yt, xf, yf should be present')
+        rows = [[row[idx] for idx in columns] for row in reader if row]
+
+    xt, yt, xf, yf = zip(*rows) if rows else ((), (), (), ())
+    # https://stackoverflow.com/a/18919965/3382269
+    yf = np.array([complex(value.replace('i', 'j')) for value in yf], dtype=np.complex128)
+    return np.array(xt, dtype=np.float64), np.array(yt, dtype=np.float64), np.array(xf, dtype=np.float64), yf
+
+
+def convert_csv_history(path, params=None):
+    """
+    Converts a history csv into a binary history file next to it. The csv is left in place. Only the one sided
+    spectrum is kept, as written by DistortionAnalyzer.fft.
+
+    :param path: path of the csv
+    :param params: run parameters to store. Fs and N are recovered from the time axis when not given.
+    :return: path of the json sidecar
+    """
+    xt, yt, xf, yf = read_csv_history(path)
+    N = len(xt)
+    params = dict(params or {})
+    params.setdefault('N', N)
+    params.setdefault('Fs', round(1 / (xt[1] - xt[0]), 2) if N > 1 else 0)
+    params.setdefault('source', Path(path).name)
+
+    path = Path(path)
+    return write_history(path.parent, path.stem, params, xt=xt, yt=yt, yf=yf[:N // 2 + 1])
+
+
+def convert_history_directory(directory='results/history'):
+    """
+    Converts every history csv in *directory* that has not been converted yet.
+
+    :return: list of the json sidecars written
+    """
+    converted = set()
+    for sidecar in Path(directory).glob('*.json'):
+        with open(sidecar, 'r') as infile:
+            converted.add(json.load(infile).get('params', {}).get('source'))
+
+    written = []
+    for path in sorted(Path(directory).glob('*.csv')):
+        if path.name in converted:
+            continue
+        try:
+            written.append(convert_csv_history(path))
+            print(f'\tconverted {path.name}')
+        except (ValueError, IndexError) as e:
+            print(f'\tskipped {path.name}: {e}')
+    return written
+
+
+if __name__ == "__main__":
+    convert_history_directory()
@@ -0,0 +1,70 @@
+"""
+Local index of the instrument setups saved to the instrument memory with *SAV.
+
+An instrument cannot report what a memory slot holds, so the settings each slot was saved with are recorded in
+results/instrument_profiles.yaml of the project (PROFILE_INDEX, whatever the working directory) by instrument (the
+*IDN? string, which carries the serial number) and slot:
+
+    FLUKE,8588A,<serial>,<firmware>:
+      1: {function: ':FUNC "DIGitize:VOLT" ', range: ':DIGitize:VOLT:RANGe 1', ...}
+
+The index outlives the connection, so setups saved in an earlier session are recalled without being saved again.
+Setups saved from the front panel are not tracked. Clear the instrument from the index if its slots may have been
+overwritten.
+"""
+import yaml
+import os
+
+PROFILE_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'instrument_profiles.yaml')
+
+
+########################################################################################################################
+class ProfileIndex:
+    def __init__(self, pathname=PROFILE_INDEX):
+        self.pathname = pathname
+        self.profiles = self._load()
+
+    def _load(self):
+        if os.path.exists(self.pathname):
+            with open(self.pathname, 'r') as stream:
+                try:
+                    return yaml.safe_load(stream) or {}
+                except yaml.YAMLError as exc:
+                    print(exc)
+        return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.pathname) or '.', exist_ok=True)
+        with open(self.pathname, 'w') as f:
+            yaml.dump(self.profiles, f, sort_keys=False)
+
+    def slots(self, instrument):
+        """
+        :param instrument: *IDN? string of the instrument
+        :return: dictionary of settings by slot
+        """
+        return self.profiles.get(instrument, {})
+
+    def find(self, instrument, settings):
+        """
+        :param instrument: *IDN? string of the instrument
+        :param settings: dictionary of command by setting
+        :return: slot holding exactly these settings, or None
+        """
+        for slot, saved in self.slots(instrument).items():
+            if saved == settings:
+                return slot
+        return None
+
+    def store(self, instrument, slot, settings):
+        self.profiles.setdefault(instrument, {})[slot] = dict(settings)
+
+    def remove(self, instrument, slot):
+        self.profiles.get(instrument, {}).pop(slot, None)
+
+    def clear(self, instrument):
+        """
+        Forgets every setup saved to the instrument, for instance after a factory reset.
+        """
+        self.profiles.pop(instrument, None)
+        self.save()
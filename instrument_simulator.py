@@ -0,0 +1,624 @@
+"""
+Local SCPI simulator of the bench: the Fluke 5560A and 5730A calibrators, the 8588A digitizer and the 884xA meter.
+
+Each instrument listens on its own TCP port and answers the subset of commands the drivers in this project send, so
+VisaClient in SOCKET mode can be pointed at 127.0.0.1 and the full acquisition path (driver, VisaClient, pyvisa and
+the socket transfer) can be run and timed without lab hardware. All instruments share one BenchSignal: whatever the
+calibrator is sourcing is what the digitizer captures and the meters read.
+
+The model is configured through SimulatorConfig:
+    + latency       : seconds added before every response, as a round trip to the instrument
+    + bandwidth     : bytes per second the responses are throttled to (None for unthrottled)
+    + settling_time : time constant (s) of the calibrator output after 'out' or 'oper'
+    + time_scale    : wall time per simulated second of a capture. 0.01 completes a 1 s capture in 10 ms
+    + harmonics     : (order, amplitude relative to the fundamental) pairs added to the sourced waveform
+    + noise         : rms of the white noise added to every sample, in the units of the source
+
+Run from the project root to serve the bench on the default ports until interrupted:
+    python instrument_simulator.py
+"""
+import re
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+DIGITIZER_SAMPLING_FREQUENCY = 5e6
+SIMULATOR_PORTS = {'f5560A': 5560, 'f5730A': 5730, 'f8588A': 8588, 'f884xA': 8846}
+OVERLOAD = 9.91e37  # returned by the meters when there is no valid reading
+SEND_CHUNK_SIZE = 2 ** 16  # bytes written per throttled send
+SETTLED_TOLERANCE = 1e-5  # relative error of the output at which the calibrators report SETTLED
+
+
+class SimulatorConfig:
+    def __init__(self, latency=0.0, bandwidth=None, settling_time=0.0, time_scale=1.0,
+                 harmonics=((3, 1e-3), (5, 1e-4)), noise=1e-6, seed=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.settling_time = settling_time
+        self.time_scale = time_scale
+        self.harmonics = harmonics
+        self.noise = noise
+        self.seed = seed
+
+
+########################################################################################################################
+class BenchSignal:
+    """
+    The waveform sourced by the calibrator. The amplitude settles exponentially towards its target after every change
+    of output or operate state.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.units = 'V'
+        self.rms = 0.0
+        self.frequency = 0.0
+        self.operate = False
+        self.changed = time.perf_counter()
+        self._previous_rms = 0.0
+        self._rng = np.random.default_rng(config.seed)
+        self._lock = threading.Lock()
+
+    def set_output(self, units=None, rms=None, frequency=None):
+        with self._lock:
+            self._settle()
+            if units is not None:
+                self.units = units
+            if rms is not None:
+                self.rms = rms
+            if frequency is not None:
+                self.frequency = frequency
+
+    def set_operate(self, operate):
+        with self._lock:
+            self._settle()
+            self.operate = operate
+
+    def _settle(self):
+        # the output starts its next transition from wherever the previous one had reached
+        self._previous_rms = self._envelope(np.array([time.perf_counter()]))[0]
+        self.changed = time.perf_counter()
+
+    def _envelope(self, t_wall):
+        target = self.rms if self.operate else 0.0
+        tau = self.config.settling_time * self.config.time_scale
+        if tau <= 0:
+            return np.full(len(t_wall), target)
+        settled = 1 - np.exp(-np.maximum(t_wall - self.changed, 0) / tau)
+        return self._previous_rms + (target - self._previous_rms) * settled
+
+    def settled(self):
+        """
+        :return: True once the output is within SETTLED_TOLERANCE of its target
+        """
+        with self._lock:
+            target = self.rms if self.operate else 0.0
+            error = abs(self._envelope(np.array([time.perf_counter()]))[0] - target)
+            return error <= SETTLED_TOLERANCE * max(abs(self.rms), abs(self._previous_rms))
+
+    def sample(self, start, N, Fs):
+        """
+        :param start: wall time (time.perf_counter) at which the capture was triggered
+        :param N: number of samples
+        :param Fs: sampling frequency
+        :return: N samples of the sourced waveform
+        """
+        with self._lock:
+            t = np.arange(N) / Fs
+            rms = self._envelope(start + t * self.config.time_scale)
+            phase = 2 * np.pi * self.frequency * t
+
+            y = np.sin(phase)
+            for order, amplitude in self.config.harmonics:
+                if self.frequency * order < Fs / 2:
+                    y += amplitude * np.sin(order * phase)
+            y *= np.sqrt(2) * rms
+            if self.config.noise:
+                y += self._rng.normal(0, self.config.noise, N)
+            return y
+
+    def reading(self):
+        """
+        :return: rms and frequency as displayed by a meter
+        """
+        with self._lock:
+            rms = self._envelope(np.array([time.perf_counter()]))[0]
+            rms = np.sqrt(rms ** 2 * (1 + sum(a ** 2 for _, a in self.config.harmonics)) + self.config.noise ** 2)
+            frequency = self.frequency if rms > 0 else 0.0
+            return rms, frequency
+
+
+########################################################################################################################
+def _scpi(pattern):
+    """
+    Compiles a SCPI header pattern into a regex matching both its short and long forms. 'DIGitize:APERture' matches
+    DIG:APER, DIGITIZE:APERTURE and mixtures of the two. Nodes in brackets are optional, as in '[SENSe:]DIGitize'.
+    {func} and {mode} capture the measurement function (VOLT or CURR) and mode (AC or DC).
+    """
+    def node(text):
+        query = text.endswith('?')
+        text = text.rstrip('?')
+        if text == '{func}':
+            regex = '(VOLT|CURR)(?:AGE|ENT)?'
+        elif text == '{mode}':
+            regex = '(AC|DC)'
+        else:
+            short = re.match(r'[^a-z]*', text).group()
+            rest = text[len(short):].upper()
+            regex = re.escape(short) + (f'(?:{re.escape(rest)})?' if rest else '')
+        return regex + (r'\?' if query else '')
+
+    regex = ''
+    for optional, required in re.findall(r'\[([^\]]+):\]|([^:\[\]]+)', pattern):
+        if optional:
+            regex += f'(?:{node(optional)}:)?'
+        else:
+            regex += ('' if not regex or regex.endswith(':)?') else ':') + node(required)
+    return re.compile(regex)
+
+
+class SimulatedInstrument:
+    """
+    Dispatches each command of a program message to the first handler whose header pattern matches. Handlers return
+    the response as a string, bytes for a binary block, or None when the command has no response. Unrecognised
+    commands are pushed onto the error queue.
+    """
+    idn = 'FLUKE,SIMULATOR,0,0'
+    commands = ()
+
+    def __init__(self, bench, config):
+        self.bench = bench
+        self.config = config
+        self.errors = []
+        self._dispatch = [(_scpi(pattern), getattr(self, handler)) for pattern, handler in self.commands]
+
+    def execute(self, cmd):
+        header, _, args = cmd.strip().partition(' ')
+        header = header.lstrip(':').upper()
+        for regex, handler in self._dispatch:
+            match = regex.fullmatch(header)
+            if match:
+                return handler(*match.groups(), args.strip())
+        self.errors.append(f'-113,"Undefined header;{cmd.strip()}"')
+        return None
+
+    def ignore(self, *args):
+        return None
+
+    def identify(self, args):
+        return self.idn
+
+    def next_error(self, args):
+        return self.errors.pop(0) if self.errors else '+0,"No error"'
+
+
+class CalibratorModel(SimulatedInstrument):
+    """Fluke 5560A and 5730A calibrators."""
+    commands = (('*IDN?', 'identify'),
+                ('*RST', 'reset'),
+                ('*WAI', 'ignore'),
+                ('*CLS', 'clear'),
+                ('ERR?', 'next_error'),
+                ('OUT', 'output'),
+                ('OPER', 'operate'),
+                ('STBY', 'standby'),
+                ('ISR?', 'instrument_status'),
+                ('MONITOR', 'ignore'),
+                ('MONITOR?', 'monitor'),
+                ('COMM_MODE', 'ignore'),
+                ('REM_MODE', 'ignore'),
+                ('WIZARD', 'ignore'),
+                ('PONWIZ', 'ignore'),
+                ('^C', 'ignore'),
+                ('LOCal', 'ignore'))
+
+    def __init__(self, bench, config, model):
+        super().__init__(bench, config)
+        self.idn = f'FLUKE,{model},SIMULATOR,1.0'
+
+    def clear(self, args):
+        self.errors.clear()
+
+    def next_error(self, args):
+        return self.errors.pop(0) if self.errors else '0,"No Error"'
+
+    def reset(self, args):
+        self.bench.set_operate(False)
+        self.bench.set_output(rms=0.0, frequency=0.0)
+
+    def output(self, args):
+        # out 0.12A, 1000Hz
+        values = re.findall(r'([-+]?[0-9.]+(?:E[-+]?[0-9]+)?)\s*(A|V|HZ)', args.upper())
+        if not values:
+            self.errors.append(f'1,"Invalid output;{args}"')
+        for value, unit in values:
+            if unit == 'HZ':
+                self.bench.set_output(frequency=float(value))
+            else:
+                self.bench.set_output(units=unit, rms=float(value))
+
+    def operate(self, args):
+        self.bench.set_operate(True)
+
+    def standby(self, args):
+        self.bench.set_operate(False)
+
+    def instrument_status(self, args):
+        # bit 0 OPER, bit 12 SETTLED
+        isr = 0
+        if self.bench.operate:
+            isr |= 1
+            if self.bench.settled():
+                isr |= 1 << 12
+        return str(isr)
+
+    def monitor(self, args):
+        return '0'
+
+
+class Digitizer8588AModel(SimulatedInstrument):
+    """Fluke 8588A reference multimeter, as a meter and as a digitizer."""
+    idn = 'FLUKE,8588A,SIMULATOR,1.0'
+    commands = (('*IDN?', 'identify'),
+                ('*RST', 'reset'),
+                ('*SAV', 'save'),
+                ('*RCL', 'recall'),
+                ('*CLS', 'clear'),
+                ('*OPC', 'operation_complete'),
+                ('*OPC?', 'operation_complete_query'),
+                ('*ESR?', 'event_status'),
+                ('*WAI', 'ignore'),
+                ('SYSTem:ERRor?', 'next_error'),
+                ('SYSTem:ERRor:NEXT?', 'next_error'),
+                ('SYSTem:REMote', 'ignore'),
+                ('LOCal', 'ignore'),
+                ('CONFigure:{func}:{mode}', 'configure'),
+                ('[SENSe:]{func}:{mode}:RANGe:AUTO', 'ignore'),
+                ('[SENSe:]{func}:{mode}:RANGe', 'set_range'),
+                ('[SENSe:]{func}:{mode}:RANGe?', 'get_range'),
+                ('[SENSe:]FUNCtion', 'function'),
+                ('[SENSe:]DIGitize:{func}:RANGe', 'set_digitize_range'),
+                ('[SENSe:]DIGitize:FILTer', 'ignore'),
+                ('[SENSe:]DIGitize:VOLTage:COUPling:SIGNal', 'ignore'),
+                ('[SENSe:]DIGitize:APERture', 'set_aperture'),
+                ('TRIGger:RESet', 'trigger_reset'),
+                ('TRIGger:SOURce', 'trigger_source'),
+                ('TRIGger:TIMer', 'trigger_timer'),
+                ('TRIGger:COUNt', 'trigger_count'),
+                ('TRIGger:DELay:AUTO', 'ignore'),
+                ('TRIGger:DELay', 'ignore'),
+                ('FORMat:DATA', 'data_format'),
+                ('FORMat:BORDer', 'byte_order'),
+                ('INITiate:IMMediate', 'initiate'),
+                ('INITiate', 'initiate'),
+                ('FETCh?', 'fetch'),
+                ('DATA:REMove?', 'remove'),
+                ('DATA:POINts?', 'points'))
+
+    setup_fields = ('digitize', 'func', 'range', 'aperture', 'trigger_source_timer', 'timer', 'count')  # held by *SAV
+    setup_slots = range(10)
+
+    def __init__(self, bench, config):
+        super().__init__(bench, config)
+        self.setups = {}
+        self.reset('')
+
+    # STATE ------------------------------------------------------------------------------------------------------------
+    def save(self, args):
+        slot = int(float(args))
+        if slot not in self.setup_slots:
+            self.errors.append(f'-222,"Data out of range;*SAV {args}"')
+            return
+        self.setups[slot] = {field: getattr(self, field) for field in self.setup_fields}
+
+    def recall(self, args):
+        slot = int(float(args))
+        if slot not in self.setups:
+            self.errors.append(f'-222,"Data out of range;*RCL {args}"')
+            return
+        self.reset('')
+        for field, value in self.setups[slot].items():
+            setattr(self, field, value)
+
+    def reset(self, args):
+        self.digitize = False
+        self.func = 'VOLT'
+        self.range = 10.0
+        self.aperture = 0.0
+        self.trigger_source_timer = False
+        self.timer = 2e-8
+        self.count = 1
+        self.format = 'ASCII'
+        self.big_endian = True
+        self.esr = 0
+        self.opc_pending = False
+        self.started = None
+        self.memory = np.zeros(0)
+        self.removed = 0
+
+    def clear(self, args):
+        self.errors.clear()
+        self.esr = 0
+        self.opc_pending = False
+
+    def configure(self, func, mode, args):
+        self.digitize = False
+        self.func = func[:4]
+
+    def function(self, args):
+        self.digitize = 'DIG' in args.upper()
+        self.func = 'CURR' if 'CURR' in args.upper() else 'VOLT'
+
+    def set_range(self, func, mode, args):
+        self.range = float(args)
+
+    def get_range(self, func, mode, args):
+        return f'{self.range:+.8E}'
+
+    def set_digitize_range(self, func, args):
+        self.range = float(args)
+
+    def set_aperture(self, args):
+        self.aperture = float(args)
+
+    def trigger_reset(self, args):
+        self.trigger_source_timer = False
+        self.count = 1
+
+    def trigger_source(self, args):
+        self.trigger_source_timer = args.upper().startswith('TIM')
+
+    def trigger_timer(self, args):
+        self.timer = float(args)
+
+    def trigger_count(self, args):
+        self.count = int(float(args))
+
+    def data_format(self, args):
+        args = args.upper().replace(' ', '')
+        self.format = f"REAL{args.split(',')[-1]}" if args.startswith('REAL') else 'ASCII'
+
+    def byte_order(self, args):
+        self.big_endian = args.upper().startswith('NORM')
+
+    # CAPTURE ----------------------------------------------------------------------------------------------------------
+    @property
+    def sampling_frequency(self):
+        if self.trigger_source_timer:
+            return 1 / self.timer
+        return 1 / (self.aperture + 1 / DIGITIZER_SAMPLING_FREQUENCY)
+
+    @property
+    def complete(self):
+        if self.started is None:
+            return True
+        return time.perf_counter() >= self.started + self.count / self.sampling_frequency * self.config.time_scale
+
+    def initiate(self, args):
+        self.started = time.perf_counter()
+        self.memory = None
+        self.removed = 0
+
+    def operation_complete(self, args):
+        self.opc_pending = True
+
+    def operation_complete_query(self, args):
+        self._wait_for_capture()
+        return '1'
+
+    def event_status(self, args):
+        if self.opc_pending and self.complete:
+            self.esr |= 1
+            self.opc_pending = False
+        esr, self.esr = self.esr, 0
+        return str(esr)
+
+    def _wait_for_capture(self):
+        # a FETCH? issued during a capture is held until the capture completes
+        while not self.complete:
+            time.sleep(0.001)
+        if self.memory is None:
+            if self.digitize:
+                self.memory = self.bench.sample(self.started, self.count, self.sampling_frequency)
+            else:
+                self.memory = np.zeros(0)
+
+    # RETRIEVAL --------------------------------------------------------------------------------------------------------
+    def fetch(self, args):
+        self._wait_for_capture()
+        if not self.digitize or args.strip() in ('1', '2'):
+            rms, frequency = self.bench.reading()
+            if args.strip() == '2':
+                return f'{frequency:+.8E}'
+            # the reading memory holds one reading per trigger
+            return ','.join([f'{rms:+.8E}'] * (1 if args.strip() or self.digitize else self.count))
+        return self._format(self.memory[self.removed:])
+
+    def remove(self, args):
+        self._wait_for_capture()
+        count = int(float(args.split(',')[0]))
+        block = self.memory[self.removed:self.removed + count]
+        self.removed += len(block)
+        return self._format(block)
+
+    def points(self, args):
+        self._wait_for_capture()
+        return str(len(self.memory) - self.removed)
+
+    def _format(self, samples):
+        if self.format == 'ASCII':
+            return ','.join(f'{value:+.9E}' for value in samples)
+        dtype = np.dtype('d' if self.format == 'REAL64' else 'f').newbyteorder('>' if self.big_endian else '<')
+        block = samples.astype(dtype).tobytes()
+        length = str(len(block)).encode()
+        return b'#' + str(len(length)).encode() + length + block + b'\n'
+
+
+class Meter884xAModel(SimulatedInstrument):
+    """Fluke 8845A and 8846A multimeters."""
+    idn = 'FLUKE,8846A,SIMULATOR,1.0'
+    commands = (('*IDN?', 'identify'),
+                ('*RST', 'ignore'),
+                ('*CLS', 'clear'),
+                ('*OPC', 'operation_complete'),
+                ('*ESR?', 'event_status'),
+                ('SYSTem:ERRor?', 'next_error'),
+                ('SYSTem:REMote', 'ignore'),
+                ('LOCal', 'ignore'),
+                ('CONFigure:{func}:{mode}', 'configure'),
+                ('[SENSe:]{func}:{mode}:RANGe:AUTO', 'ignore'),
+                ('[SENSe:]{func}:{mode}:RANGe', 'set_range'),
+                ('[SENSe:]{func}:{mode}:RANGe?', 'get_range'),
+                ('[SENSe:]{func}:{mode}:RATE', 'set_rate'),
+                ('[SENSe:]{func}:{mode}:RATE?', 'get_rate'),
+                ('[SENSe:]{func}:{mode}:FIXED', 'ignore'),
+                ('SAMPle:COUNt', 'sample_count'),
+                ('INITiate', 'ignore'),
+                ('FETCh1?', 'primary'),
+                ('FETCh2?', 'secondary'))
+
+    def __init__(self, bench, config):
+        super().__init__(bench, config)
+        self.range = 10.0
+        self.rate = 'S'
+        self.count = 1
+        self.esr = 0
+
+    def clear(self, args):
+        self.errors.clear()
+        self.esr = 0
+
+    def operation_complete(self, args):
+        self.esr |= 1  # readings are available as soon as they are triggered
+
+    def event_status(self, args):
+        esr, self.esr = self.esr, 0
+        return str(esr)
+
+    def sample_count(self, args):
+        self.count = int(float(args))
+
+    def configure(self, func, mode, args):
+        pass
+
+    def set_range(self, func, mode, args):
+        self.range = float(args)
+
+    def get_range(self, func, mode, args):
+        return f'{self.range:+.8E}'
+
+    def set_rate(self, func, mode, args):
+        self.rate = args.upper()
+
+    def get_rate(self, func, mode, args):
+        return self.rate
+
+    def primary(self, args):
+        rms, _ = self.bench.reading()
+        return ','.join([f'{rms:+.8E}' if rms <= 1.2 * self.range else f'{OVERLOAD:+.8E}'] * self.count)
+
+    def secondary(self, args):
+        _, frequency = self.bench.reading()
+        return f'{frequency:+.8E}'
+
+
+########################################################################################################################
+class SimulatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        instrument = self.server.instrument
+        for line in self.rfile:
+            responses = []
+            for cmd in line.decode(errors='replace').strip().split(';'):
+                if not cmd.strip():
+                    continue
+                with self.server.lock:
+                    response = instrument.execute(cmd)
+                if isinstance(response, bytes):
+                    self.send(response)
+                elif response is not None:
+                    responses.append(response)
+
+            # the responses to the queries of a program message are returned as one message separated by ';'
+            if responses:
+                self.send(';'.join(responses).encode() + b'\n')
+
+    def send(self, data):
+        config = self.server.instrument.config
+        if config.latency:
+            time.sleep(config.latency)
+        if not config.bandwidth:
+            self.wfile.write(data)
+            return
+
+        start = time.perf_counter()
+        for offset in range(0, len(data), SEND_CHUNK_SIZE):
+            self.wfile.write(data[offset:offset + SEND_CHUNK_SIZE])
+            delay = start + (offset + SEND_CHUNK_SIZE) / config.bandwidth - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def finish(self):
+        try:
+            super().finish()
+        except ConnectionError:
+            pass
+
+
+class SimulatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, instrument):
+        super().__init__(address, SimulatorHandler)
+        self.instrument = instrument
+        self.lock = threading.Lock()  # one command at a time, as on the instrument
+
+
+def start_simulators(config=None, host='127.0.0.1', ports=None):
+    """
+    Starts a simulated bench, one server thread per instrument.
+
+    :param config: SimulatorConfig. Defaults apply when not given.
+    :param host: address to listen on
+    :param ports: dictionary of port by instrument. Port 0 selects a free port. Defaults to SIMULATOR_PORTS.
+    :return: dictionary of instrument connection settings in the format of instrument_config.yaml, the list of
+    servers to pass to stop_simulators, and the shared BenchSignal
+    """
+    config = config or SimulatorConfig()
+    ports = SIMULATOR_PORTS if ports is None else ports
+    bench = BenchSignal(config)
+    models = {'f5560A': lambda: CalibratorModel(bench, config, '5560A'),
+              'f5730A': lambda: CalibratorModel(bench, config, '5730A'),
+              'f8588A': lambda: Digitizer8588AModel(bench, config),
+              'f884xA': lambda: Meter884xAModel(bench, config)}
+
+    instruments = {}
+    servers = []
+    for name, port in ports.items():
+        server = SimulatorServer((host, port), models[name]())
+        threading.Thread(target=server.serve_forever, name=f'{name} simulator', daemon=True).start()
+        servers.append(server)
+        instruments[name] = {'mode': 'SOCKET', 'address': host, 'port': str(server.server_address[1]), 'gpib': ''}
+
+    return instruments, servers, bench
+
+
+def stop_simulators(servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    instruments, servers, _ = start_simulators()
+    print('Simulated instruments (point instrument_config.yaml at these to use them):')
+    for name, settings in instruments.items():
+        print(f"\t{name}: {settings['address']}:{settings['port']}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_simulators(servers)
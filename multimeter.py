@@ -2,35 +2,22 @@ import dut_f5560A as dut1
 import dut_f5730A as dut2
 import dmm_f884xA as dmm1
 import dmm_f8588A as dmm2
+from run_files import getFilepath
 
 import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import threading
-import datetime
-import os
 import re
 from decimal import Decimal
 import csv
 
 
 ########################################################################################################################
-def _getFilepath(directory, fname):
-    Path(directory).mkdir(parents=True, exist_ok=True)
-    date = datetime.date.today().strftime("%Y%m%d")
-    filename = f'{fname}_{date}'
-    index = 0
-
-    while os.path.isfile(f'{directory}/{filename}_{str(index).zfill(3)}.csv'):
-        index += 1
-    filename = filename + "_" + str(index).zfill(3)
-    return f'{directory}/{filename}.csv'
-
-
 def write_to_csv(path, fname, header, *args):
     table = list(zip(*args))
-    pathname = _getFilepath(path, fname)
+    pathname = getFilepath(path, fname)
     with open(pathname, 'w', newline='') as outfile:
         writer = csv.writer(outfile, delimiter=',')
         if header:
@@ -131,6 +118,7 @@ class DMM_Measurement:
     def __init__(self, parent):
         self.panel = parent
         self.DUMMY_DATA = False  # can be toggled by the gui
+        self.KEEP_OPERATE = False  # when true, sweeps leave the source in operate between points
         self.amplitude_good = False  # Flag indicates user input for amplitude value is good (True)
         self.frequency_good = False  # Flag indicates user input for frequency value is good (True)
 
@@ -254,50 +242,53 @@ class DMM_Measurement:
         self.panel.flag_complete = True
 
     def run_sweep(self, df, func):
-        DUT_choice = self.DUT_choice
-
         print('Running Sweep.')
         self.panel.flag_complete = False
         headers = ['amplitude', 'frequency', 'measured', 'freq_meas', 'std']
         results = np.zeros(shape=(len(df.index), len(headers)))
         t = threading.currentThread()
-        for idx, row in df.iterrows():
-            if getattr(t, "do_run", True):
-                if not self.DUMMY_DATA:
-                    self.panel.text_amplitude.SetValue(str(row.amplitude))
-                    self.panel.text_frequency.SetValue(str(row.frequency))
-                    amplitude, units, ft = self.get_string_value(row.amplitude, str(row.frequency))
-
-                    self.params['amplitude'] = amplitude
-                    self.params['frequency'] = ft
-                    self.params['units'] = units
-
-                    try:
-                        results[idx] = func(setup=True)
+        try:
+            for idx, row in df.iterrows():
+                if getattr(t, "do_run", True):
+                    if not self.DUMMY_DATA:
+                        self.panel.text_amplitude.SetValue(str(row.amplitude))
+                        self.panel.text_frequency.SetValue(str(row.frequency))
+                        amplitude, units, ft = self.get_string_value(row.amplitude, str(row.frequency))
 
-                        if DUT_choice == 'f5560A':
-                            self.M.standby_f5560A()
-                        elif DUT_choice == 'f5730A':
-                            self.M.standby_f5730A()
-                        else:
-                            raise ValueError("Invalid DUT selection made!")
+                        self.params['amplitude'] = amplitude
+                        self.params['frequency'] = ft
+                        self.params['units'] = units
 
-                    except ValueError:
-                        raise
-                else:
-                    amplitude, units, ft = self.get_string_value(str(row.amplitude), str(row.frequency))
+                        try:
+                            results[idx] = func(setup=True)
 
-                    self.params['amplitude'] = amplitude
-                    self.params['frequency'] = ft
-                    self.params['units'] = units
-                    results[idx] = func(setup=True)
-            else:
-                break
+                            if not self.KEEP_OPERATE:
+                                self.standby_source()
+
+                        except ValueError:
+                            raise
+                    else:
+                        amplitude, units, ft = self.get_string_value(str(row.amplitude), str(row.frequency))
+
+                        self.params['amplitude'] = amplitude
+                        self.params['frequency'] = ft
+                        self.params['units'] = units
+                        results[idx] = func(setup=True)
+                else:
+                    break
+        finally:
+            # an output kept in operate between points is placed in standby once the sweep ends or fails
+            if self.KEEP_OPERATE and not self.DUMMY_DATA:
+                try:
+                    self.standby_source()
+                except Exception as e:
+                    # logged, so the error that ended the sweep is the one raised
+                    print(f'\tcould not place the source in standby: {e}')
 
         # https://stackoverflow.com/a/28356566
         # https://stackoverflow.com/a/28058264
         results_df = pd.DataFrame(results, columns=headers)
-        results_df.to_csv(path_or_buf=_getFilepath('results', 'multimeter'), sep=',', index=False)
+        results_df.to_csv(path_or_buf=getFilepath('results', 'multimeter'), sep=',', index=False)
         self.panel.flag_complete = True
 
     # TEST FUNCTIONS ###################################################################################################
@@ -421,6 +412,14 @@ class DMM_Measurement:
             print('error occurred while connecting to DUT.')
             raise
 
+    def standby_source(self):
+        if self.DUT_choice == 'f5560A':
+            self.M.standby_f5560A()
+        elif self.DUT_choice == 'f5730A':
+            self.M.standby_f5730A()
+        else:
+            raise ValueError("Invalid DUT selection made!")
+
     # MISCELLANEOUS ####################################################################################################
     def get_string_value(self, amp_string, freq_string):
         # https://stackoverflow.com/a/35610194
@@ -0,0 +1,84 @@
+"""
+Background persistence of measurement results.
+
+Saving a capture means a directory scan for the next free file name followed by a write of up to tens of megabytes.
+ResultsWriter moves that work onto a single worker thread so the acquisition thread can start the next measurement
+immediately. Writes run in submission order. The queue is bounded, so if the disk falls behind, submit blocks until a
+slot frees up instead of buffering captures without limit.
+"""
+import queue
+import threading
+
+MAX_PENDING_WRITES = 4  # captures held in memory while waiting on the disk
+
+
+class ResultsWriter:
+    def __init__(self, max_pending=MAX_PENDING_WRITES, on_error=None):
+        """
+        :param max_pending: number of writes that may be queued before submit blocks
+        :param on_error: called from the writer thread as on_error(description, exception) when a write fails. The
+        error is printed when not given.
+        """
+        self.on_error = on_error
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ResultsWriter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                description, func, args, kwargs = job
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    self._report(description, e)
+            finally:
+                self._queue.task_done()
+
+    def _report(self, description, e):
+        if self.on_error:
+            try:
+                self.on_error(description, e)
+                return
+            except Exception as callback_error:
+                e = callback_error
+        print(f'\n!!!\nFailed to save {description}: {e}\n!!!\n')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def submit(self, description, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs) to run on the writer thread. Blocks while max_pending writes are outstanding.
+        Arrays passed in must not be modified afterwards, since they are written as they are when the job runs.
+
+        :param description: what is being saved, used when reporting errors
+        """
+        if self._closed:
+            raise ValueError('Results writer has been closed. Cannot save ' + description)
+        self._start()
+        self._queue.put((description, func, args, kwargs))
+
+    def flush(self):
+        """
+        Blocks until every write submitted so far has completed.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        Completes the outstanding writes and stops the writer thread. Further submits raise ValueError.
+        """
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
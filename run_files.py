@@ -0,0 +1,63 @@
+"""
+Allocation of numbered result files, named <fname>_<YYYYMMDD>_<index>.<extension>.
+
+The next free index of each (directory, fname, date, extension) is kept in memory, so a directory is scanned only once
+per day and name rather than probed file by file on every save. Each name is reserved by creating the file exclusively,
+so other threads, processes or files written by hand can never be overwritten: on a collision the allocator moves on to
+the next index.
+"""
+import datetime
+import os
+import re
+import threading
+from pathlib import Path
+
+_next_index = {}
+_lock = threading.Lock()
+
+
+def _scan_next_index(directory, prefix, extension):
+    # a single pass over the directory for the highest index already used
+    pattern = re.compile(rf'{re.escape(prefix)}_(\d+)\.{re.escape(extension)}')
+    index = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = pattern.fullmatch(entry.name)
+            if match:
+                index = max(index, int(match.group(1)) + 1)
+    return index
+
+
+def getFilepath(directory, fname, extension='csv', digits=3):
+    """
+    Reserves a new numbered file in *directory* and returns its path. The file is created empty, ready to be
+    overwritten by the caller.
+
+    :param directory: directory of the file. Created if it does not exist.
+    :param fname: prefix of the file name. The date and an index are appended.
+    :param extension: file extension, without the dot
+    :param digits: minimum number of digits of the index
+    :return: path of the reserved file
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    date = datetime.date.today().strftime("%Y%m%d")
+    prefix = f'{fname}_{date}'
+    key = (os.path.realpath(directory), prefix, extension)
+
+    with _lock:
+        index = _next_index.get(key)
+        if index is None:
+            index = _scan_next_index(directory, prefix, extension)
+
+        while True:
+            pathname = f'{directory}/{prefix}_{str(index).zfill(digits)}.{extension}'
+            index += 1
+            try:
+                with open(pathname, 'x'):
+                    break
+            except FileExistsError:
+                continue
+
+        _next_index[key] = index
+
+    return pathname
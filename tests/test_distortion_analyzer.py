@@ -0,0 +1,20 @@
+import pytest
+
+import dmm_f8588A as dmm
+from distortion_analyzer import get_coherent_FFT_parameters
+
+
+########################################################################################################################
+# COHERENT CAPTURES ----------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('f0, lpf', [
+    (2, 0),  # averaging beyond the 1 ms aperture, where the aperture steps by 100 us
+    (7.3, 0),
+    (1000, 100e3),
+    (30e3, 100e3),
+])
+def test_coherent_aperture_captures_whole_cycles(f0, lpf):
+    f0, Fs, N, aperture, runtime, cycles = get_coherent_FFT_parameters(f0, lpf, 'relative', 0.1)
+
+    assert dmm.aperture_sampling_frequency(aperture) == Fs
+    assert cycles * Fs / N == pytest.approx(f0, rel=1e-12)
+    assert runtime == pytest.approx(N / Fs)
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+import pytest
+
+from distortion_calculator import (FILTERED_MAGNITUDE, SpectrumAnalysis, THD, THDN_F, find_range, is_coherent,
+                                   rms_noise, windowed_fft)
+
+
+########################################################################################################################
+def capture(f0, Fs, N, window, seed=0):
+    """
+    :return: one sided spectrum of 1 V at f0 with 1e-3 third and 1e-4 fifth harmonics and 1e-4 V of noise
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(N) / Fs
+    yt = np.sin(2 * np.pi * f0 * t) + 1e-3 * np.sin(6 * np.pi * f0 * t) + 1e-4 * np.sin(10 * np.pi * f0 * t)
+    yt += rng.normal(scale=1e-4, size=N)
+    return windowed_fft(yt, Fs, N, window)
+
+
+# FUNDAMENTAL NEAR DC --------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('f0, Fs, N, window, main_lobe_width', [
+    (45, 2.5e6, 22757, 'hanning', None),  # lower edge of the lobe rounds just below DC
+    (20, 400e3, 48000, 'blackman', 50),
+    (60, 400e3, 12000, 'blackman', 200),
+])
+def test_lobe_below_dc_is_clamped(f0, Fs, N, window, main_lobe_width):
+    xf, yf, width = capture(f0, Fs, N, window)
+    width = main_lobe_width or width
+
+    with np.errstate(divide='raise', invalid='raise'):
+        thdn = THDN_F(xf, yf, Fs, N, width, 0, 100e3)[0]
+
+    start, stop = SpectrumAnalysis(xf, yf, Fs, N).fundamental_lobe(width)
+    assert start == 0 < stop
+    assert np.isfinite(thdn) and 0 < thdn < 1
+
+
+# PARITY WITH THE ORIGINAL THDN_F AND THD ------------------------------------------------------------------------------
+def legacy_thdn_f(xf, _yf, fs, N, main_lobe_width=None, hpf=0, lpf=100e3):
+    """
+    THDN_F as it was before SpectrumAnalysis, without the progress messages
+    """
+    yf = np.array(_yf, copy=True)
+    f0_idx = np.argmax(np.abs(yf))
+    fundamental = xf[f0_idx]
+    if not (hpf == 0) and (hpf < lpf):
+        yf[:int(hpf * N / fs)] = 1e-10
+    if lpf != 0:
+        yf[int(lpf * N / fs) + 1:] = 1e-10
+    if main_lobe_width:
+        left_of_lobe = int((fundamental - main_lobe_width / 2) * (N / fs))
+        right_of_lobe = int((fundamental + main_lobe_width / 2) * (N / fs))
+    else:
+        left_of_lobe, right_of_lobe = find_range(abs(yf), f0_idx)
+    rms_fundamental = np.sqrt(math.fsum(np.abs(yf[left_of_lobe:right_of_lobe]) ** 2))
+    yf[left_of_lobe:right_of_lobe] = 1e-10
+    rms_noise = np.sqrt(math.fsum(np.abs(yf) ** 2))
+    return rms_noise / rms_fundamental, fundamental, round(1e6 * rms_noise, 2)
+
+
+def legacy_thd(xf, yf, Fs, N, main_lobe_width):
+    """
+    THD as it was before SpectrumAnalysis, without the progress messages
+    """
+    f0_idx = np.argmax(np.abs(yf))
+    n_harmonics = int(np.floor((Fs / 2) / xf[f0_idx]) - 1)
+    amplitude = np.zeros(n_harmonics)
+    for h in range(n_harmonics):
+        local_idx = f0_idx * int(h + 1)
+        local_idx = local_idx + (4 - np.argmax(np.abs(yf[local_idx - 4:local_idx + 4])))
+        freq = xf[local_idx]
+        left_of_lobe = int((freq - main_lobe_width / 2) * (N / Fs))
+        right_of_lobe = int((freq + main_lobe_width / 2) * (N / Fs))
+        amplitude[h] = np.sqrt(math.fsum(np.abs(np.sqrt(2) * yf[left_of_lobe:right_of_lobe]) ** 2))
+    return np.sqrt(math.fsum(np.abs(amplitude[1:]) ** 2)) / np.abs(amplitude[0])
+
+
+@pytest.mark.parametrize('f0, Fs, N, window, main_lobe_width, hpf, lpf', [
+    (1000, 1e6, 69310, 'hanning', None, 0, 100e3),
+    (1000, 1e6, 69310, 'hanning', None, 0, 0),
+    (30, 400e3, 48000, 'blackman', 50, 0, 100e3),  # absolute 50 Hz lobe
+    (50, 400e3, 48000, 'blackman', 50, 0, 100e3),
+    (1000, 2.5e6, 150000, 'blackman', None, 20, 20e3),
+    (10e3, 2.5e6, 15000, 'blackman', None, 0, 100e3),
+    (997, 500e3, 40000, 'hamming', None, 10, 2e6),
+    (1234.5, 500e3, 40000, 'bartlett', None, 0, 100e3),
+    (1234.5, 500e3, 40000, 'rectangular', None, 0, 100e3),
+    (1000, 1e6, 69310, 'hanning', 0, 0, 100e3),  # lobe of local minima
+])
+def test_matches_legacy_figures(f0, Fs, N, window, main_lobe_width, hpf, lpf):
+    xf, yf, width = capture(f0, Fs, N, window)
+    width = width if main_lobe_width is None else main_lobe_width
+
+    thdn, fundamental, noise = THDN_F(xf, yf, Fs, N, width, hpf, lpf)
+    legacy = legacy_thdn_f(xf, yf, Fs, N, width, hpf, lpf)
+    assert thdn == pytest.approx(legacy[0], rel=1e-9)
+    assert fundamental == legacy[1]
+    assert noise == pytest.approx(legacy[2], abs=0.01)
+
+    if width:
+        assert THD(xf, yf, Fs, N, width) == pytest.approx(legacy_thd(xf, yf, Fs, N, width), rel=1e-9)
+
+
+# COHERENT CAPTURES ----------------------------------------------------------------------------------------------------
+def test_coherent_lobe_keeps_peak_bin():
+    Fs, N = 5e6 / 3, 50003
+    f0 = 30 * Fs / N  # 30 cycles in a record sharing no factor with them
+    assert is_coherent(f0, Fs, N, 'rectangular') and not is_coherent(f0, Fs, N, 'blackman')
+
+    xf, yf, width = capture(f0, Fs, N, 'rectangular')
+    spectrum = SpectrumAnalysis(xf, yf, Fs, N, coherent=True)
+    start, stop = spectrum.fundamental_lobe(width)
+    assert start <= spectrum.fundamental_index < stop
+    assert spectrum.thd(width) == pytest.approx(np.hypot(1e-3, 1e-4), rel=1e-3)
+
+
+# NOISE BANDS ----------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('hpf, lpf', [(0, 100e3), (400, 20e3), (0.1, 10)])
+def test_rms_noise_masks_the_passband_of_thdn_f(hpf, lpf):
+    Fs, N = 400e3, 40000  # lpf falls exactly on a bin
+    xf, yf, width = capture(1000, Fs, N, 'blackman')
+    spectrum = SpectrumAnalysis(xf, yf, Fs, N, hpf, lpf)
+
+    masked = rms_noise(yf.copy(), Fs, N, hpf, lpf)
+    assert np.array_equal(masked != FILTERED_MAGNITUDE, spectrum.filter_mask)
+    assert np.sum(np.abs(masked[spectrum.filter_mask]) ** 2) == pytest.approx(spectrum.index.band_power(hpf, lpf))
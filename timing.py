@@ -0,0 +1,95 @@
+"""
+Lightweight timing of the stages of a measurement.
+
+Code under measurement is wrapped in named spans:
+
+    with timer.span('retrieve'):
+        yt = M.retrieve_digitize(runtime, N)
+
+Time spent in a span accumulates under its name until the next reset, so a record holds one entry per stage of the
+measurement plus the total since the reset. A disabled timer hands out a single shared no-op span, so leaving the
+instrumentation in place costs a method call per span and nothing is recorded.
+"""
+import time
+
+
+class _Span:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+########################################################################################################################
+class MeasurementTimer:
+    def __init__(self, enabled=True):
+        """
+        :param enabled: when False, spans are not timed and records are empty
+        """
+        self.enabled = enabled
+        self.spans = {}
+        self._start = time.perf_counter()
+
+    def reset(self):
+        """
+        Starts a new record. Called at the start of each measurement.
+        """
+        self.spans = {}
+        self._start = time.perf_counter()
+
+    def span(self, name):
+        """
+        :param name: stage the time inside the with block is added to
+        :return: context manager timing the with block
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name, elapsed):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    def record(self):
+        """
+        :return: dictionary of seconds spent by span, and the total seconds since the last reset. Empty when disabled.
+        """
+        if not self.enabled:
+            return {}
+        return {**self.spans, 'total': time.perf_counter() - self._start}
+
+    def values(self, names):
+        """
+        :param names: spans in the order wanted, for instance the timing columns of a results table
+        :return: list of seconds spent by span. Spans that did not run are 0.
+        """
+        record = self.record()
+        return [record.get(name, 0.0) for name in names]
+
+    def summary(self):
+        """
+        :return: one line description of the record, for the console
+        """
+        return ', '.join(f'{name}: {seconds * 1e3:.1f} ms' for name, seconds in self.record().items())
@@ -0,0 +1,176 @@
+"""
+Optional instrumentation of the instrument traffic passing through VisaClient.
+
+When enabled, every write, read and query is recorded twice:
+    + latency histograms : fixed buckets (a 1-2-5 series from 100 us to 100 s) keyed by instrument and SCPI header,
+                           with the count, total, maximum and number of timeouts of each key
+    + trace              : a ring buffer of the last commands with their timestamp, latency and payload sizes, which
+                           can be dumped to csv on demand and is dumped automatically when a command fails
+
+Monitoring is off by default, in which case VisaClient does no more than one attribute check per command:
+
+    from visa_monitor import monitor
+    monitor.enable()
+    ...
+    monitor.report()
+    monitor.dump_trace()
+"""
+import csv
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from pyvisa import constants
+
+from run_files import getFilepath
+
+TRACE_LENGTH = 1000  # commands held by the trace
+TRACE_DIRECTORY = 'results/traces'
+COMMAND_TRACE_CHARS = 80  # longer commands are truncated in the trace
+
+# upper bound of each latency bucket in seconds. A final bucket holds everything slower
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-4, 3) for m in (1, 2, 5))[:-2]
+
+
+def scpi_header(cmd):
+    """
+    :param cmd: program message, such as ':SOUR:VOLT 1.0;:OUTP ON' or 'FETCH? 1'
+    :return: header of the first command, such as 'SOUR:VOLT' or 'FETCH?'. Batches are suffixed with the number of
+    further commands they carry, for instance 'SOUR:VOLT;+1'.
+    """
+    commands = cmd.strip().split(';')
+    header = commands[0].strip().lstrip(':').split(' ', 1)[0].upper()
+    if len(commands) > 1:
+        header = f'{header};+{len(commands) - 1}'
+    return header
+
+
+def _timed_out(error):
+    return getattr(error, 'error_code', None) == constants.StatusCode.error_timeout
+
+
+########################################################################################################################
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+        self.errors = 0
+
+    def add(self, latency, error=None):
+        self.counts[np.searchsorted(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        if error is not None:
+            self.errors += 1
+            if _timed_out(error):
+                self.timeouts += 1
+
+    def percentile(self, q):
+        """
+        :param q: percentile between 0 and 100
+        :return: upper bound of the bucket holding the q-th percentile, or the maximum for the overflow bucket
+        """
+        if not self.count:
+            return 0.0
+        idx = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return LATENCY_BUCKETS[idx] if idx < len(LATENCY_BUCKETS) else self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'max': self.max, 'timeouts': self.timeouts,
+                'errors': self.errors, 'buckets': list(LATENCY_BUCKETS), 'counts': self.counts.tolist()}
+
+
+class CommandMonitor:
+    def __init__(self):
+        self.enabled = False
+        self.dump_on_error = True
+        self.histograms = {}
+        self.trace = deque(maxlen=TRACE_LENGTH)
+        self._lock = threading.Lock()
+
+    def enable(self, trace_length=TRACE_LENGTH, dump_on_error=True):
+        """
+        Starts recording. Histograms and trace are cleared.
+
+        :param trace_length: number of commands held by the trace
+        :param dump_on_error: dump the trace to TRACE_DIRECTORY whenever a command fails
+        """
+        with self._lock:
+            self.histograms = {}
+            self.trace = deque(maxlen=trace_length)
+            self.dump_on_error = dump_on_error
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def record(self, instrument, kind, cmd, latency, sent=0, received=0, error=None):
+        """
+        Called by VisaClient once a command has completed or failed.
+
+        :param instrument: name of the instrument
+        :param kind: 'write', 'read', 'query' or 'query_binary'
+        :param cmd: program message sent ('' for a read)
+        :param latency: seconds from sending the command to receiving the complete response
+        :param sent: bytes written
+        :param received: bytes read
+        :param error: the exception raised, if the command failed
+        """
+        key = (instrument, scpi_header(cmd) if cmd else kind.upper())
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.add(latency, error)
+            self.trace.append((time.time(), instrument, kind, cmd[:COMMAND_TRACE_CHARS], latency, sent, received,
+                               '' if error is None else str(error)))
+
+        if error is not None and self.dump_on_error:
+            print(f'\tcommand to {instrument} failed. Trace saved to {self.dump_trace()}')
+
+    # REPORTING ########################################################################################################
+    def dump_trace(self, pathname=None):
+        """
+        Writes the trace to csv, oldest command first.
+
+        :param pathname: file to write. A new numbered file in TRACE_DIRECTORY when not given.
+        :return: path of the file written
+        """
+        pathname = pathname or getFilepath(TRACE_DIRECTORY, 'visa_trace')
+        with self._lock:
+            rows = list(self.trace)
+        with open(pathname, 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['timestamp', 'instrument', 'kind', 'command', 'latency', 'sent', 'received', 'error'])
+            writer.writerows(rows)
+        return pathname
+
+    def summary(self):
+        """
+        :return: dictionary of histograms by 'instrument SCPI header', slowest total first
+        """
+        with self._lock:
+            items = sorted(self.histograms.items(), key=lambda item: item[1].total, reverse=True)
+            return {f'{instrument} {header}': histogram.to_dict() for (instrument, header), histogram in items}
+
+    def report(self, limit=20):
+        """
+        Prints the commands that took the most time in total.
+        """
+        with self._lock:
+            items = sorted(self.histograms.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+
+        print(f"\t{'instrument':<12}{'command':<28}{'count':>8}{'total (s)':>12}{'mean (ms)':>12}"
+              f"{'p95 (ms)':>12}{'max (ms)':>12}{'timeouts':>10}")
+        for (instrument, header), histogram in items:
+            mean = histogram.total / histogram.count
+            print(f'\t{instrument:<12}{header:<28}{histogram.count:>8}{histogram.total:>12.3f}{mean * 1e3:>12.2f}'
+                  f'{histogram.percentile(95) * 1e3:>12.2f}{histogram.max * 1e3:>12.2f}{histogram.timeouts:>10}')
+
+
+monitor = CommandMonitor()  # shared by every VisaClient